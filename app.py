@@ -1,23 +1,54 @@
-﻿import base64
+﻿import atexit
+import base64
+import codecs
 import hashlib
+import heapq
 import hmac
 import json
+import logging
+import mimetypes
 import os
 import random
 import secrets
 import sqlite3
+import sys
 import math
 import re
+import threading
+import time
 import unicodedata
+import zlib
 import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from array import array
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
+from email.utils import formatdate, parsedate_to_datetime
 from http.cookies import SimpleCookie
 from http.cookiejar import CookieJar
 from html import escape, unescape
-from urllib.parse import parse_qs, quote_plus, urljoin
+from html.parser import HTMLParser
+from urllib.parse import parse_qs, quote_plus, urljoin, urlsplit
 from urllib.error import HTTPError
 from urllib.request import HTTPCookieProcessor, Request, build_opener, urlopen
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+IMPORT_STARTED = time.perf_counter()
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data", "verbs")
 USERS_PATH = os.path.join(os.path.dirname(__file__), "data", "users.json")
@@ -48,10 +79,42 @@ STUDY_LANGUAGES = {
 DEFAULT_STUDY_LANGUAGE = "it_ja"
 ACTIVE_MATERIAL_DB = contextvars.ContextVar("ACTIVE_MATERIAL_DB", default=MATERIAL_DB_PATHS[DEFAULT_STUDY_LANGUAGE])
 DB_DIR = os.path.dirname(DB_PATH) or os.path.join(os.path.dirname(__file__), "data")
+SQLITE_STORAGE_PROFILES = {
+    # Many small writes (users, card state, practice events) racing readers.
+    "write_heavy": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 32 * 1024 * 1024,
+        "cache_size": -8000,
+    },
+    # Shared card material: read on every question, Elo written per answer.
+    "read_heavy": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -32000,
+    },
+    "legacy": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+}
+SQLITE_PROFILE_BY_ROLE = {
+    "runtime": os.environ.get("VERBI_RUNTIME_DB_PROFILE", "write_heavy"),
+    "material": os.environ.get("VERBI_MATERIAL_DB_PROFILE", "read_heavy"),
+    "cache": os.environ.get("VERBI_CACHE_DB_PROFILE", "write_heavy"),
+}
+SQLITE_SYNCHRONOUS_NAMES = {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"}
+LOGGER = logging.getLogger("verbi")
 TOTAL_QUESTIONS = 10
 DEFAULT_DAILY_TARGET = 20
 DEFAULT_ELO = 1200
 ELO_K = 32
+ANSWER_BATCH_MAX = 200
+ELO_LOCK_WARN_MS = 200
 NEW_CONTENT_CHANCE = 0.10
 SCRAPER_DEFAULT_SOURCES = [
     "https://api.tatoeba.org/v1/sentences?lang=ita&q={query}&trans:lang=jpn&trans:is_direct=yes&showtrans=matching&sort=relevance&limit=500",
@@ -94,6 +157,73 @@ SCRAPER_SOURCE_LIBRARY_BY_LANGUAGE = {
 SCRAPER_MAX_SOURCE_LINKS = 4
 SCRAPER_MAX_SENTENCES = 80
 SCRAPER_TIMEOUT_SECONDS = 4
+SCRAPER_MAX_PAGE_BYTES = 1_500_000
+SCRAPER_READ_CHUNK_BYTES = 64 * 1024
+# Streamed pages larger than this are parsed but not kept in the scraper
+# cache, so a big article never has to sit in memory whole.
+SCRAPER_CACHE_MAX_BODY_BYTES = 256 * 1024
+SCRAPER_FETCH_WORKERS = int(os.environ.get("VERBI_SCRAPER_FETCH_WORKERS", "8"))
+SCRAPER_HOST_CONCURRENCY = int(os.environ.get("VERBI_SCRAPER_HOST_CONCURRENCY", "2"))
+SCRAPER_HOST_SLOTS = {}
+SCRAPER_HOST_SLOTS_LOCK = threading.Lock()
+SCRAPER_CACHE_PATH = os.environ.get("VERBI_SCRAPER_CACHE_PATH", os.path.join(DB_DIR, "scraper-cache.db"))
+# Freshness per source kind from SCRAPER_SOURCE_LIBRARY; feeds and anything
+# not in the library use the default. Stale entries are revalidated, and
+# entries untouched for SCRAPER_CACHE_MAX_AGE_SECONDS are dropped.
+SCRAPER_CACHE_DEFAULT_TTL_SECONDS = 6 * 3600
+SCRAPER_CACHE_TTL_BY_KIND = {
+    "storie/libri": 30 * 86400,
+    "libri": 7 * 86400,
+    "didattico/traduzioni": 7 * 86400,
+    "didattico": 7 * 86400,
+}
+SCRAPER_CACHE_MAX_AGE_SECONDS = 60 * 86400
+SCRAPER_CACHE_STATE = {"ready": False, "corpus": False}
+SCRAPER_CACHE_INIT_LOCK = threading.Lock()
+SCRAPER_CACHE_LOCK = threading.Lock()
+SCRAPER_CACHE_STATS = {"hits": 0, "revalidated": 0, "misses": 0, "errors": 0}
+# Every fetched page is split into sentences and indexed here, so sources
+# crawled within their cache ttl are answered locally instead of refetched.
+SCRAPER_CORPUS_SQL = """
+CREATE TABLE IF NOT EXISTS corpus_sentences (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    sentence TEXT NOT NULL,
+    translation TEXT NOT NULL DEFAULT '',
+    normalized TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_corpus_sentences_url
+    ON corpus_sentences(url);
+
+CREATE TABLE IF NOT EXISTS corpus_pages (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS corpus_links (
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (source, url)
+);
+
+CREATE TABLE IF NOT EXISTS corpus_sources (
+    source TEXT PRIMARY KEY,
+    indexed_at REAL NOT NULL
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS corpus_fts
+    USING fts5(normalized, content='corpus_sentences', content_rowid='id');
+
+CREATE TRIGGER IF NOT EXISTS corpus_sentences_insert AFTER INSERT ON corpus_sentences BEGIN
+    INSERT INTO corpus_fts (rowid, normalized) VALUES (new.id, new.normalized);
+END;
+
+CREATE TRIGGER IF NOT EXISTS corpus_sentences_delete AFTER DELETE ON corpus_sentences BEGIN
+    INSERT INTO corpus_fts (corpus_fts, rowid, normalized) VALUES ('delete', old.id, old.normalized);
+END;
+"""
 APP_TIMEZONE = timezone(timedelta(hours=9))
 PERSON_SLOTS = [
     ("1", "SG", "io"),
@@ -119,7 +249,148 @@ GENDER_LABELS = {
 }
 ALL_GENDERS = list(GENDER_LABELS.keys())
 DB_INITIALIZED = set()
+STARTUP_TIMINGS = []
+STARTUP_TIMINGS_LOCK = threading.Lock()
+STARTUP_STEPS = threading.local()
+FALLBACK_VERBS = []
 VERBECC_CONJUGATOR = None
+SESSION_CACHE_TTL_SECONDS = float(os.environ.get("VERBI_SESSION_CACHE_TTL", "10"))
+SESSION_CACHE_MAX_ENTRIES = 1024
+SESSION_CACHE = {}
+SESSION_CACHE_LOCK = threading.Lock()
+DB_POOL = threading.local()
+DB_POOL_LOCK = threading.Lock()
+DB_POOL_GENERATION = 0
+# Pooled connections still open, per pid.
+DB_POOL_OPEN = {}
+DB_POOL_STATS = {}
+PROCESS_CACHES = {}
+BOOTSTRAP_STATE = {"has_users": False}
+CARD_INDEXES = {}
+CARD_INDEX_LOCK = threading.Lock()
+# One lock per (db, kind) so only one request reloads an expired index.
+CARD_INDEX_LOADS = {}
+CARD_INDEX_BUCKET_WIDTH = 50
+CARD_INDEX_TTL_SECONDS = float(os.environ.get("VERBI_CARD_INDEX_TTL", "60"))
+CARD_INDEX_MAX_ATTEMPTS = 64
+# Below this many expected hits in CARD_INDEX_MAX_ATTEMPTS draws, seen-only
+# picks read the user's bitmap instead of rejection sampling the index.
+CARD_INDEX_MIN_EXPECTED_HITS = 8
+# Per-user LRU: username -> {card_type: SeenCards}.
+SEEN_CACHE = OrderedDict()
+SEEN_CACHE_LOCK = threading.Lock()
+SEEN_CACHE_MAX_USERS = int(os.environ.get("VERBI_SEEN_CACHE_USERS", "256"))
+SEEN_CACHE_TTL_SECONDS = float(os.environ.get("VERBI_SEEN_CACHE_TTL", "300"))
+SEEN_CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0, "writes": 0, "compactions": 0}
+# Uid intern table behind the seen bitmaps: (number by uid, uid by number).
+# It is replaced, never shrunk in place, so a bitmap keeps working against the
+# table it was built with.
+CARD_UID_TABLE = ({}, [])
+CARD_UID_LOCK = threading.Lock()
+CARD_UID_COMPACT_MIN = 4096
+CARD_UID_STATE = {"compact_at": CARD_UID_COMPACT_MIN}
+ELO_LOCK_STATS = {
+    "transactions": 0,
+    "total_ms": 0.0,
+    "max_ms": 0.0,
+    "last_ms": 0.0,
+    "wait_total_ms": 0.0,
+    "wait_max_ms": 0.0,
+    "last_wait_ms": 0.0,
+}
+ELO_LOCK_STATS_LOCK = threading.Lock()
+# Write-behind mode: answers are journaled and queued, and a background thread
+# applies them to both databases as Elo deltas every flush interval, or sooner
+# once ELO_FLUSH_MAX_ENTRIES answer sets are waiting.
+ELO_WRITE_BEHIND = os.environ.get("VERBI_ELO_WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+ELO_FLUSH_INTERVAL_SECONDS = float(os.environ.get("VERBI_ELO_FLUSH_INTERVAL", "2"))
+ELO_FLUSH_MAX_ENTRIES = int(os.environ.get("VERBI_ELO_FLUSH_MAX", "500"))
+ELO_QUEUE = []
+ELO_QUEUE_LOCK = threading.Lock()
+ELO_FLUSH_LOCK = threading.Lock()
+ELO_FLUSH_WAKE = threading.Event()
+ELO_PENDING_USER_DELTAS = {}
+ELO_PENDING_CARD_DELTAS = {}
+ELO_WRITER = None
+# Every journaled answer set carries this writer's journal key and the next
+# sequence number; a flush records the highest one per material in the same
+# transaction, and a replay skips everything at or below it.
+ELO_JOURNAL_STATE = {"key": "", "seq": 0}
+ELO_JOURNAL_MARK_DAYS = 30
+NAV_LINKS_HTML = {}
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+STATIC_FINGERPRINTS = {}
+STATIC_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_CACHE = OrderedDict()
+STATIC_CACHE_LOCK = threading.Lock()
+STATIC_CACHE_MAX_BYTES = int(os.environ.get("VERBI_STATIC_CACHE_BYTES", str(8 * 1024 * 1024)))
+STATIC_CACHE_FILE_MAX_BYTES = 512 * 1024
+STATIC_CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+STATIC_BLOCK_SIZE = 64 * 1024
+ROUTES = {}
+ROUTE_PREFIXES = []
+ROUTE_STATS = {}
+ROUTE_STATS_LOCK = threading.Lock()
+COMPRESSION_MIN_BYTES = int(os.environ.get("VERBI_COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_LEVELS = {"zstd": 3, "br": 5, "gzip": 6}
+COMPRESSION_CACHE = OrderedDict()
+COMPRESSION_CACHE_LOCK = threading.Lock()
+COMPRESSION_CACHE_MAX_ENTRIES = 128
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "image/svg+xml")
+# Beyond this Elo gap every weight is clamped to the 0.001 floor.
+ELO_WEIGHT_TABLE_SPAN = 1500
+
+
+def process_cache(name):
+    def register(reset):
+        PROCESS_CACHES[name] = reset
+        return reset
+    return register
+
+
+def reset_process_caches(*names):
+    for name, reset in list(PROCESS_CACHES.items()):
+        if not names or name in names:
+            reset()
+
+
+@process_cache("db_initialized")
+def reset_db_initialized():
+    DB_INITIALIZED.clear()
+
+
+@contextmanager
+def startup_step(name):
+    stack = STARTUP_STEPS.__dict__.setdefault("stack", [])
+    entry = {"step": name, "depth": len(stack), "self_ms": 0.0, "total_ms": 0.0}
+    with STARTUP_TIMINGS_LOCK:
+        STARTUP_TIMINGS.append(entry)
+    stack.append(entry)
+    started = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        stack.pop()
+        entry["total_ms"] = elapsed
+        entry["self_ms"] += elapsed
+        if stack:
+            stack[-1]["self_ms"] -= elapsed
+
+
+def startup_report():
+    with STARTUP_TIMINGS_LOCK:
+        timings = [dict(entry) for entry in STARTUP_TIMINGS]
+    LOGGER.info("startup: self [ms] | cumulative | step")
+    for entry in timings:
+        LOGGER.info(
+            "startup: %9.1f | %10.1f | %s%s",
+            entry["self_ms"],
+            entry["total_ms"],
+            "  " * entry["depth"],
+            entry["step"],
+        )
+    return timings
 
 
 def stable_digest(*parts):
@@ -143,7 +414,7 @@ def cloze_content_hash(sentence, answer, translation):
     return stable_digest("cloze-content", sentence, answer, translation)
 
 
-def migrate_content_identity(conn):
+def migrate_content_identity(conn, db_path=None):
     for table in ("questions", "cloze_questions"):
         columns = {
             row["name"]
@@ -250,13 +521,121 @@ def material_db_path_for_language(language):
     return MATERIAL_DB_PATHS.get(language, MATERIAL_DB_PATHS[DEFAULT_STUDY_LANGUAGE])
 
 
-def get_db(path=None, foreign_keys=True):
-    conn = sqlite3.connect(path or ACTIVE_MATERIAL_DB.get())
+def db_role(path):
+    path = os.path.abspath(path)
+    if path == os.path.abspath(DB_PATH):
+        return "runtime"
+    if path == os.path.abspath(SCRAPER_CACHE_PATH):
+        return "cache"
+    return "material"
+
+
+def storage_profile(path):
+    name = SQLITE_PROFILE_BY_ROLE.get(db_role(path), "legacy")
+    if name not in SQLITE_STORAGE_PROFILES:
+        LOGGER.warning("Unknown SQLite storage profile %r, using legacy.", name)
+        name = "legacy"
+    return name, SQLITE_STORAGE_PROFILES[name]
+
+
+def open_db(path, foreign_keys=True):
+    # Used only by the thread that opened it; the pool may close it from the
+    # finalizer of that thread's local state.
+    conn = sqlite3.connect(path, check_same_thread=False)
     conn.row_factory = sqlite3.Row
     conn.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+    _, profile = storage_profile(path)
+    for pragma in ("busy_timeout", "synchronous", "mmap_size", "cache_size"):
+        if pragma in profile:
+            conn.execute(f"PRAGMA {pragma} = {profile[pragma]}")
+    return conn
+
+
+def apply_journal_mode(conn, path):
+    _, profile = storage_profile(path)
+    wanted = profile.get("journal_mode")
+    if not wanted:
+        return
+    active = conn.execute(f"PRAGMA journal_mode = {wanted}").fetchone()[0]
+    if active.upper() != wanted.upper():
+        LOGGER.warning("%s: journal_mode is %s, wanted %s.", path, active, wanted)
+
+
+class PooledConnections:
+    # The connections of one thread. Only that thread closes them: when it
+    # next asks for one after reset_db_pool, or when it exits and its
+    # thread-local state is dropped. A forked child drops the parent's
+    # connections without closing them.
+    def __init__(self):
+        self.generation = DB_POOL_GENERATION
+        self.pid = os.getpid()
+        self.connections = {}
+
+    def add(self, key, conn):
+        self.connections[key] = conn
+        with DB_POOL_LOCK:
+            DB_POOL_OPEN[self.pid] = DB_POOL_OPEN.get(self.pid, 0) + 1
+
+    def close(self):
+        connections, self.connections = self.connections, {}
+        if self.pid != os.getpid() or not connections:
+            return
+        for conn in connections.values():
+            conn.close()
+        with DB_POOL_LOCK:
+            DB_POOL_OPEN[self.pid] -= len(connections)
+
+    def __del__(self, is_finalizing=sys.is_finalizing):
+        # Module globals may already be cleared at interpreter exit.
+        if not is_finalizing():
+            self.close()
+
+
+def pooled_connections():
+    pool = getattr(DB_POOL, "pool", None)
+    if pool is None or pool.generation != DB_POOL_GENERATION or pool.pid != os.getpid():
+        if pool is not None:
+            pool.close()
+        pool = DB_POOL.pool = PooledConnections()
+    return pool
+
+
+def get_db(path=None, foreign_keys=True):
+    # Connections are reused per worker thread; `with conn:` only scopes a
+    # transaction, it never closes the connection.
+    db_path = os.path.abspath(path or ACTIVE_MATERIAL_DB.get())
+    key = (db_path, bool(foreign_keys))
+    pool = pooled_connections()
+    conn = pool.connections.get(key)
+    reused = conn is not None
+    if not reused:
+        conn = open_db(db_path, foreign_keys=foreign_keys)
+        pool.add(key, conn)
+    with DB_POOL_LOCK:
+        stats = DB_POOL_STATS.setdefault(db_path, {"opened": 0, "reused": 0})
+        stats["reused" if reused else "opened"] += 1
     return conn
 
 
+def db_pool_stats():
+    with DB_POOL_LOCK:
+        per_path = {path: dict(stats) for path, stats in DB_POOL_STATS.items()}
+    return {
+        "generation": DB_POOL_GENERATION,
+        "thread_connections": len(pooled_connections().connections),
+        "open_connections": DB_POOL_OPEN.get(os.getpid(), 0),
+        "paths": per_path,
+    }
+
+
+@process_cache("db_pool")
+def reset_db_pool():
+    global DB_POOL_GENERATION
+    with DB_POOL_LOCK:
+        DB_POOL_GENERATION += 1
+        DB_POOL_STATS.clear()
+
+
 def get_runtime_db():
     return get_db(DB_PATH, foreign_keys=False)
 
@@ -301,442 +680,609 @@ def init_db(path=None):
     if db_path in DB_INITIALIZED:
         return
 
-    db_dir = os.path.dirname(db_path)
-    if db_dir:
-        os.makedirs(db_dir, exist_ok=True)
-    with get_db(db_path) as conn:
-        conn.executescript(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                name TEXT PRIMARY KEY,
-                password_hash TEXT NOT NULL DEFAULT '',
-                practiced_count INTEGER NOT NULL DEFAULT 0,
-                elo INTEGER NOT NULL DEFAULT 1200,
-                daily_target INTEGER NOT NULL DEFAULT 20,
-                daily_streak INTEGER NOT NULL DEFAULT 0,
-                daily_last_completed TEXT NOT NULL DEFAULT '',
-                daily_vacation_mode INTEGER NOT NULL DEFAULT 0,
-                daily_state_json TEXT NOT NULL DEFAULT '',
-                session_token TEXT NOT NULL DEFAULT '',
-                password_reset_required INTEGER NOT NULL DEFAULT 0,
-                is_admin INTEGER NOT NULL DEFAULT 0,
-                state_json TEXT NOT NULL DEFAULT '{}',
-                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_users_session_token
-                ON users(session_token);
-
-            CREATE TABLE IF NOT EXISTS verbs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                infinitive TEXT NOT NULL UNIQUE,
-                ja TEXT NOT NULL
-            );
-
-            CREATE TABLE IF NOT EXISTS verb_forms (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                verb_id INTEGER NOT NULL REFERENCES verbs(id) ON DELETE CASCADE,
-                tense TEXT NOT NULL,
-                pronoun TEXT NOT NULL,
-                value TEXT NOT NULL,
-                gender TEXT NOT NULL DEFAULT ''
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_verb_forms_verb_id
-                ON verb_forms(verb_id);
-
-            CREATE TABLE IF NOT EXISTS user_flashcards (
-                user_name TEXT NOT NULL REFERENCES users(name) ON DELETE CASCADE,
-                verb_id INTEGER NOT NULL REFERENCES verbs(id) ON DELETE CASCADE,
-                PRIMARY KEY (user_name, verb_id)
-            );
-
-            CREATE TABLE IF NOT EXISTS questions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                uid TEXT NOT NULL DEFAULT '',
-                kind TEXT NOT NULL,
-                verb_id INTEGER NOT NULL REFERENCES verbs(id) ON DELETE CASCADE,
-                verb_form_id INTEGER REFERENCES verb_forms(id) ON DELETE CASCADE,
-                prompt TEXT NOT NULL,
-                answer TEXT NOT NULL,
-                content_hash TEXT NOT NULL DEFAULT '',
-                revision INTEGER NOT NULL DEFAULT 1,
-                elo INTEGER NOT NULL DEFAULT 1200,
-                active INTEGER NOT NULL DEFAULT 1,
-                status TEXT NOT NULL DEFAULT 'approved',
-                is_new INTEGER NOT NULL DEFAULT 0,
-                UNIQUE(kind, verb_id, verb_form_id)
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_questions_kind_elo
-                ON questions(kind, elo);
-
-            CREATE TABLE IF NOT EXISTS practice_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_name TEXT NOT NULL REFERENCES users(name) ON DELETE CASCADE,
-                question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
-                question_uid TEXT NOT NULL DEFAULT '',
-                question_revision INTEGER NOT NULL DEFAULT 1,
-                game TEXT NOT NULL,
-                correct INTEGER NOT NULL,
-                user_elo_before INTEGER NOT NULL,
-                user_elo_after INTEGER NOT NULL,
-                question_elo_before INTEGER NOT NULL,
-                question_elo_after INTEGER NOT NULL,
-                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
-            );
-
-            CREATE TABLE IF NOT EXISTS cloze_questions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                uid TEXT NOT NULL DEFAULT '',
-                sentence TEXT NOT NULL UNIQUE,
-                answer TEXT NOT NULL,
-                translation TEXT NOT NULL,
-                content_hash TEXT NOT NULL DEFAULT '',
-                revision INTEGER NOT NULL DEFAULT 1,
-                elo INTEGER NOT NULL DEFAULT 1200,
-                active INTEGER NOT NULL DEFAULT 1,
-                status TEXT NOT NULL DEFAULT 'approved',
-                is_new INTEGER NOT NULL DEFAULT 0
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_cloze_questions_elo
-                ON cloze_questions(elo);
-
-            CREATE TABLE IF NOT EXISTS cloze_practice_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_name TEXT NOT NULL REFERENCES users(name) ON DELETE CASCADE,
-                cloze_question_id INTEGER NOT NULL REFERENCES cloze_questions(id) ON DELETE CASCADE,
-                cloze_question_uid TEXT NOT NULL DEFAULT '',
-                cloze_question_revision INTEGER NOT NULL DEFAULT 1,
-                correct INTEGER NOT NULL,
-                user_elo_before INTEGER NOT NULL,
-                user_elo_after INTEGER NOT NULL,
-                question_elo_before INTEGER NOT NULL,
-                question_elo_after INTEGER NOT NULL,
-                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
-            );
-
-            CREATE TABLE IF NOT EXISTS user_card_state (
-                user_name TEXT NOT NULL REFERENCES users(name) ON DELETE CASCADE,
-                card_uid TEXT NOT NULL,
-                card_type TEXT NOT NULL,
-                first_seen TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                last_seen TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                seen_count INTEGER NOT NULL DEFAULT 0,
-                correct_count INTEGER NOT NULL DEFAULT 0,
-                card_revision INTEGER NOT NULL DEFAULT 1,
-                PRIMARY KEY (user_name, card_uid)
-            );
-
-            CREATE TABLE IF NOT EXISTS pending_content (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                content_type TEXT NOT NULL,
-                payload_json TEXT NOT NULL,
-                status TEXT NOT NULL DEFAULT 'pending',
-                created_by TEXT REFERENCES users(name) ON DELETE SET NULL,
-                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                reviewed_by TEXT REFERENCES users(name) ON DELETE SET NULL,
-                reviewed_at TEXT
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_pending_content_status
-                ON pending_content(status);
-
-            CREATE TABLE IF NOT EXISTS content_sources (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                slug TEXT NOT NULL UNIQUE,
-                name TEXT NOT NULL,
-                url TEXT NOT NULL,
-                license_name TEXT NOT NULL,
-                license_url TEXT NOT NULL,
-                attribution TEXT NOT NULL,
-                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
-            );
-            """
-        )
+    with startup_step(f"init_db {os.path.basename(db_path)}"):
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        apply_journal_mode(get_db(db_path), db_path)
+        migrate_schema(get_db(db_path), db_path)
 
-        conn.execute(
-            """
-            INSERT INTO content_sources
-                (slug, name, url, license_name, license_url, attribution)
-            VALUES (?, ?, ?, ?, ?, ?)
-            ON CONFLICT(slug) DO UPDATE SET
-                name = excluded.name,
-                url = excluded.url,
-                license_name = excluded.license_name,
-                license_url = excluded.license_url,
-                attribution = excluded.attribution
-            """,
-            (
-                "verbecc",
-                "Verbecc",
-                "https://github.com/bretttolbert/verbecc",
-                "GNU Lesser General Public License v3.0",
-                "https://www.gnu.org/licenses/lgpl-3.0.html",
-                "Italian conjugation data and templates generated through Verbecc with ML prediction disabled.",
-            ),
-        )
+    DB_INITIALIZED.add(db_path)
 
-        user_columns = {
-            row["name"]
-            for row in conn.execute("PRAGMA table_info(users)").fetchall()
-        }
-        user_migrations = {
-            "elo": f"INTEGER NOT NULL DEFAULT {DEFAULT_ELO}",
-            "daily_target": f"INTEGER NOT NULL DEFAULT {DEFAULT_DAILY_TARGET}",
-            "daily_streak": "INTEGER NOT NULL DEFAULT 0",
-            "daily_last_completed": "TEXT NOT NULL DEFAULT ''",
-            "daily_vacation_mode": "INTEGER NOT NULL DEFAULT 0",
-            "daily_state_json": "TEXT NOT NULL DEFAULT ''",
-            "study_language": f"TEXT NOT NULL DEFAULT '{DEFAULT_STUDY_LANGUAGE}'",
-        }
-        for column, definition in user_migrations.items():
-            if column not in user_columns:
-                conn.execute(f"ALTER TABLE users ADD COLUMN {column} {definition}")
-
-        for table in ("questions", "cloze_questions"):
-            columns = {
-                row["name"]
-                for row in conn.execute(f"PRAGMA table_info({table})").fetchall()
-            }
-            if "status" not in columns:
-                conn.execute(
-                    f"ALTER TABLE {table} ADD COLUMN status TEXT NOT NULL DEFAULT 'approved'"
-                )
-            if "is_new" not in columns:
-                conn.execute(
-                    f"ALTER TABLE {table} ADD COLUMN is_new INTEGER NOT NULL DEFAULT 0"
-                )
-            if "source_id" not in columns:
-                conn.execute(f"ALTER TABLE {table} ADD COLUMN source_id INTEGER")
 
-        for table in ("verbs", "verb_forms", "pending_content"):
-            columns = {
-                row["name"]
-                for row in conn.execute(f"PRAGMA table_info({table})").fetchall()
-            }
-            if "source_id" not in columns:
-                conn.execute(f"ALTER TABLE {table} ADD COLUMN source_id INTEGER")
+SCHEMA_TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS users (
+    name TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL DEFAULT '',
+    practiced_count INTEGER NOT NULL DEFAULT 0,
+    elo INTEGER NOT NULL DEFAULT 1200,
+    daily_target INTEGER NOT NULL DEFAULT 20,
+    daily_streak INTEGER NOT NULL DEFAULT 0,
+    daily_last_completed TEXT NOT NULL DEFAULT '',
+    daily_vacation_mode INTEGER NOT NULL DEFAULT 0,
+    daily_state_json TEXT NOT NULL DEFAULT '',
+    session_token TEXT NOT NULL DEFAULT '',
+    password_reset_required INTEGER NOT NULL DEFAULT 0,
+    is_admin INTEGER NOT NULL DEFAULT 0,
+    state_json TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_users_session_token
+    ON users(session_token);
+
+CREATE TABLE IF NOT EXISTS verbs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    infinitive TEXT NOT NULL UNIQUE,
+    ja TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS verb_forms (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    verb_id INTEGER NOT NULL REFERENCES verbs(id) ON DELETE CASCADE,
+    tense TEXT NOT NULL,
+    pronoun TEXT NOT NULL,
+    value TEXT NOT NULL,
+    gender TEXT NOT NULL DEFAULT ''
+);
+
+CREATE INDEX IF NOT EXISTS idx_verb_forms_verb_id
+    ON verb_forms(verb_id);
+
+CREATE TABLE IF NOT EXISTS user_flashcards (
+    user_name TEXT NOT NULL REFERENCES users(name) ON DELETE CASCADE,
+    verb_id INTEGER NOT NULL REFERENCES verbs(id) ON DELETE CASCADE,
+    PRIMARY KEY (user_name, verb_id)
+);
+
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT NOT NULL DEFAULT '',
+    kind TEXT NOT NULL,
+    verb_id INTEGER NOT NULL REFERENCES verbs(id) ON DELETE CASCADE,
+    verb_form_id INTEGER REFERENCES verb_forms(id) ON DELETE CASCADE,
+    prompt TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    content_hash TEXT NOT NULL DEFAULT '',
+    revision INTEGER NOT NULL DEFAULT 1,
+    elo INTEGER NOT NULL DEFAULT 1200,
+    active INTEGER NOT NULL DEFAULT 1,
+    status TEXT NOT NULL DEFAULT 'approved',
+    is_new INTEGER NOT NULL DEFAULT 0,
+    UNIQUE(kind, verb_id, verb_form_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_questions_kind_elo
+    ON questions(kind, elo);
+
+CREATE TABLE IF NOT EXISTS practice_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_name TEXT NOT NULL REFERENCES users(name) ON DELETE CASCADE,
+    question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    question_uid TEXT NOT NULL DEFAULT '',
+    question_revision INTEGER NOT NULL DEFAULT 1,
+    game TEXT NOT NULL,
+    correct INTEGER NOT NULL,
+    user_elo_before INTEGER NOT NULL,
+    user_elo_after INTEGER NOT NULL,
+    question_elo_before INTEGER NOT NULL,
+    question_elo_after INTEGER NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS cloze_questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT NOT NULL DEFAULT '',
+    sentence TEXT NOT NULL UNIQUE,
+    answer TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    content_hash TEXT NOT NULL DEFAULT '',
+    revision INTEGER NOT NULL DEFAULT 1,
+    elo INTEGER NOT NULL DEFAULT 1200,
+    active INTEGER NOT NULL DEFAULT 1,
+    status TEXT NOT NULL DEFAULT 'approved',
+    is_new INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_cloze_questions_elo
+    ON cloze_questions(elo);
+
+CREATE TABLE IF NOT EXISTS cloze_practice_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_name TEXT NOT NULL REFERENCES users(name) ON DELETE CASCADE,
+    cloze_question_id INTEGER NOT NULL REFERENCES cloze_questions(id) ON DELETE CASCADE,
+    cloze_question_uid TEXT NOT NULL DEFAULT '',
+    cloze_question_revision INTEGER NOT NULL DEFAULT 1,
+    correct INTEGER NOT NULL,
+    user_elo_before INTEGER NOT NULL,
+    user_elo_after INTEGER NOT NULL,
+    question_elo_before INTEGER NOT NULL,
+    question_elo_after INTEGER NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_card_state (
+    user_name TEXT NOT NULL REFERENCES users(name) ON DELETE CASCADE,
+    card_uid TEXT NOT NULL,
+    card_type TEXT NOT NULL,
+    first_seen TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_seen TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    seen_count INTEGER NOT NULL DEFAULT 0,
+    correct_count INTEGER NOT NULL DEFAULT 0,
+    card_revision INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (user_name, card_uid)
+);
+
+CREATE TABLE IF NOT EXISTS pending_content (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_type TEXT NOT NULL,
+    payload_json TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_by TEXT REFERENCES users(name) ON DELETE SET NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    reviewed_by TEXT REFERENCES users(name) ON DELETE SET NULL,
+    reviewed_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_pending_content_status
+    ON pending_content(status);
+
+CREATE TABLE IF NOT EXISTS content_sources (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    slug TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    license_name TEXT NOT NULL,
+    license_url TEXT NOT NULL,
+    attribution TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def migrate_create_tables(conn, db_path):
+    for statement in SCHEMA_TABLES_SQL.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+
+
+def migrate_content_sources(conn, db_path):
+    conn.execute(
+        """
+        INSERT INTO content_sources
+            (slug, name, url, license_name, license_url, attribution)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(slug) DO UPDATE SET
+            name = excluded.name,
+            url = excluded.url,
+            license_name = excluded.license_name,
+            license_url = excluded.license_url,
+            attribution = excluded.attribution
+        """,
+        (
+            "verbecc",
+            "Verbecc",
+            "https://github.com/bretttolbert/verbecc",
+            "GNU Lesser General Public License v3.0",
+            "https://www.gnu.org/licenses/lgpl-3.0.html",
+            "Italian conjugation data and templates generated through Verbecc with ML prediction disabled.",
+        ),
+    )
 
-        event_migrations = {
-            "practice_events": {
-                "question_uid": "TEXT NOT NULL DEFAULT ''",
-                "question_revision": "INTEGER NOT NULL DEFAULT 1",
-            },
-            "cloze_practice_events": {
-                "cloze_question_uid": "TEXT NOT NULL DEFAULT ''",
-                "cloze_question_revision": "INTEGER NOT NULL DEFAULT 1",
-            },
-        }
-        for table, migrations in event_migrations.items():
-            columns = {
-                row["name"]
-                for row in conn.execute(f"PRAGMA table_info({table})").fetchall()
-            }
-            for column, definition in migrations.items():
-                if column not in columns:
-                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
 
-        is_italian_material_db = os.path.abspath(db_path) == os.path.abspath(MATERIAL_DB_PATHS["it_ja"])
+def migrate_user_columns(conn, db_path):
+    user_columns = {
+        row["name"]
+        for row in conn.execute("PRAGMA table_info(users)").fetchall()
+    }
+    user_migrations = {
+        "elo": f"INTEGER NOT NULL DEFAULT {DEFAULT_ELO}",
+        "daily_target": f"INTEGER NOT NULL DEFAULT {DEFAULT_DAILY_TARGET}",
+        "daily_streak": "INTEGER NOT NULL DEFAULT 0",
+        "daily_last_completed": "TEXT NOT NULL DEFAULT ''",
+        "daily_vacation_mode": "INTEGER NOT NULL DEFAULT 0",
+        "daily_state_json": "TEXT NOT NULL DEFAULT ''",
+        "study_language": f"TEXT NOT NULL DEFAULT '{DEFAULT_STUDY_LANGUAGE}'",
+    }
+    for column, definition in user_migrations.items():
+        if column not in user_columns:
+            conn.execute(f"ALTER TABLE users ADD COLUMN {column} {definition}")
 
-        verb_count = conn.execute("SELECT COUNT(*) FROM verbs").fetchone()[0]
-        if verb_count == 0 and is_italian_material_db:
-            for verb in load_seed_verbs():
-                cursor = conn.execute(
-                    "INSERT INTO verbs (infinitive, ja) VALUES (?, ?)",
-                    (verb["infinitive"], verb["ja"]),
-                )
-                verb_id = cursor.lastrowid
-                conn.executemany(
-                    """
-                    INSERT INTO verb_forms
-                        (verb_id, tense, pronoun, value, gender)
-                    VALUES (?, ?, ?, ?, ?)
-                    """,
-                    [
-                        (
-                            verb_id,
-                            form["tense"],
-                            form["pronoun"],
-                            form["value"],
-                            form.get("gender", ""),
-                        )
-                        for form in verb["forms"]
-                    ],
-                )
 
-        question_count = conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
-        if question_count == 0:
+def migrate_content_columns(conn, db_path):
+    for table in ("questions", "cloze_questions"):
+        columns = {
+            row["name"]
+            for row in conn.execute(f"PRAGMA table_info({table})").fetchall()
+        }
+        if "status" not in columns:
             conn.execute(
-                """
-                INSERT OR IGNORE INTO questions
-                    (kind, verb_id, verb_form_id, prompt, answer, elo)
-                SELECT 'flashcard', id, NULL, infinitive, ja, ?
-                FROM verbs
-                """,
-                (DEFAULT_ELO,),
+                f"ALTER TABLE {table} ADD COLUMN status TEXT NOT NULL DEFAULT 'approved'"
             )
+        if "is_new" not in columns:
             conn.execute(
-                """
-                INSERT OR IGNORE INTO questions
-                    (kind, verb_id, verb_form_id, prompt, answer, elo)
-                SELECT
-                    'verb_form',
-                    v.id,
-                    vf.id,
-                    v.infinitive || '|' || v.ja || '|' || vf.tense || '|'
-                        || vf.pronoun || '|' || vf.gender,
-                    vf.value,
-                    ?
-                FROM verb_forms vf
-                JOIN verbs v ON v.id = vf.verb_id
-                """,
-                (DEFAULT_ELO,),
+                f"ALTER TABLE {table} ADD COLUMN is_new INTEGER NOT NULL DEFAULT 0"
             )
+        if "source_id" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN source_id INTEGER")
 
-        cloze_count = conn.execute(
-            "SELECT COUNT(*) FROM cloze_questions"
-        ).fetchone()[0]
-        if cloze_count == 0 and is_italian_material_db:
+    for table in ("verbs", "verb_forms", "pending_content"):
+        columns = {
+            row["name"]
+            for row in conn.execute(f"PRAGMA table_info({table})").fetchall()
+        }
+        if "source_id" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN source_id INTEGER")
+
+
+def migrate_event_columns(conn, db_path):
+    event_migrations = {
+        "practice_events": {
+            "question_uid": "TEXT NOT NULL DEFAULT ''",
+            "question_revision": "INTEGER NOT NULL DEFAULT 1",
+        },
+        "cloze_practice_events": {
+            "cloze_question_uid": "TEXT NOT NULL DEFAULT ''",
+            "cloze_question_revision": "INTEGER NOT NULL DEFAULT 1",
+        },
+    }
+    for table, migrations in event_migrations.items():
+        columns = {
+            row["name"]
+            for row in conn.execute(f"PRAGMA table_info({table})").fetchall()
+        }
+        for column, definition in migrations.items():
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def migrate_seed_content(conn, db_path):
+    is_italian_material_db = os.path.abspath(db_path) == os.path.abspath(MATERIAL_DB_PATHS["it_ja"])
+
+    verb_count = conn.execute("SELECT COUNT(*) FROM verbs").fetchone()[0]
+    if verb_count == 0 and is_italian_material_db:
+        for verb in load_seed_verbs():
+            cursor = conn.execute(
+                "INSERT INTO verbs (infinitive, ja) VALUES (?, ?)",
+                (verb["infinitive"], verb["ja"]),
+            )
+            verb_id = cursor.lastrowid
             conn.executemany(
                 """
-                INSERT OR IGNORE INTO cloze_questions
-                    (sentence, answer, translation, elo)
-                VALUES (?, ?, ?, ?)
+                INSERT INTO verb_forms
+                    (verb_id, tense, pronoun, value, gender)
+                VALUES (?, ?, ?, ?, ?)
                 """,
                 [
-                    (sentence, answer, translation, DEFAULT_ELO)
-                    for sentence, answer, translation in CLOZE_EXAMPLES
+                    (
+                        verb_id,
+                        form["tense"],
+                        form["pronoun"],
+                        form["value"],
+                        form.get("gender", ""),
+                    )
+                    for form in verb["forms"]
                 ],
             )
 
-        migrate_content_identity(conn)
+    question_count = conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+    if question_count == 0:
         conn.execute(
             """
-            UPDATE practice_events
-            SET question_uid = (
-                    SELECT uid FROM questions WHERE questions.id = practice_events.question_id
-                ),
-                question_revision = (
-                    SELECT revision FROM questions WHERE questions.id = practice_events.question_id
-                )
-            WHERE question_uid = ''
-                AND EXISTS (
-                    SELECT 1 FROM questions WHERE questions.id = practice_events.question_id
-                )
-            """
+            INSERT OR IGNORE INTO questions
+                (kind, verb_id, verb_form_id, prompt, answer, elo)
+            SELECT 'flashcard', id, NULL, infinitive, ja, ?
+            FROM verbs
+            """,
+            (DEFAULT_ELO,),
         )
         conn.execute(
             """
-            UPDATE cloze_practice_events
-            SET cloze_question_uid = (
-                    SELECT uid FROM cloze_questions WHERE cloze_questions.id = cloze_practice_events.cloze_question_id
-                ),
-                cloze_question_revision = (
-                    SELECT revision FROM cloze_questions WHERE cloze_questions.id = cloze_practice_events.cloze_question_id
-                )
-            WHERE cloze_question_uid = ''
-                AND EXISTS (
-                    SELECT 1 FROM cloze_questions WHERE cloze_questions.id = cloze_practice_events.cloze_question_id
-                )
+            INSERT OR IGNORE INTO questions
+                (kind, verb_id, verb_form_id, prompt, answer, elo)
+            SELECT
+                'verb_form',
+                v.id,
+                vf.id,
+                v.infinitive || '|' || v.ja || '|' || vf.tense || '|'
+                    || vf.pronoun || '|' || vf.gender,
+                vf.value,
+                ?
+            FROM verb_forms vf
+            JOIN verbs v ON v.id = vf.verb_id
+            """,
+            (DEFAULT_ELO,),
+        )
+
+    cloze_count = conn.execute(
+        "SELECT COUNT(*) FROM cloze_questions"
+    ).fetchone()[0]
+    if cloze_count == 0 and is_italian_material_db:
+        conn.executemany(
             """
+            INSERT OR IGNORE INTO cloze_questions
+                (sentence, answer, translation, elo)
+            VALUES (?, ?, ?, ?)
+            """,
+            [
+                (sentence, answer, translation, DEFAULT_ELO)
+                for sentence, answer, translation in CLOZE_EXAMPLES
+            ],
         )
 
-        is_runtime_db = os.path.abspath(db_path) == os.path.abspath(DB_PATH)
-        user_count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
-        if is_runtime_db and user_count == 0 and os.path.exists(USERS_PATH):
-            try:
-                with open(USERS_PATH, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-            except (OSError, json.JSONDecodeError):
-                data = {"users": {}}
 
-            for name, user in data.get("users", {}).items():
-                if not isinstance(user, dict):
-                    continue
-                state = user.get("state") or {}
-                conn.execute(
-                    """
-                    INSERT OR IGNORE INTO users
-                        (
-                            name,
-                            password_hash,
-                            practiced_count,
-                            elo,
-                            daily_target,
-                            daily_streak,
-                            daily_last_completed,
-                            daily_vacation_mode,
-                            session_token,
-                            password_reset_required,
-                            is_admin,
-                            state_json
-                        )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
+def migrate_event_card_uids(conn, db_path):
+    conn.execute(
+        """
+        UPDATE practice_events
+        SET question_uid = (
+                SELECT uid FROM questions WHERE questions.id = practice_events.question_id
+            ),
+            question_revision = (
+                SELECT revision FROM questions WHERE questions.id = practice_events.question_id
+            )
+        WHERE question_uid = ''
+            AND EXISTS (
+                SELECT 1 FROM questions WHERE questions.id = practice_events.question_id
+            )
+        """
+    )
+    conn.execute(
+        """
+        UPDATE cloze_practice_events
+        SET cloze_question_uid = (
+                SELECT uid FROM cloze_questions WHERE cloze_questions.id = cloze_practice_events.cloze_question_id
+            ),
+            cloze_question_revision = (
+                SELECT revision FROM cloze_questions WHERE cloze_questions.id = cloze_practice_events.cloze_question_id
+            )
+        WHERE cloze_question_uid = ''
+            AND EXISTS (
+                SELECT 1 FROM cloze_questions WHERE cloze_questions.id = cloze_practice_events.cloze_question_id
+            )
+        """
+    )
+
+
+def migrate_users_json(conn, db_path):
+    is_runtime_db = os.path.abspath(db_path) == os.path.abspath(DB_PATH)
+    user_count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    if is_runtime_db and user_count == 0 and os.path.exists(USERS_PATH):
+        try:
+            with open(USERS_PATH, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            data = {"users": {}}
+
+        for name, user in data.get("users", {}).items():
+            if not isinstance(user, dict):
+                continue
+            state = user.get("state") or {}
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO users
                     (
                         name,
-                        user.get("password", ""),
-                        int(state.get("practiced_count", 0)),
-                        int(user.get("elo", DEFAULT_ELO)),
-                        int(user.get("daily_target", DEFAULT_DAILY_TARGET)),
-                        int(user.get("daily_streak", 0)),
-                        user.get("daily_last_completed", ""),
-                        1 if user.get("daily_vacation_mode") else 0,
-                        user.get("session_token", ""),
-                        1 if user.get("password_reset_required") else 0,
-                        1 if user.get("is_admin") or name == "admin" else 0,
-                        json.dumps(
-                            {
-                                key: value
-                                for key, value in state.items()
-                                if key != "practiced_count"
-                            },
-                            ensure_ascii=False,
-                        ),
+                        password_hash,
+                        practiced_count,
+                        elo,
+                        daily_target,
+                        daily_streak,
+                        daily_last_completed,
+                        daily_vacation_mode,
+                        session_token,
+                        password_reset_required,
+                        is_admin,
+                        state_json
+                    )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    name,
+                    user.get("password", ""),
+                    int(state.get("practiced_count", 0)),
+                    int(user.get("elo", DEFAULT_ELO)),
+                    int(user.get("daily_target", DEFAULT_DAILY_TARGET)),
+                    int(user.get("daily_streak", 0)),
+                    user.get("daily_last_completed", ""),
+                    1 if user.get("daily_vacation_mode") else 0,
+                    user.get("session_token", ""),
+                    1 if user.get("password_reset_required") else 0,
+                    1 if user.get("is_admin") or name == "admin" else 0,
+                    json.dumps(
+                        {
+                            key: value
+                            for key, value in state.items()
+                            if key != "practiced_count"
+                        },
+                        ensure_ascii=False,
                     ),
-                )
+                ),
+            )
+
+
+def migrate_elo_journal_marks(conn, db_path):
+    if os.path.abspath(db_path) != os.path.abspath(DB_PATH):
+        return
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS elo_journal_flushed (
+            journal TEXT NOT NULL,
+            material TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            flushed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (journal, material)
+        )
+        """
+    )
+
+
+# Ordered, append-only: every step must be idempotent, and a new step gets the
+# next version number instead of editing an applied one. The backfills in 7
+# and 8 only need to run once: every insert path writes uid, content_hash and
+# the event uid columns itself, and a database restored from an older build
+# carries an older user_version, so it is migrated again.
+SCHEMA_MIGRATIONS = [
+    (1, "create_tables", migrate_create_tables),
+    (2, "content_sources", migrate_content_sources),
+    (3, "user_columns", migrate_user_columns),
+    (4, "content_columns", migrate_content_columns),
+    (5, "event_columns", migrate_event_columns),
+    (6, "seed_content", migrate_seed_content),
+    (7, "content_identity", migrate_content_identity),
+    (8, "event_card_uids", migrate_event_card_uids),
+    (9, "users_json", migrate_users_json),
+    (10, "elo_journal_marks", migrate_elo_journal_marks),
+]
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+
+def applied_migrations(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    return {row[0] for row in conn.execute("SELECT version FROM schema_migrations").fetchall()}
+
+
+def migrate_schema(conn, db_path):
+    # PRAGMA user_version is stamped with SCHEMA_VERSION once every step is
+    # recorded, so an up-to-date database skips the schema_migrations lookup.
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    applied = applied_migrations(conn)
+    for version, name, migrate in SCHEMA_MIGRATIONS:
+        if version in applied:
+            continue
+        with startup_step(f"migration {version} {name}"):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another worker may have applied it while we waited for the lock.
+                if conn.execute(
+                    "SELECT 1 FROM schema_migrations WHERE version = ?", (version,)
+                ).fetchone() is None:
+                    migrate(conn, db_path)
+                    conn.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (?, ?)",
+                        (version, name),
+                    )
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def user_record(row):
+    try:
+        extra_state = json.loads(row["state_json"] or "{}")
+    except json.JSONDecodeError:
+        extra_state = {}
+    state = dict(extra_state)
+    state["practiced_count"] = int(row["practiced_count"])
+    return {
+        "name": row["name"],
+        "password": row["password_hash"],
+        "elo": int(row["elo"]) + (pending_user_elo_delta(row["name"]) if ELO_WRITE_BEHIND else 0),
+        "daily_target": int(row["daily_target"]),
+        "daily_streak": int(row["daily_streak"]),
+        "daily_last_completed": row["daily_last_completed"],
+        "daily_vacation_mode": bool(row["daily_vacation_mode"]),
+        "study_language": row["study_language"] if "study_language" in row.keys() else DEFAULT_STUDY_LANGUAGE,
+        "state": state,
+        "session_token": row["session_token"],
+        "password_reset_required": bool(row["password_reset_required"]),
+        "is_admin": bool(row["is_admin"]) or row["name"] == "admin",
+    }
 
-    DB_INITIALIZED.add(db_path)
+
+def storage_settings(path):
+    init_db(path)
+    conn = get_db(path)
+    name, _ = storage_profile(path)
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    return {
+        "path": os.path.abspath(path),
+        "role": db_role(path),
+        "profile": name,
+        "journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0].upper(),
+        "synchronous": SQLITE_SYNCHRONOUS_NAMES.get(synchronous, str(synchronous)),
+        "busy_timeout": conn.execute("PRAGMA busy_timeout").fetchone()[0],
+        "mmap_size": conn.execute("PRAGMA mmap_size").fetchone()[0],
+        "cache_size": conn.execute("PRAGMA cache_size").fetchone()[0],
+    }
+
+
+def check_storage_settings():
+    report = []
+    for path in [DB_PATH, *MATERIAL_DB_PATHS.values()]:
+        settings = storage_settings(path)
+        _, profile = storage_profile(path)
+        mismatched = [
+            key
+            for key in ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size")
+            if key in profile and str(settings[key]).upper() != str(profile[key]).upper()
+        ]
+        settings["mismatched"] = mismatched
+        report.append(settings)
+        LOGGER.info(
+            "%s (%s, %s): journal_mode=%s synchronous=%s busy_timeout=%s mmap_size=%s cache_size=%s",
+            settings["path"],
+            settings["role"],
+            settings["profile"],
+            settings["journal_mode"],
+            settings["synchronous"],
+            settings["busy_timeout"],
+            settings["mmap_size"],
+            settings["cache_size"],
+        )
+        if mismatched:
+            LOGGER.warning("%s: settings differ from profile: %s", settings["path"], ", ".join(mismatched))
+    return report
 
 
 def load_users():
     init_db(DB_PATH)
-    users = {}
     with get_runtime_db() as conn:
         rows = conn.execute("SELECT * FROM users ORDER BY name").fetchall()
-    for row in rows:
-        try:
-            extra_state = json.loads(row["state_json"] or "{}")
-        except json.JSONDecodeError:
-            extra_state = {}
-        state = dict(extra_state)
-        state["practiced_count"] = int(row["practiced_count"])
-        users[row["name"]] = {
-            "name": row["name"],
-            "password": row["password_hash"],
-            "elo": int(row["elo"]),
-            "daily_target": int(row["daily_target"]),
-            "daily_streak": int(row["daily_streak"]),
-            "daily_last_completed": row["daily_last_completed"],
-            "daily_vacation_mode": bool(row["daily_vacation_mode"]),
-            "study_language": row["study_language"] if "study_language" in row.keys() else DEFAULT_STUDY_LANGUAGE,
-            "state": state,
-            "session_token": row["session_token"],
-            "password_reset_required": bool(row["password_reset_required"]),
-            "is_admin": bool(row["is_admin"]) or row["name"] == "admin",
-        }
-    return {"users": users}
+    return {"users": {row["name"]: user_record(row) for row in rows}}
+
+
+def load_user(name):
+    init_db(DB_PATH)
+    with get_runtime_db() as conn:
+        row = conn.execute("SELECT * FROM users WHERE name = ?", (name,)).fetchone()
+    return user_record(row) if row else None
 
 
 def has_users():
+    # Users are never deleted, so once one exists the answer is cached for
+    # the life of the process.
+    if BOOTSTRAP_STATE["has_users"]:
+        return True
     init_db(DB_PATH)
     with get_runtime_db() as conn:
-        return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] > 0
+        found = conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is not None
+    if found:
+        BOOTSTRAP_STATE["has_users"] = True
+    return found
+
+
+@process_cache("bootstrap")
+def reset_bootstrap_state():
+    BOOTSTRAP_STATE["has_users"] = False
 
 
 def save_users(data):
+    # elo and practiced_count are only set when a user is created; after that
+    # the answer paths own them. A loaded user carries the write-behind
+    # overlay in "elo", and writing that back would apply the queued deltas
+    # twice.
     init_db(DB_PATH)
     with get_runtime_db() as conn:
         for name, user in data.get("users", {}).items():
@@ -763,8 +1309,6 @@ def save_users(data):
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT(name) DO UPDATE SET
                     password_hash = excluded.password_hash,
-                    practiced_count = excluded.practiced_count,
-                    elo = excluded.elo,
                     daily_target = excluded.daily_target,
                     daily_streak = excluded.daily_streak,
                     daily_last_completed = excluded.daily_last_completed,
@@ -791,44 +1335,53 @@ def save_users(data):
                     json.dumps(state, ensure_ascii=False),
                 ),
             )
-
-
-def load_verbs():
-    init_db()
-    verbs = []
-    with get_db() as conn:
-        verb_rows = conn.execute(
-            "SELECT id, infinitive, ja FROM verbs ORDER BY infinitive"
-        ).fetchall()
-        for verb in verb_rows:
-            form_rows = conn.execute(
+    # Only after the commit: invalidating earlier lets a concurrent request
+    # reload and cache the old row.
+    for name in data.get("users", {}):
+        forget_user_sessions(name)
+    if data.get("users"):
+        BOOTSTRAP_STATE["has_users"] = True
+
+def load_verbs(path=None):
+    init_db(path)
+    with startup_step("load_verbs"):
+        with get_db(path) as conn:
+            rows = conn.execute(
+                """
+                SELECT v.infinitive, v.ja, vf.tense, vf.pronoun, vf.value, vf.gender
+                FROM verbs v
+                LEFT JOIN verb_forms vf ON vf.verb_id = v.id
+                ORDER BY v.infinitive, vf.id
                 """
-                SELECT tense, pronoun, value, gender
-                FROM verb_forms
-                WHERE verb_id = ?
-                ORDER BY id
-                """,
-                (verb["id"],),
             ).fetchall()
-            verbs.append(
-                {
-                    "infinitive": verb["infinitive"],
-                    "ja": verb["ja"],
-                    "forms": [
-                        {
-                            "tense": form["tense"],
-                            "pronoun": form["pronoun"],
-                            "value": form["value"],
-                            **({"gender": form["gender"]} if form["gender"] else {}),
-                        }
-                        for form in form_rows
-                    ],
-                }
-            )
+    verbs = []
+    for row in rows:
+        if not verbs or verbs[-1]["infinitive"] != row["infinitive"]:
+            verbs.append({"infinitive": row["infinitive"], "ja": row["ja"], "forms": []})
+        if row["tense"] is None:
+            continue
+        verbs[-1]["forms"].append(
+            {
+                "tense": row["tense"],
+                "pronoun": row["pronoun"],
+                "value": row["value"],
+                **({"gender": row["gender"]} if row["gender"] else {}),
+            }
+        )
     return verbs
 
 
-VERBS = load_verbs()
+def fallback_verbs():
+    # Only needed when the question bank is empty, so the verbs are loaded on
+    # first use instead of at import time in every worker.
+    if not FALLBACK_VERBS:
+        FALLBACK_VERBS[:] = load_verbs(MATERIAL_DB_PATHS[DEFAULT_STUDY_LANGUAGE])
+    return FALLBACK_VERBS
+
+
+@process_cache("fallback_verbs")
+def reset_fallback_verbs():
+    FALLBACK_VERBS.clear()
 
 
 def password_hash(password, salt=None):
@@ -875,17 +1428,68 @@ def clear_session_cookie(headers):
     )
 
 
-def current_user(environ):
-    token = get_cookie(environ, "verbi_session")
-    if not token:
-        return None, None
-    users = load_users()
-    for name, user in users["users"].items():
-        if hmac.compare_digest(user.get("session_token", ""), token):
-            return name, user
-    return None, None
-
-
+def load_session_user(token):
+    init_db(DB_PATH)
+    with get_runtime_db() as conn:
+        row = conn.execute(
+            "SELECT * FROM users WHERE session_token = ?",
+            (token,),
+        ).fetchone()
+    if not row or not hmac.compare_digest(row["session_token"], token):
+        return None
+    return user_record(row)
+
+
+def copy_user_record(user):
+    return {**user, "state": dict(user["state"])}
+
+
+def cached_session_user(token):
+    now = time.monotonic()
+    with SESSION_CACHE_LOCK:
+        entry = SESSION_CACHE.get(token)
+        if entry and entry[0] > now:
+            return copy_user_record(entry[1])
+    user = load_session_user(token)
+    if not user:
+        return None
+    with SESSION_CACHE_LOCK:
+        if len(SESSION_CACHE) >= SESSION_CACHE_MAX_ENTRIES:
+            for key in [key for key, entry in SESSION_CACHE.items() if entry[0] <= now]:
+                del SESSION_CACHE[key]
+            while len(SESSION_CACHE) >= SESSION_CACHE_MAX_ENTRIES:
+                del SESSION_CACHE[next(iter(SESSION_CACHE))]
+        SESSION_CACHE[token] = (now + SESSION_CACHE_TTL_SECONDS, user)
+    return copy_user_record(user)
+
+
+@process_cache("sessions")
+def clear_session_cache():
+    with SESSION_CACHE_LOCK:
+        SESSION_CACHE.clear()
+
+
+def forget_session(token):
+    with SESSION_CACHE_LOCK:
+        SESSION_CACHE.pop(token, None)
+
+
+def forget_user_sessions(name):
+    with SESSION_CACHE_LOCK:
+        for token in [token for token, entry in SESSION_CACHE.items() if entry[1]["name"] == name]:
+            del SESSION_CACHE[token]
+
+
+def current_user(environ):
+    token = get_cookie(environ, "verbi_session")
+    if not token:
+        return None, None
+    user = cached_session_user(token)
+    if not user:
+        return None, None
+    return user["name"], user
+
+
 def redirect(start_response, location, headers=None):
     response_headers = [("Location", location)]
     if headers:
@@ -902,70 +1506,7 @@ def render_login(error=""):
     <meta charset="utf-8" />
     <meta name="viewport" content="width=device-width, initial-scale=1" />
     <title>ログイン</title>
-    <style>
-      body {{
-        min-height: 100vh;
-        margin: 0;
-        display: grid;
-        place-items: center;
-        font-family: Georgia, "Times New Roman", serif;
-        background: #f5f0e6;
-        color: #3d3630;
-      }}
-      .login-window {{
-        width: min(340px, calc(100vw - 40px));
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 12px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.14);
-        padding: 24px;
-      }}
-      h1 {{
-        margin: 0 0 16px;
-        font-size: 22px;
-        color: #4a4239;
-      }}
-      label {{
-        display: block;
-        margin: 12px 0 6px;
-        font-size: 13px;
-        color: #6b635c;
-      }}
-      input {{
-        width: 100%;
-        box-sizing: border-box;
-        padding: 10px 12px;
-        font-size: 15px;
-        border: 2px solid #d8d0c4;
-        border-radius: 8px;
-        background: #fffef9;
-      }}
-      input:focus {{
-        outline: none;
-        border-color: #8fa68e;
-      }}
-      .actions {{
-        margin-top: 18px;
-      }}
-      button {{
-        width: 100%;
-        background: #8fa68e;
-        color: #fff;
-        border: 0;
-        padding: 11px 12px;
-        border-radius: 8px;
-        font-size: 15px;
-        cursor: pointer;
-      }}
-      .login-error {{
-        margin-bottom: 12px;
-        padding: 10px 12px;
-        border-radius: 8px;
-        background: #f7e7e4;
-        color: #9b4d48;
-        font-size: 13px;
-      }}
-    </style>
+    <link rel="stylesheet" href="{asset_url("css/login.css")}" />
   </head>
   <body>
     <form method="post" action="/login" class="login-window">
@@ -991,70 +1532,7 @@ def render_first_admin_setup(error=""):
     <meta charset="utf-8" />
     <meta name="viewport" content="width=device-width, initial-scale=1" />
     <title>初期設定</title>
-    <style>
-      body {{
-        min-height: 100vh;
-        margin: 0;
-        display: grid;
-        place-items: center;
-        font-family: Georgia, "Times New Roman", serif;
-        background: #f5f0e6;
-        color: #3d3630;
-      }}
-      .login-window {{
-        width: min(360px, calc(100vw - 40px));
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 12px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.14);
-        padding: 24px;
-      }}
-      h1 {{
-        margin: 0 0 8px;
-        font-size: 22px;
-        color: #4a4239;
-      }}
-      p {{
-        margin: 0 0 16px;
-        color: #6b635c;
-        font-size: 14px;
-        line-height: 1.5;
-      }}
-      label {{
-        display: block;
-        margin: 12px 0 6px;
-        font-size: 13px;
-        color: #6b635c;
-      }}
-      input {{
-        width: 100%;
-        box-sizing: border-box;
-        padding: 10px 12px;
-        font-size: 15px;
-        border: 2px solid #d8d0c4;
-        border-radius: 8px;
-        background: #fffef9;
-      }}
-      button {{
-        width: 100%;
-        margin-top: 18px;
-        background: #8fa68e;
-        color: #fff;
-        border: 0;
-        padding: 11px 12px;
-        border-radius: 8px;
-        font-size: 15px;
-        cursor: pointer;
-      }}
-      .login-error {{
-        margin-bottom: 12px;
-        padding: 10px 12px;
-        border-radius: 8px;
-        background: #f7e7e4;
-        color: #9b4d48;
-        font-size: 13px;
-      }}
-    </style>
+    <link rel="stylesheet" href="{asset_url("css/first-admin-setup.css")}" />
   </head>
   <body>
     <form method="post" action="/setup" class="login-window">
@@ -1081,73 +1559,7 @@ def render_password_setup(name, error=""):
     <meta charset="utf-8" />
     <meta name="viewport" content="width=device-width, initial-scale=1" />
     <title>パスワード設定</title>
-    <style>
-      body {{
-        min-height: 100vh;
-        margin: 0;
-        display: grid;
-        place-items: center;
-        font-family: Georgia, "Times New Roman", serif;
-        background: #f5f0e6;
-        color: #3d3630;
-      }}
-      .login-window {{
-        width: min(340px, calc(100vw - 40px));
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 12px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.14);
-        padding: 24px;
-      }}
-      h1 {{
-        margin: 0 0 8px;
-        font-size: 22px;
-        color: #4a4239;
-      }}
-      p {{
-        margin: 0 0 16px;
-        color: #6b635c;
-        font-size: 14px;
-      }}
-      label {{
-        display: block;
-        margin: 12px 0 6px;
-        font-size: 13px;
-        color: #6b635c;
-      }}
-      input {{
-        width: 100%;
-        box-sizing: border-box;
-        padding: 10px 12px;
-        font-size: 15px;
-        border: 2px solid #d8d0c4;
-        border-radius: 8px;
-        background: #fffef9;
-      }}
-      input:focus {{
-        outline: none;
-        border-color: #8fa68e;
-      }}
-      button {{
-        width: 100%;
-        margin-top: 18px;
-        background: #8fa68e;
-        color: #fff;
-        border: 0;
-        padding: 11px 12px;
-        border-radius: 8px;
-        font-size: 15px;
-        cursor: pointer;
-      }}
-      .login-error {{
-        margin-bottom: 12px;
-        padding: 10px 12px;
-        border-radius: 8px;
-        background: #f7e7e4;
-        color: #9b4d48;
-        font-size: 13px;
-      }}
-    </style>
+    <link rel="stylesheet" href="{asset_url("css/password-setup.css")}" />
   </head>
   <body>
     <form method="post" action="/set-password" class="login-window">
@@ -1538,113 +1950,7 @@ def render_admin(users, message="", error=""):
     <meta charset="utf-8" />
     <meta name="viewport" content="width=device-width, initial-scale=1" />
     <title>管理</title>
-    <style>
-      body {{
-        font-family: Georgia, "Times New Roman", serif;
-        background: #f5f0e6;
-        color: #3d3630;
-        margin: 0;
-        padding: 32px;
-      }}
-      .panel {{
-        max-width: 820px;
-        margin: 0 auto;
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 12px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
-        padding: 24px;
-      }}
-      .top, .admin-actions {{
-        display: flex;
-        align-items: center;
-        justify-content: space-between;
-        gap: 12px;
-        margin-bottom: 20px;
-      }}
-      h1 {{
-        margin: 0;
-        font-size: 24px;
-      }}
-      a, .admin-button {{
-        color: #8fa68e;
-        font-weight: 600;
-        text-decoration: none;
-      }}
-      .admin-button {{
-        background: #8fa68e;
-        border-radius: 10px;
-        color: #fff;
-        display: inline-block;
-        padding: 11px 16px;
-      }}
-      form.create {{
-        display: flex;
-        gap: 10px;
-        margin: 0 0 20px;
-      }}
-      input {{
-        flex: 1;
-        min-width: 0;
-        padding: 10px 12px;
-        font-size: 15px;
-        border: 2px solid #d8d0c4;
-        border-radius: 8px;
-        background: #fffef9;
-      }}
-      button {{
-        background: #8fa68e;
-        color: #fff;
-        border: 0;
-        padding: 10px 14px;
-        border-radius: 8px;
-        font-size: 14px;
-        cursor: pointer;
-      }}
-      button:disabled {{
-        background: #c9c1b7;
-        cursor: default;
-      }}
-      table {{
-        width: 100%;
-        border-collapse: collapse;
-      }}
-      th, td {{
-        padding: 10px 8px;
-        border-bottom: 1px dashed #dcd4c8;
-        text-align: left;
-        font-size: 14px;
-      }}
-      th {{
-        color: #6b635c;
-      }}
-      td form {{
-        margin: 0;
-      }}
-      .notice {{
-        margin-bottom: 14px;
-        padding: 10px 12px;
-        border-radius: 8px;
-        font-size: 13px;
-      }}
-      .ok {{
-        background: #e9f1e8;
-        color: #557a53;
-      }}
-      .bad {{
-        background: #f7e7e4;
-        color: #9b4d48;
-      }}
-      @media (max-width: 640px) {{
-        body {{
-          padding: 20px;
-        }}
-        .top, .admin-actions, form.create {{
-          align-items: stretch;
-          flex-direction: column;
-        }}
-      }}
-    </style>
+    <link rel="stylesheet" href="{asset_url("css/admin.css")}" />
   </head>
   <body>
     <main class="panel">
@@ -1893,6 +2199,7 @@ def import_verbecc_verb_tense(infinitive, ja, tense):
                 """,
                 (verb_id, verb_id, tense, *seen_form_ids),
             )
+    invalidate_card_index("verb_form")
     return True, f"Imported {infinitive} {tense} from Verbecc."
 
 
@@ -2578,265 +2885,7 @@ def render_content_admin(items=None, approved_cards=None, message="", error="",
     <meta charset="utf-8" />
     <meta name="viewport" content="width=device-width, initial-scale=1" />
     <title>カード管理</title>
-    <style>
-      body {{
-        font-family: Georgia, "Times New Roman", serif;
-        background: #f5f0e6;
-        color: #3d3630;
-        margin: 0;
-        padding: 32px;
-      }}
-      .panel {{
-        max-width: 1180px;
-        margin: 0 auto;
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 12px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
-        padding: 24px;
-      }}
-      .top {{
-        display: flex;
-        justify-content: space-between;
-        gap: 12px;
-        align-items: center;
-        margin-bottom: 14px;
-      }}
-      h1, h2 {{
-        margin: 0 0 14px;
-      }}
-      h1 {{
-        font-size: 24px;
-      }}
-      h2 {{
-        font-size: 18px;
-        margin-top: 18px;
-      }}
-      a {{
-        color: #8fa68e;
-        font-weight: 600;
-        text-decoration: none;
-      }}
-      .tabs {{
-        display: flex;
-        flex-wrap: wrap;
-        gap: 8px;
-        margin-bottom: 16px;
-      }}
-      .tabs a {{
-        border: 1px solid #d8d0c4;
-        border-radius: 8px;
-        color: #6b635c;
-        padding: 8px 12px;
-      }}
-      .tabs a.active {{
-        background: #8fa68e;
-        border-color: #8fa68e;
-        color: #fff;
-      }}
-      .content-list, .tree-list {{
-        display: grid;
-        gap: 6px;
-        max-height: 70vh;
-        overflow-y: auto;
-        padding-right: 4px;
-      }}
-      .content-item, .verb-tree-card {{
-        background: #faf7f0;
-        border: 1px solid #e8e0d4;
-        border-radius: 10px;
-        padding: 16px;
-      }}
-      .compact-card {{
-        align-items: center;
-        display: grid;
-        gap: 6px;
-        grid-template-columns: 150px minmax(0, 1fr) 32px 32px;
-        padding: 7px 8px;
-      }}
-      .meta, .empty {{
-        color: #7a7065;
-        font-size: 13px;
-        margin-bottom: 8px;
-      }}
-      .compact-meta {{
-        color: #6b635c;
-        font-size: 12px;
-        min-width: 0;
-        overflow: hidden;
-        text-overflow: ellipsis;
-        white-space: nowrap;
-      }}
-      .status-new {{
-        background: #c4706a;
-        border-radius: 999px;
-        color: #fff;
-        display: inline-block;
-        font-size: 10px;
-        margin-left: 4px;
-        padding: 2px 5px;
-      }}
-      .compact-edit {{
-        align-items: center;
-        display: grid;
-        gap: 6px;
-        grid-template-columns: minmax(0, 1fr) 32px;
-        margin: 0;
-        min-width: 0;
-      }}
-      .compact-fields {{
-        align-items: center;
-        display: flex;
-        gap: 5px;
-        min-width: 0;
-        overflow-x: auto;
-      }}
-      .compact-input {{
-        flex: 1 1 130px;
-        margin-top: 0;
-        min-width: 72px;
-        padding: 6px 7px;
-      }}
-      .compact-input.short {{
-        flex-basis: 84px;
-      }}
-      .compact-input.medium {{
-        flex-basis: 140px;
-      }}
-      .compact-input.wide {{
-        flex-basis: 240px;
-      }}
-      input, select {{
-        box-sizing: border-box;
-        width: 100%;
-        padding: 9px 10px;
-        font-size: 14px;
-        border: 1px solid #d8d0c4;
-        border-radius: 8px;
-        background: #fffef9;
-      }}
-      button {{
-        background: #8fa68e;
-        color: #fff;
-        border: 0;
-        border-radius: 8px;
-        cursor: pointer;
-        font-size: 14px;
-        height: 32px;
-        padding: 0;
-        width: 32px;
-      }}
-      button.secondary {{
-        background: #b8aa97;
-      }}
-      button.danger {{
-        background: #c4706a;
-      }}
-      .actions-row {{
-        display: flex;
-        flex-wrap: wrap;
-        gap: 10px;
-        justify-content: flex-end;
-        margin-top: 12px;
-      }}
-      .actions-row form, .compact-action, .mini-action {{
-        margin: 0;
-      }}
-      .tense-import {{
-        align-items: center;
-        display: grid;
-        gap: 8px;
-        grid-template-columns: minmax(130px, 1fr) minmax(130px, 1fr) 160px 32px;
-        margin-bottom: 14px;
-      }}
-      .verb-tree-card {{
-        padding: 12px;
-      }}
-      .verb-tree-head {{
-        align-items: baseline;
-        display: flex;
-        gap: 12px;
-        margin-bottom: 10px;
-      }}
-      .verb-tree-head strong {{
-        font-size: 20px;
-      }}
-      .verb-tree-head span {{
-        color: #6b635c;
-      }}
-      .tense-block {{
-        border-top: 1px dashed #d8d0c4;
-        padding-top: 8px;
-      }}
-      .tense-title {{
-        color: #8fa68e;
-        font-size: 13px;
-        font-weight: 700;
-        margin-bottom: 6px;
-      }}
-      .tense-title-row {{
-        align-items: center;
-        display: flex;
-        justify-content: space-between;
-        gap: 10px;
-        margin-bottom: 6px;
-      }}
-      .tense-actions {{
-        display: flex;
-        gap: 6px;
-      }}
-      .conj-row {{
-        align-items: center;
-        display: grid;
-        gap: 8px;
-        grid-template-columns: 84px minmax(120px, 1fr) 120px;
-        min-height: 30px;
-      }}
-      .pronoun-cell {{
-        color: #6b635c;
-        font-weight: 700;
-      }}
-      .form-cell {{
-        font-size: 16px;
-      }}
-      .elo-cell {{
-        color: #7a7065;
-        font-size: 12px;
-        text-align: right;
-      }}
-      .notice {{
-        margin-bottom: 14px;
-        padding: 10px 12px;
-        border-radius: 8px;
-        font-size: 13px;
-      }}
-      .ok {{
-        background: #e9f1e8;
-        color: #557a53;
-      }}
-      .bad {{
-        background: #f7e7e4;
-        color: #9b4d48;
-      }}
-      @media (max-width: 760px) {{
-        body {{
-          padding: 20px;
-        }}
-        .top {{
-          align-items: flex-start;
-          flex-direction: column;
-        }}
-        .compact-card, .conj-row, .tense-import {{
-          grid-template-columns: 1fr;
-        }}
-        .compact-meta {{
-          grid-column: 1 / -1;
-        }}
-        .elo-cell {{
-          text-align: left;
-        }}
-      }}
-    </style>
+    <link rel="stylesheet" href="{asset_url("css/content-admin.css")}" />
   </head>
   <body>
     <main class="panel">
@@ -3169,206 +3218,836 @@ def expected_score(player_elo, question_elo):
     return 1 / (1 + 10 ** ((question_elo - player_elo) / 400))
 
 
-def record_user_card_seen(conn, username, card_uid, card_type, revision, correct):
+def elo_outcome(user_before, question_before, correct):
+    actual = 1 if correct else 0
+    expected = expected_score(user_before, question_before)
+    user_after = round(user_before + ELO_K * (actual - expected))
+    question_after = round(
+        question_before + ELO_K * ((1 - actual) - (1 - expected))
+    )
+    return user_after, question_after
+
+
+def record_user_card_seen(conn, username, card_uid, card_type, revision, correct, seen_at=None):
     conn.execute(
         """
         INSERT INTO user_card_state
-            (user_name, card_uid, card_type, seen_count, correct_count, card_revision)
-        VALUES (?, ?, ?, 1, ?, ?)
+            (user_name, card_uid, card_type, first_seen, last_seen, seen_count, correct_count, card_revision)
+        VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP), 1, ?, ?)
         ON CONFLICT(user_name, card_uid) DO UPDATE SET
-            last_seen = CURRENT_TIMESTAMP,
+            last_seen = MAX(last_seen, excluded.last_seen),
             seen_count = seen_count + 1,
             correct_count = correct_count + excluded.correct_count,
             card_revision = excluded.card_revision
         """,
-        (username, card_uid, card_type, 1 if correct else 0, revision),
+        (username, card_uid, card_type, seen_at, seen_at, 1 if correct else 0, revision),
     )
 
 
-def update_elo(username, question_id, correct, game):
-    init_db()
-    init_db(DB_PATH)
-    with get_runtime_db() as runtime_conn:
-        user_row = runtime_conn.execute("SELECT elo FROM users WHERE name = ?", (username,)).fetchone()
-    with get_db() as conn:
-        question_row = conn.execute(
-            "SELECT elo, uid, revision FROM questions WHERE id = ?", (question_id,)
-        ).fetchone()
-    if not user_row or not question_row:
-        return None
-
-    user_before = int(user_row["elo"])
-    question_before = int(question_row["elo"])
-    actual = 1 if correct else 0
-    expected = expected_score(user_before, question_before)
-    user_after = round(user_before + ELO_K * (actual - expected))
-    question_actual = 1 - actual
-    question_expected = 1 - expected
-    question_after = round(
-        question_before + ELO_K * (question_actual - question_expected)
-    )
-
-    with get_db() as conn:
-        conn.execute(
-            "UPDATE questions SET elo = ? WHERE id = ?",
-            (question_after, question_id),
-        )
-    with get_runtime_db() as runtime_conn:
-        runtime_conn.execute(
-            "UPDATE users SET elo = ? WHERE name = ?", (user_after, username)
-        )
-        record_user_card_seen(
-            runtime_conn,
-            username,
-            question_row["uid"],
+PRACTICE_EVENT_INSERT = """
+    INSERT INTO practice_events
+        (
+            user_name,
+            question_id,
+            question_uid,
+            question_revision,
             game,
-            int(question_row["revision"]),
-            bool(correct),
+            correct,
+            user_elo_before,
+            user_elo_after,
+            question_elo_before,
+            question_elo_after,
+            created_at
+        )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+"""
+CLOZE_EVENT_INSERT = """
+    INSERT INTO cloze_practice_events
+        (
+            user_name,
+            cloze_question_id,
+            cloze_question_uid,
+            cloze_question_revision,
+            correct,
+            user_elo_before,
+            user_elo_after,
+            question_elo_before,
+            question_elo_after,
+            created_at
         )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+"""
+
+
+@contextmanager
+def elo_write_transaction(material_path=None):
+    # Both databases are write-locked up front, always runtime first, so the
+    # read-modify-write of users.elo and the card Elo cannot interleave with
+    # another answer. Yields the connections and a dict that receives the
+    # time spent waiting for the locks (busy_timeout) and the time they were
+    # held, in milliseconds.
+    runtime_conn = get_runtime_db()
+    conn = get_db(material_path)
+    timing = {"lock_ms": 0.0, "wait_ms": 0.0}
+    requested = time.perf_counter()
+    started = None
+    runtime_conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        started = time.perf_counter()
+        try:
+            yield runtime_conn, conn, timing
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    except BaseException:
+        runtime_conn.rollback()
+        raise
+    else:
+        runtime_conn.commit()
+    finally:
+        # A failed BEGIN never held both locks: all of it counts as waiting.
+        finished = time.perf_counter()
+        waited = ((started or finished) - requested) * 1000
+        elapsed = (finished - started) * 1000 if started is not None else 0.0
+        timing["lock_ms"] = elapsed
+        timing["wait_ms"] = waited
+        with ELO_LOCK_STATS_LOCK:
+            ELO_LOCK_STATS["transactions"] += 1
+            ELO_LOCK_STATS["total_ms"] += elapsed
+            ELO_LOCK_STATS["max_ms"] = max(ELO_LOCK_STATS["max_ms"], elapsed)
+            ELO_LOCK_STATS["last_ms"] = elapsed
+            ELO_LOCK_STATS["wait_total_ms"] += waited
+            ELO_LOCK_STATS["wait_max_ms"] = max(ELO_LOCK_STATS["wait_max_ms"], waited)
+            ELO_LOCK_STATS["last_wait_ms"] = waited
+        if elapsed > ELO_LOCK_WARN_MS:
+            LOGGER.warning("Elo update held database locks for %.1f ms.", elapsed)
+
+
+def elo_lock_stats():
+    with ELO_LOCK_STATS_LOCK:
+        stats = dict(ELO_LOCK_STATS)
+    stats["mean_ms"] = stats["total_ms"] / stats["transactions"] if stats["transactions"] else 0.0
+    stats["wait_mean_ms"] = stats["wait_total_ms"] / stats["transactions"] if stats["transactions"] else 0.0
+    return stats
+
+
+def graded_card_row(conn, answer):
+    table = "cloze_questions" if answer["game"] == "cloze" else "questions"
+    kind = "'cloze' AS kind" if table == "cloze_questions" else "kind"
+    row = conn.execute(
+        f"SELECT id, uid, revision, elo, {kind} FROM {table} WHERE id = ?",
+        (answer["question_id"],),
+    ).fetchone()
+    if not row or (answer.get("uid") and answer["uid"] != row["uid"]):
+        return table, None, "Unknown card."
+    if answer["game"] and answer["game"] != row["kind"]:
+        return table, None, "Card does not belong to this game."
+    return table, row, ""
+
+
+def graded_answer_event(username, row, answer, user_before, user_after, question_before, question_after):
+    revision = answer.get("revision") or int(row["revision"])
+    values = [
+        username,
+        row["id"],
+        row["uid"],
+        revision,
+        1 if answer["correct"] else 0,
+        user_before,
+        user_after,
+        question_before,
+        question_after,
+        answer.get("seen_at"),
+    ]
+    if row["kind"] != "cloze":
+        values.insert(4, row["kind"])
+    seen = [row["uid"], row["kind"], revision, answer["correct"], answer.get("seen_at")]
+    outcome = {
+        "ok": True,
+        "question_id": row["id"],
+        "elo": {
+            "user_before": user_before,
+            "user_after": user_after,
+            "question_before": question_before,
+            "question_after": question_after,
+        },
+    }
+    return values, seen, outcome
+
+
+def update_indexed_answer_elos(card_elos, path=None):
+    for (table, card_id), elo in card_elos.items():
+        kinds = ("cloze",) if table == "cloze_questions" else ("flashcard", "verb_form")
+        update_indexed_card_elo(kinds, card_id, elo, path=path)
+
+
+def apply_graded_answers(username, answers, count_practice=False):
+    # Applies already parsed answers in order inside one write transaction
+    # per database. Returns None for an unknown user, otherwise the new user
+    # Elo, the lock hold time and one outcome per answer.
+    if ELO_WRITE_BEHIND:
+        return queue_graded_answers(username, answers, count_practice)
+    init_db()
+    init_db(DB_PATH)
+    outcomes = []
+    card_elos = {}
+    events = []
+    cloze_events = []
+    seen_cards = []
+    with elo_write_transaction() as (runtime_conn, conn, timing):
+        user_row = runtime_conn.execute("SELECT elo FROM users WHERE name = ?", (username,)).fetchone()
+        if not user_row:
+            return None
+        user_elo = int(user_row["elo"])
+        for answer in answers:
+            table, row, error = graded_card_row(conn, answer)
+            if error:
+                outcomes.append({"ok": False, "error": error})
+                continue
+            key = (table, row["id"])
+            question_before = card_elos.get(key, int(row["elo"]))
+            user_before = user_elo
+            user_elo, question_after = elo_outcome(user_before, question_before, answer["correct"])
+            card_elos[key] = question_after
+            conn.execute(f"UPDATE {table} SET elo = ? WHERE id = ?", (question_after, row["id"]))
+            values, seen, outcome = graded_answer_event(
+                username, row, answer, user_before, user_elo, question_before, question_after
+            )
+            record_user_card_seen(runtime_conn, username, *seen[:4], seen_at=seen[4])
+            seen_cards.append(seen)
+            (cloze_events if table == "cloze_questions" else events).append(values)
+            outcomes.append(outcome)
+        runtime_conn.executemany(PRACTICE_EVENT_INSERT, events)
+        runtime_conn.executemany(CLOZE_EVENT_INSERT, cloze_events)
+        applied = len(events) + len(cloze_events)
         runtime_conn.execute(
             """
-            INSERT INTO practice_events
-                (
-                    user_name,
-                    question_id,
-                    question_uid,
-                    question_revision,
-                    game,
-                    correct,
-                    user_elo_before,
-                    user_elo_after,
-                    question_elo_before,
-                    question_elo_after
-                )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            UPDATE users
+            SET elo = ?,
+                practiced_count = practiced_count + ?
+            WHERE name = ?
             """,
-            (
-                username,
-                question_id,
-                question_row["uid"],
-                int(question_row["revision"]),
-                game,
-                actual,
-                user_before,
-                user_after,
-                question_before,
-                question_after,
-            ),
+            (user_elo, applied if count_practice else 0, username),
         )
-    return {
-        "user_before": user_before,
-        "user_after": user_after,
-        "question_before": question_before,
-        "question_after": question_after,
-    }
+    # The seen cache only learns about cards once the transaction committed.
+    for seen in seen_cards:
+        remember_card_seen(username, seen[1], seen[0])
+    update_indexed_answer_elos(card_elos)
+    forget_user_sessions(username)
+    return {"elo": user_elo, "lock_ms": timing["lock_ms"], "wait_ms": timing["wait_ms"], "outcomes": outcomes}
 
 
-def update_cloze_elo(username, question_id, correct):
+def pending_user_elo_delta(username):
+    with ELO_QUEUE_LOCK:
+        return ELO_PENDING_USER_DELTAS.get(username, 0)
+
+
+def queue_graded_answers(username, answers, count_practice=False):
+    # Write-behind variant of apply_graded_answers: Elo is computed from the
+    # stored values plus whatever is still queued, the result is journaled
+    # and queued, and the writer thread applies it as deltas later.
     init_db()
     init_db(DB_PATH)
+    start_elo_writer()
+    material_path = os.path.abspath(ACTIVE_MATERIAL_DB.get())
     with get_runtime_db() as runtime_conn:
         user_row = runtime_conn.execute("SELECT elo FROM users WHERE name = ?", (username,)).fetchone()
-    with get_db() as conn:
-        question_row = conn.execute(
-            "SELECT elo, uid, revision FROM cloze_questions WHERE id = ?", (question_id,)
-        ).fetchone()
-    if not user_row or not question_row:
+    if not user_row:
         return None
-
-    user_before = int(user_row["elo"])
-    question_before = int(question_row["elo"])
-    actual = 1 if correct else 0
-    expected = expected_score(user_before, question_before)
-    user_after = round(user_before + ELO_K * (actual - expected))
-    question_after = round(
-        question_before + ELO_K * ((1 - actual) - (1 - expected))
-    )
-
-    with get_db() as conn:
+    outcomes = []
+    card_elos = {}
+    entry = {
+        "material": material_path,
+        "user": username,
+        "user_delta": 0,
+        "practiced": 0,
+        "cards": {},
+        "events": [],
+        "cloze_events": [],
+        "seen": [],
+    }
+    with get_db(material_path) as conn, ELO_QUEUE_LOCK:
+        user_start = int(user_row["elo"]) + ELO_PENDING_USER_DELTAS.get(username, 0)
+        user_elo = user_start
+        for answer in answers:
+            table, row, error = graded_card_row(conn, answer)
+            if error:
+                outcomes.append({"ok": False, "error": error})
+                continue
+            key = (table, row["id"])
+            if key not in card_elos:
+                card_elos[key] = int(row["elo"]) + ELO_PENDING_CARD_DELTAS.get((material_path,) + key, 0)
+            question_before = card_elos[key]
+            user_before = user_elo
+            user_elo, question_after = elo_outcome(user_before, question_before, answer["correct"])
+            card_elos[key] = question_after
+            answer = dict(answer, seen_at=answer.get("seen_at") or answer_timestamp(time.time()))
+            values, seen, outcome = graded_answer_event(
+                username, row, answer, user_before, user_elo, question_before, question_after
+            )
+            card_key = f"{table}:{row['id']}"
+            entry["cards"][card_key] = entry["cards"].get(card_key, 0) + question_after - question_before
+            entry["events" if table == "questions" else "cloze_events"].append(values)
+            entry["seen"].append(seen)
+            outcomes.append(outcome)
+        applied = len(entry["events"]) + len(entry["cloze_events"])
+        entry["user_delta"] = user_elo - user_start
+        entry["practiced"] = applied if count_practice else 0
+        if applied:
+            ELO_JOURNAL_STATE["seq"] += 1
+            entry["journal"] = ELO_JOURNAL_STATE["key"]
+            entry["seq"] = ELO_JOURNAL_STATE["seq"]
+            append_elo_journal([entry])
+            ELO_QUEUE.append(entry)
+            track_pending_elo_entry(entry, 1)
+            if len(ELO_QUEUE) >= ELO_FLUSH_MAX_ENTRIES:
+                ELO_FLUSH_WAKE.set()
+    for seen in entry["seen"]:
+        remember_card_seen(username, seen[1], seen[0])
+    update_indexed_answer_elos(card_elos, path=material_path)
+    forget_user_sessions(username)
+    return {"elo": user_elo, "lock_ms": 0.0, "wait_ms": 0.0, "outcomes": outcomes}
+
+
+def track_pending_elo_entry(entry, sign):
+    # Caller holds ELO_QUEUE_LOCK.
+    user = entry["user"]
+    ELO_PENDING_USER_DELTAS[user] = ELO_PENDING_USER_DELTAS.get(user, 0) + sign * entry["user_delta"]
+    if not ELO_PENDING_USER_DELTAS[user]:
+        del ELO_PENDING_USER_DELTAS[user]
+    for card_key, delta in entry["cards"].items():
+        table, card_id = card_key.split(":")
+        key = (entry["material"], table, int(card_id))
+        ELO_PENDING_CARD_DELTAS[key] = ELO_PENDING_CARD_DELTAS.get(key, 0) + sign * delta
+        if not ELO_PENDING_CARD_DELTAS[key]:
+            del ELO_PENDING_CARD_DELTAS[key]
+
+
+def fsync_directory(path):
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def append_elo_journal(entries):
+    # Caller holds ELO_QUEUE_LOCK. The answer is only acknowledged once its
+    # journal line is on disk.
+    path = elo_journal_path()
+    created = not os.path.exists(path)
+    with open(path, "a", encoding="utf-8") as journal:
+        for entry in entries:
+            journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+    if created:
+        fsync_directory(DB_DIR)
+
+
+def rewrite_elo_journal():
+    # Caller holds ELO_QUEUE_LOCK; keeps only what is still queued.
+    path = elo_journal_path()
+    if not ELO_QUEUE:
+        if os.path.exists(path):
+            os.remove(path)
+            fsync_directory(DB_DIR)
+        return
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as journal:
+        for entry in ELO_QUEUE:
+            journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+    os.replace(temporary_path, path)
+    fsync_directory(DB_DIR)
+
+
+def elo_journal_marks(entries):
+    marks = {}
+    for entry in entries:
+        if entry.get("journal"):
+            key = (entry["journal"], entry["material"])
+            marks[key] = max(marks.get(key, 0), int(entry["seq"]))
+    return marks
+
+
+def unflushed_elo_entries(entries):
+    # Drops journal entries whose flush committed before the journal could
+    # be rewritten. Entries from journals written before sequence numbers
+    # existed are kept.
+    init_db(DB_PATH)
+    with get_runtime_db() as conn:
         conn.execute(
-            "UPDATE cloze_questions SET elo = ? WHERE id = ?",
-            (question_after, question_id),
-        )
-    with get_runtime_db() as runtime_conn:
-        runtime_conn.execute(
-            "UPDATE users SET elo = ? WHERE name = ?", (user_after, username)
+            "DELETE FROM elo_journal_flushed WHERE flushed_at < datetime('now', ?)",
+            (f"-{ELO_JOURNAL_MARK_DAYS} days",),
         )
-        record_user_card_seen(
-            runtime_conn,
-            username,
-            question_row["uid"],
-            "cloze",
-            int(question_row["revision"]),
-            bool(correct),
-        )
-        runtime_conn.execute(
-            """
-            INSERT INTO cloze_practice_events
-                (
-                    user_name,
-                    cloze_question_id,
-                    cloze_question_uid,
-                    cloze_question_revision,
-                    correct,
-                    user_elo_before,
-                    user_elo_after,
-                    question_elo_before,
-                    question_elo_after
+        flushed = {
+            (row["journal"], row["material"]): row["seq"]
+            for row in conn.execute("SELECT journal, material, seq FROM elo_journal_flushed")
+        }
+    return [
+        entry
+        for entry in entries
+        if not entry.get("journal") or int(entry["seq"]) > flushed.get((entry["journal"], entry["material"]), 0)
+    ]
+
+
+def read_elo_journal(path):
+    entries = []
+    try:
+        with open(path, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A crash can leave a torn last line; everything before it is intact.
+                    LOGGER.warning("Skipping unreadable line in %s.", path)
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def flush_elo_queue():
+    with ELO_FLUSH_LOCK:
+        with ELO_QUEUE_LOCK:
+            entries = list(ELO_QUEUE)
+        if not entries:
+            return 0
+        started = time.perf_counter()
+        by_material = {}
+        for entry in entries:
+            by_material.setdefault(entry["material"], []).append(entry)
+        for material_path, material_entries in by_material.items():
+            init_db(material_path)
+            init_db(DB_PATH)
+            card_deltas = {}
+            user_deltas = {}
+            for entry in material_entries:
+                for card_key, delta in entry["cards"].items():
+                    card_deltas[card_key] = card_deltas.get(card_key, 0) + delta
+                delta, practiced = user_deltas.get(entry["user"], (0, 0))
+                user_deltas[entry["user"]] = (delta + entry["user_delta"], practiced + entry["practiced"])
+            with elo_write_transaction(material_path) as (runtime_conn, conn, timing):
+                for card_key, delta in card_deltas.items():
+                    table, card_id = card_key.split(":")
+                    conn.execute(f"UPDATE {table} SET elo = elo + ? WHERE id = ?", (delta, int(card_id)))
+                runtime_conn.executemany(
+                    """
+                    UPDATE users
+                    SET elo = elo + ?,
+                        practiced_count = practiced_count + ?
+                    WHERE name = ?
+                    """,
+                    [(delta, practiced, name) for name, (delta, practiced) in user_deltas.items()],
                 )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                username,
-                question_id,
-                question_row["uid"],
-                int(question_row["revision"]),
-                actual,
-                user_before,
-                user_after,
-                question_before,
-                question_after,
-            ),
+                for entry in material_entries:
+                    runtime_conn.executemany(PRACTICE_EVENT_INSERT, entry["events"])
+                    runtime_conn.executemany(CLOZE_EVENT_INSERT, entry["cloze_events"])
+                    for uid, kind, revision, correct, seen_at in entry["seen"]:
+                        record_user_card_seen(runtime_conn, entry["user"], uid, kind, revision, correct, seen_at=seen_at)
+                runtime_conn.executemany(
+                    """
+                    INSERT INTO elo_journal_flushed (journal, material, seq)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(journal, material) DO UPDATE SET
+                        seq = MAX(seq, excluded.seq),
+                        flushed_at = CURRENT_TIMESTAMP
+                    """,
+                    [(journal, material, seq) for (journal, material), seq in elo_journal_marks(material_entries).items()],
+                )
+            for entry in material_entries:
+                for uid, kind, revision, correct, seen_at in entry["seen"]:
+                    remember_card_seen(entry["user"], kind, uid)
+            with ELO_QUEUE_LOCK:
+                flushed = {id(entry) for entry in material_entries}
+                ELO_QUEUE[:] = [entry for entry in ELO_QUEUE if id(entry) not in flushed]
+                for entry in material_entries:
+                    track_pending_elo_entry(entry, -1)
+                rewrite_elo_journal()
+            for name in user_deltas:
+                forget_user_sessions(name)
+        LOGGER.info(
+            "Flushed %d queued answer sets in %.1f ms.",
+            len(entries),
+            (time.perf_counter() - started) * 1000,
         )
+        return len(entries)
+
+
+def elo_writer_loop():
+    while True:
+        ELO_FLUSH_WAKE.wait(ELO_FLUSH_INTERVAL_SECONDS)
+        ELO_FLUSH_WAKE.clear()
+        try:
+            flush_elo_queue()
+        except Exception:
+            LOGGER.exception("Flushing queued Elo updates failed; will retry.")
+
+
+def elo_journal_path(pid=None):
+    return os.path.join(DB_DIR, f"elo-journal-{pid or os.getpid()}.jsonl")
+
+
+def process_alive(pid):
+    if os.name != "posix":
+        return pid == os.getpid()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def adopt_orphaned_elo_journals():
+    # Journals left by dead worker processes, including ones a dead worker
+    # had claimed but not yet merged, are claimed with an atomic rename, so
+    # two workers starting together cannot both replay one. The claimed
+    # files are removed by the caller once their entries are in our journal.
+    entries = []
+    claimed = []
+    for name in sorted(os.listdir(DB_DIR)):
+        match = re.fullmatch(r"elo-journal-(\d+)\.jsonl(?:\.adopt-[\d-]+)?", name)
+        if not match or int(match.group(1)) == os.getpid() or process_alive(int(match.group(1))):
+            continue
+        claimed_path = elo_journal_path() + f".adopt-{len(claimed)}-{match.group(1)}"
+        try:
+            os.replace(os.path.join(DB_DIR, name), claimed_path)
+        except FileNotFoundError:
+            continue
+        entries.extend(read_elo_journal(claimed_path))
+        claimed.append(claimed_path)
+    return entries, claimed
+
+
+def start_elo_writer():
+    global ELO_WRITER
+    with ELO_QUEUE_LOCK:
+        if ELO_WRITER is not None and ELO_WRITER.is_alive():
+            return
+        # Queue state inherited across a fork belongs to the parent's journal.
+        os.makedirs(DB_DIR, exist_ok=True)
+        ELO_JOURNAL_STATE["key"] = secrets.token_hex(8)
+        ELO_JOURNAL_STATE["seq"] = 0
+        adopted, claimed = adopt_orphaned_elo_journals()
+        replayed = unflushed_elo_entries(read_elo_journal(elo_journal_path()) + adopted)
+        ELO_QUEUE[:] = replayed
+        ELO_PENDING_USER_DELTAS.clear()
+        ELO_PENDING_CARD_DELTAS.clear()
+        rewrite_elo_journal()
+        for path in claimed:
+            os.remove(path)
+        for entry in replayed:
+            track_pending_elo_entry(entry, 1)
+        if replayed:
+            LOGGER.info("Replaying %d journaled answer sets.", len(replayed))
+        ELO_WRITER = threading.Thread(target=elo_writer_loop, name="verbi-elo-writer", daemon=True)
+        ELO_WRITER.start()
+    atexit.register(flush_elo_queue)
+    if replayed:
+        ELO_FLUSH_WAKE.set()
+
+
+def elo_queue_stats():
+    with ELO_QUEUE_LOCK:
+        return {
+            "queued": len(ELO_QUEUE),
+            "pending_users": len(ELO_PENDING_USER_DELTAS),
+            "pending_cards": len(ELO_PENDING_CARD_DELTAS),
+            "writer_running": ELO_WRITER is not None and ELO_WRITER.is_alive(),
+        }
+
+
+def update_elo(username, question_id, correct, game):
+    result = apply_graded_answers(
+        username,
+        [{"question_id": question_id, "game": game, "correct": bool(correct)}],
+    )
+    if not result or not result["outcomes"][0]["ok"]:
+        return None
+    return result["outcomes"][0]["elo"]
+
+
+def update_cloze_elo(username, question_id, correct):
+    return update_elo(username, question_id, correct, "cloze")
+
+
+def answer_timestamp(value):
+    if value in (None, ""):
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            seconds = value / 1000 if value > 1e11 else value
+            moment = datetime.fromtimestamp(seconds, timezone.utc)
+        else:
+            moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=timezone.utc)
+    except (OverflowError, OSError, ValueError):
+        return None
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_batch_answer(item):
+    if not isinstance(item, dict):
+        raise ValueError("Invalid answer.")
+    try:
+        question_id = int(item.get("question_id"))
+        revision = int(item.get("revision") or 1)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid question id or revision.") from exc
+    uid = str(item.get("uid") or "")
+    game = item.get("game") or ("cloze" if uid.startswith("cloze_") else "")
+    if game not in ("", "verb_form", "flashcard", "cloze"):
+        raise ValueError("Unknown game.")
     return {
-        "user_before": user_before,
-        "user_after": user_after,
-        "question_before": question_before,
-        "question_after": question_after,
+        "question_id": question_id,
+        "uid": uid,
+        "revision": revision,
+        "game": game,
+        "correct": bool(item.get("correct")),
+        "seen_at": answer_timestamp(item.get("timestamp")),
     }
 
 
-def weighted_row_by_elo(rows, user_elo):
-    if not rows:
+def apply_answer_batch(username, answers):
+    results = [None] * len(answers)
+    parsed = []
+    for position, item in enumerate(answers):
+        try:
+            parsed.append((position, parse_batch_answer(item)))
+        except ValueError as exc:
+            results[position] = {"ok": False, "error": str(exc)}
+    parsed.sort(key=lambda entry: entry[1]["seen_at"] or "")
+    result = apply_graded_answers(
+        username,
+        [answer for _, answer in parsed],
+        count_practice=True,
+    )
+    if result is None:
         return None
-    weights = []
-    for row in rows:
-        diff = int(row["elo"]) - user_elo
-        if diff > 150:
-            weight = 0.15 * math.exp(-diff / 250)
+    for (position, _), outcome in zip(parsed, result["outcomes"]):
+        results[position] = outcome
+    return {
+        "applied": sum(1 for outcome in result["outcomes"] if outcome["ok"]),
+        "elo": result["elo"],
+        "lock_ms": round(result["lock_ms"], 3),
+        "lock_wait_ms": round(result["wait_ms"], 3),
+        "results": results,
+    }
+
+
+def elo_weight(card_elo, user_elo):
+    diff = card_elo - user_elo
+    if diff > 150:
+        weight = 0.15 * math.exp(-diff / 250)
+    else:
+        weight = math.exp(-abs(diff) / 250)
+    if diff < -800:
+        weight *= 0.25
+    return max(weight, 0.001)
+
+
+ELO_WEIGHT_TABLE = array(
+    "d",
+    (elo_weight(diff, 0) for diff in range(-ELO_WEIGHT_TABLE_SPAN, ELO_WEIGHT_TABLE_SPAN + 1)),
+)
+
+
+def elo_weights(elos, user_elo):
+    if numpy is not None:
+        diff = numpy.asarray(elos, dtype=numpy.float64) - user_elo
+        weights = numpy.where(diff > 150, 0.15 * numpy.exp(-diff / 250), numpy.exp(-numpy.abs(diff) / 250))
+        weights = numpy.where(diff < -800, weights * 0.25, weights)
+        return numpy.maximum(weights, 0.001)
+    table = ELO_WEIGHT_TABLE
+    span = ELO_WEIGHT_TABLE_SPAN
+    offset = span - int(user_elo)
+    return array(
+        "d",
+        (table[min(max(int(elo) + offset, 0), 2 * span)] for elo in elos),
+    )
+
+
+def weighted_sample_indexes(weights, k):
+    # Efraimidis-Spirakis keys: the k largest log(u) / w form a weighted
+    # draw without replacement, in draw order.
+    count = len(weights)
+    k = min(k, count)
+    if k <= 0:
+        return []
+    if numpy is not None:
+        rng = numpy.random.default_rng(random.getrandbits(64))
+        keys = numpy.log(1.0 - rng.random(count)) / numpy.asarray(weights)
+        if k < count:
+            top = numpy.argpartition(-keys, k - 1)[:k]
         else:
-            weight = math.exp(-abs(diff) / 250)
-        if diff < -800:
-            weight *= 0.25
-        weights.append(max(weight, 0.001))
-    return random.choices(rows, weights=weights, k=1)[0]
+            top = numpy.arange(count)
+        return [int(index) for index in top[numpy.argsort(-keys[top])]]
+    keys = [math.log(1.0 - random.random()) / weight for weight in weights]
+    return heapq.nlargest(k, range(count), key=keys.__getitem__)
 
 
-def user_seen_card_uids(username, card_type):
+def weighted_sample(rows, user_elo, k=1, elos=None):
+    rows = list(rows)
+    if not rows:
+        return []
+    if elos is None:
+        elos = [row["elo"] for row in rows]
+    indexes = weighted_sample_indexes(elo_weights(elos, user_elo), k)
+    return [rows[index] for index in indexes]
+
+
+def weighted_row_by_elo(rows, user_elo):
+    sample = weighted_sample(rows, user_elo, 1)
+    return sample[0] if sample else None
+
+
+def card_uid_number(uid, table):
+    numbers, names = table
+    number = numbers.get(uid)
+    if number is None:
+        with CARD_UID_LOCK:
+            number = numbers.get(uid)
+            if number is None:
+                number = len(names)
+                names.append(uid)
+                numbers[uid] = number
+    return number
+
+
+class SeenCards:
+    # Set of card uids stored as a bitmap over the process-wide uid numbers
+    # of the intern table current when it was built.
+    __slots__ = ("bits", "count", "loaded_at", "table")
+
+    def __init__(self, uids=(), loaded_at=None):
+        self.bits = bytearray()
+        self.count = 0
+        self.loaded_at = time.monotonic() if loaded_at is None else loaded_at
+        self.table = CARD_UID_TABLE
+        for uid in uids:
+            self.add(uid)
+
+    def add(self, uid):
+        byte, bit = divmod(card_uid_number(uid, self.table), 8)
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        if not self.bits[byte] >> bit & 1:
+            self.bits[byte] |= 1 << bit
+            self.count += 1
+
+    def __contains__(self, uid):
+        number = self.table[0].get(uid)
+        if number is None:
+            return False
+        byte, bit = divmod(number, 8)
+        return byte < len(self.bits) and bool(self.bits[byte] >> bit & 1)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        names = self.table[1]
+        bits = self.bits
+        for match in re.finditer(rb"[^\x00]", bits):
+            byte = match.start()
+            value = bits[byte]
+            for bit in range(8):
+                if value >> bit & 1:
+                    yield names[byte * 8 + bit]
+
+
+def load_seen_card_uids(username, card_type):
     init_db(DB_PATH)
     with get_runtime_db() as conn:
+        rows = conn.execute(
+            """
+            SELECT card_uid
+            FROM user_card_state
+            WHERE user_name = ? AND card_type = ?
+            """,
+            (username, card_type),
+        ).fetchall()
+    return SeenCards(row["card_uid"] for row in rows)
+
+
+def compact_card_uids():
+    # Caller holds SEEN_CACHE_LOCK. Starts a fresh intern table holding only
+    # the uids the cached bitmaps still reference, so uids of evicted users
+    # and deleted cards stop accumulating.
+    global CARD_UID_TABLE
+    CARD_UID_TABLE = ({}, [])
+    for kinds in SEEN_CACHE.values():
+        for card_type, seen in kinds.items():
+            kinds[card_type] = SeenCards(seen, loaded_at=seen.loaded_at)
+    CARD_UID_STATE["compact_at"] = max(CARD_UID_COMPACT_MIN, 2 * len(CARD_UID_TABLE[1]))
+    SEEN_CACHE_STATS["compactions"] += 1
+
+
+def user_seen_card_uids(username, card_type):
+    with SEEN_CACHE_LOCK:
+        kinds = SEEN_CACHE.get(username)
+        seen = kinds.get(card_type) if kinds else None
+        if seen is not None and time.monotonic() - seen.loaded_at < SEEN_CACHE_TTL_SECONDS:
+            SEEN_CACHE.move_to_end(username)
+            SEEN_CACHE_STATS["hits"] += 1
+            return seen
+        SEEN_CACHE_STATS["misses"] += 1
+    seen = load_seen_card_uids(username, card_type)
+    with SEEN_CACHE_LOCK:
+        if seen.table is not CARD_UID_TABLE:
+            seen = SeenCards(seen, loaded_at=seen.loaded_at)
+        SEEN_CACHE.setdefault(username, {})[card_type] = seen
+        SEEN_CACHE.move_to_end(username)
+        evicted = False
+        while len(SEEN_CACHE) > SEEN_CACHE_MAX_USERS:
+            SEEN_CACHE.popitem(last=False)
+            SEEN_CACHE_STATS["evictions"] += 1
+            evicted = True
+        # Compacting on every eviction would rebuild every bitmap per new
+        # user; wait until the table has doubled since the last compaction.
+        if evicted and len(CARD_UID_TABLE[1]) > CARD_UID_STATE["compact_at"]:
+            compact_card_uids()
+    return seen
+
+
+def remember_card_seen(username, card_type, card_uid):
+    with SEEN_CACHE_LOCK:
+        kinds = SEEN_CACHE.get(username)
+        seen = kinds.get(card_type) if kinds else None
+        if seen is not None:
+            seen.add(card_uid)
+            SEEN_CACHE_STATS["writes"] += 1
+
+
+def seen_cache_stats():
+    with SEEN_CACHE_LOCK:
         return {
-            row["card_uid"]
-            for row in conn.execute(
-                """
-                SELECT card_uid
-                FROM user_card_state
-                WHERE user_name = ? AND card_type = ?
-                """,
-                (username, card_type),
-            ).fetchall()
+            **SEEN_CACHE_STATS,
+            "users": len(SEEN_CACHE),
+            "interned_uids": len(CARD_UID_TABLE[1]),
+            "bitmap_bytes": sum(len(seen.bits) for kinds in SEEN_CACHE.values() for seen in kinds.values()),
         }
 
 
+@process_cache("seen_cards")
+def clear_seen_cache():
+    global CARD_UID_TABLE
+    with SEEN_CACHE_LOCK:
+        SEEN_CACHE.clear()
+        CARD_UID_TABLE = ({}, [])
+        CARD_UID_STATE["compact_at"] = CARD_UID_COMPACT_MIN
+        for key in SEEN_CACHE_STATS:
+            SEEN_CACHE_STATS[key] = 0
+
+
 def choose_user_card_subset(rows, conn, user, card_type, force_new):
     rows = list(rows)
     if not rows:
@@ -3388,66 +4067,309 @@ def exclude_card_uids(rows, excluded_uids):
     return [row for row in rows if row["uid"] not in excluded_uids]
 
 
-def weighted_question_row(user, kind, excluded_uids=None):
-    init_db()
+CARD_INDEX_QUERIES = {
+    "verb_form": """
+        SELECT
+            q.id, q.uid, q.revision, q.elo, q.is_new, q.verb_id, q.answer,
+            v.infinitive, v.ja, vf.tense, vf.pronoun, vf.gender
+        FROM questions q
+        JOIN verbs v ON v.id = q.verb_id
+        JOIN verb_forms vf ON vf.id = q.verb_form_id
+        WHERE q.kind = 'verb_form'
+            AND q.active = 1
+            AND q.status = 'approved'
+    """,
+    "flashcard": """
+        SELECT
+            q.id, q.uid, q.revision, q.elo, q.is_new, q.verb_id, q.answer,
+            v.infinitive, v.ja
+        FROM questions q
+        JOIN verbs v ON v.id = q.verb_id
+        WHERE q.kind = 'flashcard'
+            AND q.active = 1
+            AND q.status = 'approved'
+    """,
+    "cloze": """
+        SELECT id, uid, revision, elo, is_new, NULL AS verb_id, answer, sentence, translation
+        FROM cloze_questions q
+        WHERE active = 1
+            AND status = 'approved'
+    """,
+}
+
+
+class CardSnapshot:
+    # One consistent view of a CardIndex. It is never mutated once built, so
+    # picks read it without holding CARD_INDEX_LOCK.
+    def __init__(self, records, ids_by_uid, buckets):
+        self.records = records
+        self.ids_by_uid = ids_by_uid
+        self.buckets = buckets
+
+    def __len__(self):
+        return len(self.records)
+
+    def count_uids(self, uids, excluded=()):
+        return sum(1 for uid in uids if uid in self.ids_by_uid and uid not in excluded)
+
+    def records_for_uids(self, uids, excluded=()):
+        ids_by_uid = self.ids_by_uid
+        return [
+            self.records[ids_by_uid[uid]]
+            for uid in uids
+            if uid in ids_by_uid and uid not in excluded
+        ]
+
+    def records_for_verbs(self, verb_ids):
+        return [record for record in self.records.values() if record[CardIndex.VERB_ID] in verb_ids]
+
+    def sample(self, user_elo, accept):
+        # Rejection sampling: choose a bucket by its size times the best
+        # weight any card in it can have, then keep a card with probability
+        # weight / bucket bound. Falls back to a full scan for tiny subsets.
+        elo = CardIndex.ELO
+        keys = list(self.buckets)
+        if not keys:
+            return None
+        bounds = []
+        for key in keys:
+            low = key * CARD_INDEX_BUCKET_WIDTH
+            closest = min(max(user_elo, low), low + CARD_INDEX_BUCKET_WIDTH - 1)
+            bounds.append(elo_weight(closest, user_elo))
+        totals = [bound * len(self.buckets[key]) for key, bound in zip(keys, bounds)]
+        for _ in range(CARD_INDEX_MAX_ATTEMPTS):
+            choice = random.choices(range(len(keys)), weights=totals, k=1)[0]
+            record = self.records[random.choice(self.buckets[keys[choice]])]
+            if not accept(record):
+                continue
+            if random.random() * bounds[choice] <= elo_weight(int(record[elo]), user_elo):
+                return record
+        rows = [record for record in self.records.values() if accept(record)]
+        sample = weighted_sample(rows, user_elo, 1, elos=[record[elo] for record in rows])
+        return sample[0] if sample else None
+
+
+class CardIndex:
+    # Cards are kept as plain tuples and bucketed by Elo so that a weighted
+    # pick only has to weigh the buckets, not every card. Updates run under
+    # CARD_INDEX_LOCK and swap in a new snapshot built from copies; only the
+    # buckets they touch are copied.
+    ID, UID, REVISION, ELO, IS_NEW, VERB_ID = range(6)
+
+    def __init__(self, kind, columns, rows):
+        self.kind = kind
+        self.columns = columns
+        self.built_at = time.monotonic()
+        self.snapshot = CardSnapshot({}, {}, {})
+        self.update(added=[tuple(row) for row in rows])
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def bucket_key(self, elo):
+        return int(elo) // CARD_INDEX_BUCKET_WIDTH
+
+    def update(self, added=(), removed=()):
+        current = self.snapshot
+        records = dict(current.records)
+        ids_by_uid = dict(current.ids_by_uid)
+        buckets = dict(current.buckets)
+        copied = set()
+
+        def bucket(key):
+            if key not in copied:
+                buckets[key] = list(buckets.get(key, ()))
+                copied.add(key)
+            return buckets[key]
+
+        for card_id in [*removed, *(record[self.ID] for record in added)]:
+            record = records.pop(card_id, None)
+            if record is None:
+                continue
+            if ids_by_uid.get(record[self.UID]) == card_id:
+                del ids_by_uid[record[self.UID]]
+            bucket(self.bucket_key(record[self.ELO])).remove(card_id)
+        for record in added:
+            records[record[self.ID]] = record
+            ids_by_uid[record[self.UID]] = record[self.ID]
+            bucket(self.bucket_key(record[self.ELO])).append(record[self.ID])
+        for key in copied:
+            if not buckets[key]:
+                del buckets[key]
+        self.snapshot = CardSnapshot(records, ids_by_uid, buckets)
+
+    def add(self, record):
+        self.update(added=[record])
+
+    def remove(self, card_id):
+        self.update(removed=[card_id])
+
+    def set_elo(self, card_id, elo):
+        record = self.snapshot.records.get(card_id)
+        if record is None:
+            return
+        self.add(record[:self.ELO] + (int(elo),) + record[self.ELO + 1:])
+
+    def row(self, record):
+        return dict(zip(self.columns, record))
+
+
+def load_card_index(kind, path):
+    init_db(path)
+    with get_db(path) as conn:
+        cursor = conn.execute(CARD_INDEX_QUERIES[kind])
+        columns = [column[0] for column in cursor.description]
+        return CardIndex(kind, columns, cursor.fetchall())
+
+
+def card_index(kind, path=None):
+    db_path = os.path.abspath(path or ACTIVE_MATERIAL_DB.get())
+    key = (db_path, kind)
+    with CARD_INDEX_LOCK:
+        index = CARD_INDEXES.get(key)
+        if index is not None and time.monotonic() - index.built_at < CARD_INDEX_TTL_SECONDS:
+            return index
+        loading = CARD_INDEX_LOADS.setdefault(key, threading.Lock())
+    # While one request reloads, the others keep using the expired index, or
+    # wait for the reload if there is none yet.
+    if not loading.acquire(blocking=index is None):
+        return index
+    try:
+        with CARD_INDEX_LOCK:
+            current = CARD_INDEXES.get(key)
+        if current is not None and current is not index:
+            return current
+        index = load_card_index(kind, db_path)
+        with CARD_INDEX_LOCK:
+            CARD_INDEXES[key] = index
+    finally:
+        loading.release()
+    # A reload is when cards disappear for good; drop their uids once enough
+    # have piled up to be worth rebuilding every cached bitmap.
+    with SEEN_CACHE_LOCK:
+        if len(CARD_UID_TABLE[1]) > CARD_UID_STATE["compact_at"]:
+            compact_card_uids()
+    return index
+
+
+def invalidate_card_index(*kinds, path=None):
+    db_path = os.path.abspath(path or ACTIVE_MATERIAL_DB.get())
+    with CARD_INDEX_LOCK:
+        for kind in kinds or CARD_INDEX_QUERIES:
+            CARD_INDEXES.pop((db_path, kind), None)
+
+
+def refresh_indexed_card(kind, card_id, path=None):
+    db_path = os.path.abspath(path or ACTIVE_MATERIAL_DB.get())
+    with CARD_INDEX_LOCK:
+        index = CARD_INDEXES.get((db_path, kind))
+    if index is None:
+        return
+    try:
+        card_id = int(card_id)
+    except (TypeError, ValueError):
+        return
+    column = "q.id" if kind != "cloze" else "id"
+    with get_db(db_path) as conn:
+        row = conn.execute(
+            CARD_INDEX_QUERIES[kind] + f" AND {column} = ?",
+            (card_id,),
+        ).fetchone()
+    with CARD_INDEX_LOCK:
+        if row:
+            index.add(tuple(row))
+        else:
+            index.remove(card_id)
+
+
+def update_indexed_card_elo(kinds, card_id, elo, path=None):
+    db_path = os.path.abspath(path or ACTIVE_MATERIAL_DB.get())
+    with CARD_INDEX_LOCK:
+        for kind in kinds:
+            index = CARD_INDEXES.get((db_path, kind))
+            if index is not None:
+                index.set_elo(card_id, elo)
+
+
+def refresh_card_index_after_admin_change(form, edited=False):
+    card_type = form.get("card_type", "")
+    if card_type == "cloze":
+        refresh_indexed_card("cloze", form.get("id", ""))
+    elif edited:
+        # Editing a card also renames its verb, which other cards share.
+        invalidate_card_index("flashcard", "verb_form")
+    elif card_type in ("flashcard", "verb_form"):
+        refresh_indexed_card(card_type, form.get("id", ""))
+    else:
+        invalidate_card_index("verb_form")
+
+
+@process_cache("card_index")
+def clear_card_indexes():
+    with CARD_INDEX_LOCK:
+        CARD_INDEXES.clear()
+
+
+def indexed_card_row(user, kind, force_new, excluded_uids=None, verb_ids=None):
+    index = card_index(kind)
     user_elo = int(user.get("elo", DEFAULT_ELO))
-    with get_db() as conn:
-        if kind == "flashcard":
-            pool_count = conn.execute(
-                "SELECT COUNT(*) FROM user_flashcards WHERE user_name = ?",
-                (user["name"],),
-            ).fetchone()[0]
-            force_new = random.random() < NEW_CONTENT_CHANCE
-            if pool_count:
-                rows = conn.execute(
-                    """
-                    SELECT q.*, v.infinitive, v.ja
-                    FROM questions q
-                    JOIN verbs v ON v.id = q.verb_id
-                    JOIN user_flashcards uf ON uf.verb_id = v.id
-                    WHERE uf.user_name = ?
-                        AND q.kind = 'flashcard'
-                        AND q.active = 1
-                        AND q.status = 'approved'
-                    """,
-                    (user["name"],),
-                ).fetchall()
-            else:
-                rows = conn.execute(
-                    """
-                    SELECT q.*, v.infinitive, v.ja
-                    FROM questions q
-                    JOIN verbs v ON v.id = q.verb_id
-                    WHERE q.kind = 'flashcard'
-                        AND q.active = 1
-                        AND q.status = 'approved'
-                    """
-                ).fetchall()
-            rows = exclude_card_uids(rows, excluded_uids)
-            rows = choose_user_card_subset(rows, conn, user, "flashcard", force_new)
+    excluded = excluded_uids or set()
+    snapshot = index.snapshot
+    if verb_ids is not None:
+        records = snapshot.records_for_verbs(verb_ids)
+        rows = exclude_card_uids([index.row(record) for record in records], excluded)
+        rows = choose_user_card_subset(rows, None, user, kind, force_new)
+        return weighted_row_by_elo(rows, user_elo)
+
+    seen = user_seen_card_uids(user.get("name", ""), kind)
+    uid = CardIndex.UID
+    eligible = len(snapshot) - snapshot.count_uids(excluded)
+    if eligible <= 0:
+        return None
+
+    def unseen(record):
+        return record[uid] not in seen and record[uid] not in excluded
+
+    def seen_only(record):
+        return record[uid] in seen and record[uid] not in excluded
+
+    def any_card(record):
+        return record[uid] not in excluded
+
+    if len(seen) * CARD_INDEX_MAX_ATTEMPTS < CARD_INDEX_MIN_EXPECTED_HITS * len(snapshot):
+        # Too few seen cards for rejection sampling to find: pick among them
+        # directly, which costs only the size of the seen set.
+        seen_records = snapshot.records_for_uids(seen, excluded)
+        if force_new and eligible > len(seen_records):
+            record = snapshot.sample(user_elo, unseen)
+        elif seen_records:
+            elo = CardIndex.ELO
+            record = weighted_sample(seen_records, user_elo, 1, elos=[record[elo] for record in seen_records])[0]
         else:
-            force_new = random.random() < NEW_CONTENT_CHANCE
-            rows = conn.execute(
-                """
-                SELECT
-                    q.*,
-                    v.infinitive,
-                    v.ja,
-                    vf.tense,
-                    vf.pronoun,
-                    vf.gender
-                FROM questions q
-                JOIN verbs v ON v.id = q.verb_id
-                JOIN verb_forms vf ON vf.id = q.verb_form_id
-                WHERE q.kind = 'verb_form'
-                    AND q.active = 1
-                    AND q.status = 'approved'
-                """
+            record = snapshot.sample(user_elo, any_card)
+    elif force_new and (eligible > len(seen) or eligible > snapshot.count_uids(seen, excluded)):
+        record = snapshot.sample(user_elo, unseen)
+    else:
+        record = snapshot.sample(user_elo, seen_only) or snapshot.sample(user_elo, any_card)
+    return index.row(record) if record else None
+
+
+def user_flashcard_verb_ids(user):
+    with get_db() as conn:
+        return {
+            row["verb_id"]
+            for row in conn.execute(
+                "SELECT verb_id FROM user_flashcards WHERE user_name = ?",
+                (user.get("name", ""),),
             ).fetchall()
-            rows = exclude_card_uids(rows, excluded_uids)
-            rows = choose_user_card_subset(rows, conn, user, "verb_form", force_new)
+        } or None
+
 
-    return weighted_row_by_elo(rows, user_elo)
+def weighted_question_row(user, kind, excluded_uids=None):
+    init_db()
+    force_new = random.random() < NEW_CONTENT_CHANCE
+    verb_ids = user_flashcard_verb_ids(user) if kind == "flashcard" else None
+    return indexed_card_row(user, kind, force_new, excluded_uids=excluded_uids, verb_ids=verb_ids)
 
 
 def pick_cloze_question(user, excluded_uids=None):
@@ -3456,18 +4378,7 @@ def pick_cloze_question(user, excluded_uids=None):
         random.random() < NEW_CONTENT_CHANCE
         and not user.get("_skip_new")
     )
-    with get_db() as conn:
-        rows = conn.execute(
-            """
-            SELECT id, uid, revision, sentence, answer, translation, elo, is_new
-            FROM cloze_questions
-            WHERE active = 1
-                AND status = 'approved'
-            """,
-        ).fetchall()
-        rows = exclude_card_uids(rows, excluded_uids)
-        rows = choose_user_card_subset(rows, conn, user, "cloze", force_new)
-    row = weighted_row_by_elo(rows, int(user.get("elo", DEFAULT_ELO)))
+    row = indexed_card_row(user, "cloze", force_new, excluded_uids=excluded_uids)
     if not row:
         return None
     return {
@@ -3504,7 +4415,7 @@ def pick_question(user=None, excluded_uids=None, allow_fallback=True):
         }
     if not allow_fallback:
         return None
-    verb = random.choice(VERBS)
+    verb = random.choice(fallback_verbs())
     form = random.choice(verb["forms"])
     return {
         "question_id": "",
@@ -3569,16 +4480,19 @@ def pick_flashcard(user, excluded_uids=None, allow_fallback=True):
         card["question_id"] = ""
         card["question_elo"] = DEFAULT_ELO
         card["is_new"] = False
-    cards = user_flashcard_pool(user)
+    return card, flashcard_options(card["translation"], user_flashcard_pool(user))
+
+
+def flashcard_options(translation, cards):
     translations = [
         item["translation"]
         for item in cards
-        if item["translation"] != card["translation"]
+        if item["translation"] != translation
     ]
     random.shuffle(translations)
-    options = translations[:3] + [card["translation"]]
+    options = translations[:3] + [translation]
     random.shuffle(options)
-    return card, options
+    return options
 
 
 def increment_practiced_count(username):
@@ -3592,7 +4506,8 @@ def increment_practiced_count(username):
             """,
             (username,),
         )
-    return load_users()["users"].get(username)
+    forget_user_sessions(username)
+    return load_user(username)
 
 
 def practiced_count(user):
@@ -3619,77 +4534,94 @@ def remember_daily_card(used_uids, item):
         used_uids.add(uid)
 
 
-def build_daily_state(user, target=None):
-    total = max(1, min(100, int(target or user.get("daily_target", DEFAULT_DAILY_TARGET))))
-    if STUDY_LANGUAGES[study_language(user)].get("verb_enabled"):
-        counts = distribute_daily_counts(total)
-    else:
-        counts = {"verb_form": 0, "flashcard": 0, "cloze": total}
-    items = []
-    used_uids = set()
+def draw_daily_rows(user, kind, count, excluded_uids, allow_new=True):
+    # One pass per game type: the pool and the user's seen set are read once
+    # and all cards are drawn together. Each draw still goes to unseen cards
+    # with NEW_CONTENT_CHANCE, otherwise to seen cards, and falls back to
+    # whatever is left once a group runs out.
+    if count <= 0:
+        return []
+    init_db()
+    index = card_index(kind)
+    verb_ids = user_flashcard_verb_ids(user) if kind == "flashcard" else None
+    seen = user_seen_card_uids(user.get("name", ""), kind)
+    uid = CardIndex.UID
+    snapshot = index.snapshot
+    pool = snapshot.records_for_verbs(verb_ids) if verb_ids else list(snapshot.records.values())
+    pool = [record for record in pool if record[uid] not in excluded_uids]
+    unseen = [record for record in pool if record[uid] not in seen]
+    seen_records = [record for record in pool if record[uid] in seen]
+    user_elo = int(user.get("elo", DEFAULT_ELO))
 
-    for _ in range(counts["verb_form"]):
-        question = pick_question(user, excluded_uids=used_uids, allow_fallback=False)
-        if not question:
-            continue
-        item = {
-            "game": "verb_form",
-            "question_id": question.get("question_id", ""),
-            "card_uid": question.get("card_uid", ""),
-            "card_revision": int(question.get("card_revision", 1)),
-            "question_elo": int(question.get("question_elo", DEFAULT_ELO)),
-            "is_new": bool(question.get("is_new")),
-            "infinitive": question["infinitive"],
-            "ja": question["ja"],
-            "tense": question["tense"],
-            "pronoun": question["pronoun"],
-            "gender": question.get("gender", ""),
-            "answer": question["answer"],
-        }
-        remember_daily_card(used_uids, item)
-        items.append(
-            item
-        )
+    def draw(records, k):
+        return weighted_sample(records, user_elo, k, elos=[record[CardIndex.ELO] for record in records])
 
-    for _ in range(counts["flashcard"]):
-        card, options = pick_flashcard(user, excluded_uids=used_uids, allow_fallback=False)
-        if not card:
-            continue
-        item = {
-            "game": "flashcard",
-            "question_id": card.get("question_id", ""),
-            "card_uid": card.get("card_uid", ""),
-            "card_revision": int(card.get("card_revision", 1)),
-            "question_elo": int(card.get("question_elo", DEFAULT_ELO)),
-            "is_new": bool(card.get("is_new")),
-            "word": card["word"],
-            "translation": card["translation"],
-            "options": options,
-        }
-        remember_daily_card(used_uids, item)
-        items.append(
-            item
+    new_draws = sum(1 for _ in range(count) if allow_new and random.random() < NEW_CONTENT_CHANCE)
+    picked = draw(unseen, new_draws)
+    picked += draw(seen_records, count - len(picked))
+    if len(picked) < count:
+        taken = {record[uid] for record in picked}
+        picked += draw([record for record in unseen if record[uid] not in taken], count - len(picked))
+    return [index.row(record) for record in picked]
+
+
+def daily_item(game, row):
+    item = {
+        "game": game,
+        "question_id": row["id"],
+        "card_uid": row["uid"],
+        "card_revision": int(row["revision"]),
+        "question_elo": int(row["elo"]),
+        "is_new": bool(row["is_new"]),
+    }
+    if game == "verb_form":
+        item.update(
+            {
+                "infinitive": row["infinitive"],
+                "ja": row["ja"],
+                "tense": row["tense"],
+                "pronoun": row["pronoun"],
+                "gender": row["gender"] or "",
+                "answer": row["answer"],
+            }
+        )
+    elif game == "flashcard":
+        item.update({"word": row["infinitive"], "translation": row["answer"]})
+    else:
+        item.update(
+            {
+                "sentence": row["sentence"],
+                "answer": row["answer"],
+                "translation": row["translation"],
+            }
         )
+    return item
 
-    for _ in range(counts["cloze"]):
-        question = pick_cloze_question(user, excluded_uids=used_uids)
-        if not question:
-            continue
-        item = {
-            "game": "cloze",
-            "question_id": question.get("question_id", ""),
-            "card_uid": question.get("card_uid", ""),
-            "card_revision": int(question.get("card_revision", 1)),
-            "question_elo": int(question.get("question_elo", DEFAULT_ELO)),
-            "is_new": bool(question.get("is_new")),
-            "sentence": question["sentence"],
-            "answer": question["answer"],
-            "translation": question["translation"],
-        }
-        remember_daily_card(used_uids, item)
-        items.append(
-            item
+
+def build_daily_state(user, target=None):
+    total = max(1, min(100, int(target or user.get("daily_target", DEFAULT_DAILY_TARGET))))
+    if STUDY_LANGUAGES[study_language(user)].get("verb_enabled"):
+        counts = distribute_daily_counts(total)
+    else:
+        counts = {"verb_form": 0, "flashcard": 0, "cloze": total}
+    items = []
+    used_uids = set()
+
+    for game in ("verb_form", "flashcard", "cloze"):
+        rows = draw_daily_rows(
+            user,
+            game,
+            counts[game],
+            used_uids,
+            allow_new=game != "cloze" or not user.get("_skip_new"),
         )
+        flashcard_pool = user_flashcard_pool(user) if game == "flashcard" and rows else []
+        for row in rows:
+            item = daily_item(game, row)
+            if game == "flashcard":
+                item["options"] = flashcard_options(item["translation"], flashcard_pool)
+            remember_daily_card(used_uids, item)
+            items.append(item)
 
     random.shuffle(items)
     return {
@@ -3750,6 +4682,7 @@ def complete_daily(username):
             """,
             (new_streak, today, username),
         )
+    forget_user_sessions(username)
     return new_streak
 
 
@@ -3825,6 +4758,7 @@ def update_daily_settings(username, target, vacation_mode, language=None):
     target_value = max(3, min(100, target_value))
     language_value = language if language in STUDY_LANGUAGES else None
     init_db(DB_PATH)
+    forget_user_sessions(username)
     with get_runtime_db() as conn:
         if language_value:
             conn.execute(
@@ -3850,6 +4784,66 @@ def update_daily_settings(username, target, vacation_mode, language=None):
         )
 
 
+def asset_fingerprint(path):
+    # Assets only change with a deploy, so each file is hashed once per process.
+    digest = STATIC_FINGERPRINTS.get(path)
+    if digest is None:
+        try:
+            with open(os.path.join(STATIC_DIR, path), "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        except OSError:
+            return None
+        STATIC_FINGERPRINTS[path] = digest
+    return digest
+
+
+def asset_url(path):
+    stem, extension = os.path.splitext(path)
+    return f"/static/{stem}.{asset_fingerprint(path)}{extension}"
+
+
+def split_asset_fingerprint(path):
+    match = re.fullmatch(r"(.+)\.([0-9a-f]{12})(\.\w+)", path)
+    if not match:
+        return path, None
+    return match.group(1) + match.group(3), match.group(2)
+
+
+class PageTemplate:
+    # Split once at import into encoded static chunks and {{slot}} names, so
+    # a render only encodes the per-request values and joins bytes.
+    SLOT = re.compile(r"\{\{(\w+)\}\}")
+
+    def __init__(self, source, **fixed):
+        # Slots given here (asset URLs and the like) are filled in once, now.
+        source = self.SLOT.sub(lambda match: str(fixed.get(match.group(1), match.group(0))), source)
+        parts = self.SLOT.split(source)
+        self.chunks = [part.encode("utf-8") for part in parts[0::2]]
+        self.slots = parts[1::2]
+        self.static_bytes = sum(len(chunk) for chunk in self.chunks)
+
+    def render(self, **values):
+        out = [self.chunks[0]]
+        for slot, chunk in zip(self.slots, self.chunks[1:]):
+            out.append(str(values[slot]).encode("utf-8"))
+            out.append(chunk)
+        return b"".join(out)
+
+
+def html_response(start_response, body, status="200 OK", headers=None):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    start_response(
+        status,
+        [
+            ("Content-Type", "text/html; charset=utf-8"),
+            ("Content-Length", str(len(body))),
+        ]
+        + list(headers or []),
+    )
+    return [body]
+
+
 def render_nav(username, user, active=""):
     admin_link = (
         '<a href="/admin">管理</a>' if user.get("is_admin") else ""
@@ -3895,22 +4889,28 @@ def render_nav(username, user, active=""):
 
 
 def render_nav(username, user, active=""):
-    admin_link = '<a href="/admin">管理</a>' if user.get("is_admin") else ""
-    links = [
-        ('href="/"', "メニュー"),
-        ('href="/daily"', "今日の練習"),
-        ('href="/flashcards"', "単語カード"),
-        ('href="/cloze"', "穴埋め"),
-        ('href="/settings"', "設定"),
-    ]
-    if STUDY_LANGUAGES[study_language(user)].get("verb_enabled"):
-        links.insert(2, ('href="/verbs"', "動詞練習"))
-    link_html = "".join(
-        f'<a {attrs} class="{"active" if label == active else ""}">{label}</a>'
-        for attrs, label in links
-    )
+    verb_enabled = bool(STUDY_LANGUAGES[study_language(user)].get("verb_enabled"))
+    key = (verb_enabled, active, bool(user.get("is_admin")))
+    link_html = NAV_LINKS_HTML.get(key)
+    if link_html is None:
+        links = [
+            ('href="/"', "メニュー"),
+            ('href="/daily"', "今日の練習"),
+            ('href="/flashcards"', "単語カード"),
+            ('href="/cloze"', "穴埋め"),
+            ('href="/settings"', "設定"),
+        ]
+        if verb_enabled:
+            links.insert(2, ('href="/verbs"', "動詞練習"))
+        link_html = "".join(
+            f'<a {attrs} class="{"active" if label == active else ""}">{label}</a>'
+            for attrs, label in links
+        )
+        if user.get("is_admin"):
+            link_html += '<a href="/admin">管理</a>'
+        NAV_LINKS_HTML[key] = link_html
     return (
-        f'<div class="topline"><nav class="nav">{link_html}{admin_link}</nav>'
+        f'<div class="topline"><nav class="nav">{link_html}</nav>'
         f'<div class="user-status">{escape(username)} · '
         f'ELO {int(user.get("elo", DEFAULT_ELO))} · '
         f'{practiced_count(user)}枚練習済み '
@@ -3918,6 +4918,48 @@ def render_nav(username, user, active=""):
     )
 
 
+VERB_PAGE_TEMPLATE = PageTemplate("""<!doctype html>
+<html lang="it">
+  <head>
+    <meta charset="utf-8" />
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <title>Italian Verb Quiz</title>
+    <link rel="stylesheet" href="{{stylesheet}}" />
+  </head>
+  <body>
+    <div class="layout">
+      <div class="card">
+        <div class="card-main">
+          <div class="card-content">
+            {{nav_html}}
+            <div class="topline">
+              <div class="progress">{{progress}}</div>
+              <div class="user-status">
+                {{username_html}} · {{practiced_count}} practiced
+                {{admin_link}}
+                <a class="logout" href="/logout">Logout</a>
+              </div>
+            </div>
+            {{finish_note}}
+            {{question_html}}
+          </div>
+          <div class="card-image">
+            {{cat_image_html}}
+          </div>
+        </div>
+        {{form_html}}
+      </div>
+      <aside class="sidebar">
+        <h2>History</h2>
+        {{history_html}}
+      </aside>
+    </div>
+  </body>
+</html>""",
+    stylesheet=asset_url("css/verbs.css"),
+)
+
+
 def render_page(
     question,
     state,
@@ -4018,12 +5060,144 @@ def render_page(
         '<img src="/static/gatto-cropped.png" alt="Study cat" class="cat-image" />'
     )
 
+    return VERB_PAGE_TEMPLATE.render(
+        nav_html=nav_html,
+        progress=progress,
+        username_html=escape(username),
+        practiced_count=practiced_count,
+        admin_link='<a class="logout" href="/admin">Admin</a>' if is_admin else "",
+        finish_note=finish_note,
+        question_html=question_html,
+        cat_image_html=cat_image_html,
+        form_html=form_html,
+        history_html=history_html,
+    )
+
+
+DAILY_PAGE_TEMPLATE = PageTemplate("""<!doctype html>
+<html lang="ja">
+  <head>
+    <meta charset="utf-8" />
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <title>今日の練習</title>
+    <link rel="stylesheet" href="{{stylesheet}}" />
+  </head>
+  <body>
+    <main class="wrap">
+      {{nav_html}}
+      <section class="card">
+        <div class="progress">{{progress}}</div>
+        {{result_html}}
+        {{card_html}}
+      </section>
+    </main>
+  </body>
+</html>""",
+    stylesheet=asset_url("css/daily.css"),
+)
+
+
+def render_daily(username, user, state, result=None, finished=False, streak=None):
+    nav_html = render_nav(username, user, "今日の練習")
+    total = max(1, int(state.get("total", 0) or 1))
+    index = min(int(state.get("index", 0)), total)
+    progress = f"{index + 1 if not finished else total}/{total}"
+
+    result_html = ""
+    if result:
+        css_class = "ok" if result["ok"] else "bad"
+        text = "正解です。" if result["ok"] else "不正解です。"
+        result_html = (
+            f'<div class="result {css_class}">{text} '
+            f'答え: {escape(result["answer"])}</div>'
+        )
+
+    if finished:
+        streak_value = streak if streak is not None else user.get("daily_streak", 0)
+        card_html = f"""
+          <div class="complete">
+            <h1>今日の練習完了</h1>
+            <p>次の日まで待ってください。</p>
+            <p>連続記録: {int(streak_value)}日</p>
+            <a class="next" href="/">メニューへ</a>
+          </div>
+        """
+    else:
+        item = state["items"][index]
+        new_badge = '<span class="new-badge">NEW</span>' if item.get("is_new") else ""
+        hidden_state = escape(encode_state(state))
+        game = item["game"]
+        game_label = {
+            "verb_form": "動詞練習",
+            "flashcard": "単語カード",
+            "cloze": "穴埋め",
+        }.get(game, "練習")
+        elo_line = (
+            f'<div class="meta">あなたのELO: {int(user.get("elo", DEFAULT_ELO))} / '
+            f'問題ELO: {int(item.get("question_elo", DEFAULT_ELO))}</div>'
+        )
+
+        if game == "verb_form":
+            tense_label = escape(build_tense_label(item["tense"]))
+            gender_label = escape(build_gender_label(item.get("gender", "")))
+            gender_html = f'<div class="meta">{gender_label}</div>' if gender_label else ""
+            card_html = f"""
+              <div class="kicker">{game_label}</div>
+              <div class="word">{escape(item["infinitive"])} {escape(item["ja"])} {new_badge}</div>
+              <div class="meta">{tense_label}</div>
+              {gender_html}
+              {elo_line}
+              <form method="post" action="/daily" class="answer-form">
+                <span class="pronoun-inline">{escape(item["pronoun"])}</span>
+                <input name="answer" type="text" autocomplete="off" autofocus />
+                <button type="submit">確認</button>
+                <input type="hidden" name="state" value="{hidden_state}" />
+              </form>
+            """
+        elif game == "flashcard":
+            option_buttons = "".join(
+                f'<button type="submit" name="answer" value="{escape(option)}">{escape(option)}</button>'
+                for option in item.get("options", [])
+            )
+            card_html = f"""
+              <div class="kicker">{game_label}</div>
+              <div class="prompt">この単語の意味は？</div>
+              <div class="word">{escape(item["word"])} {new_badge}</div>
+              {elo_line}
+              <form method="post" action="/daily" class="options">
+                <input type="hidden" name="state" value="{hidden_state}" />
+                {option_buttons}
+              </form>
+            """
+        else:
+            card_html = f"""
+              <div class="kicker">{game_label}</div>
+              <div class="sentence">{escape(item["sentence"])} {new_badge}</div>
+              <div class="translation">{escape(item["translation"])}</div>
+              {elo_line}
+              <form method="post" action="/daily" class="answer-form">
+                <input name="answer" type="text" autocomplete="off" autofocus />
+                <button type="submit">確認</button>
+                <input type="hidden" name="state" value="{hidden_state}" />
+              </form>
+            """
+
+    return DAILY_PAGE_TEMPLATE.render(
+        nav_html=nav_html,
+        progress=progress,
+        result_html=result_html,
+        card_html=card_html,
+    )
+
+
+def render_menu(username, user):
+    nav_html = render_nav(username, user, "メニュー")
     return f"""<!doctype html>
-<html lang="it">
+<html lang="ja">
   <head>
     <meta charset="utf-8" />
     <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <title>Italian Verb Quiz</title>
+    <title>練習メニュー</title>
     <style>
       body {{
         font-family: Georgia, "Times New Roman", serif;
@@ -4032,90 +5206,23 @@ def render_page(
         margin: 0;
         padding: 32px;
       }}
-      .layout {{
-        display: flex;
-        gap: 20px;
-        max-width: 1100px;
+      .wrap {{
+        max-width: 880px;
         margin: 0 auto;
       }}
-      .sidebar {{
-        width: 360px;
-        background: #faf7f0;
-        border: 1px solid #e8e0d4;
-        border-radius: 16px;
-        padding: 20px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.1);
-        overflow-y: auto;
-        max-height: 85vh;
-      }}
-      .card {{
-        flex: 1;
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 16px;
-        padding: 28px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
-        display: flex;
-        flex-direction: column;
-        gap: 20px;
-      }}
-      .card-main {{
-        display: flex;
-        gap: 24px;
-      }}
-      .card-content {{
-        flex: 1;
-      }}
-      .card-image {{
-        width: 140px;
-        flex-shrink: 0;
-      }}
-      .cat-image {{
-        width: 100%;
-        height: auto;
-        display: block;
-        object-fit: cover;
-      }}
-      .progress {{
-        font-size: 14px;
-        color: #7a7065;
-        margin-bottom: 16px;
-        font-weight: 500;
-      }}
       .topline {{
         display: flex;
         justify-content: space-between;
         gap: 16px;
         align-items: center;
-        margin-bottom: 16px;
-      }}
-      .progress {{
-        margin-bottom: 0;
-      }}
-      .user-status {{
-        color: #7a7065;
-        font-size: 13px;
-        text-align: right;
-      }}
-      .logout {{
-        color: #8fa68e;
-        margin-left: 8px;
-        text-decoration: none;
-        font-weight: 600;
-      }}
-      .verb-info {{
         margin-bottom: 20px;
       }}
-      .card-content > .topline:nth-of-type(2) {{
-        display: none;
-      }}
       .nav {{
         display: flex;
         flex-wrap: wrap;
         gap: 12px;
-        align-items: center;
       }}
-      .nav a {{
+      .nav a, .logout {{
         color: #8fa68e;
         font-size: 13px;
         font-weight: 600;
@@ -4124,292 +5231,89 @@ def render_page(
       .nav a.active {{
         color: #4a4239;
       }}
-      .verb-name {{
-        font-size: 24px;
-        font-weight: 600;
-        margin-bottom: 8px;
-        color: #4a4239;
-      }}
-      .tense {{
-        font-size: 16px;
-        color: #6b635c;
-        margin-bottom: 4px;
-      }}
-      .gender {{
-        font-size: 14px;
-        color: #8fa68e;
-        font-style: italic;
-      }}
-      .elo-line {{
+      .user-status {{
         color: #7a7065;
         font-size: 13px;
-        margin-top: 8px;
-      }}
-      .new-badge {{
-        background: #c4706a;
-        border-radius: 999px;
-        color: #fff;
-        display: inline-block;
-        font-size: 11px;
-        padding: 3px 7px;
-        vertical-align: middle;
+        text-align: right;
       }}
-      .answer-form {{
-        display: flex;
-        align-items: center;
-        gap: 12px;
-        margin-top: 20px;
+      h1 {{
+        margin: 0 0 18px;
+        font-size: 28px;
       }}
-      .pronoun-inline {{
-        font-size: 18px;
-        font-weight: 600;
-        color: #5c5348;
-        white-space: nowrap;
+      .games {{
+        display: grid;
+        grid-template-columns: repeat(auto-fit, minmax(240px, 1fr));
+        gap: 16px;
       }}
-      .answer-input {{
-        flex: 1;
-        padding: 10px 14px;
-        font-size: 16px;
-        border: 2px solid #d8d0c4;
-        border-radius: 8px;
+      .game {{
+        display: block;
         background: #fffef9;
+        border: 1px solid #e8e0d4;
+        border-radius: 12px;
+        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
+        color: inherit;
+        padding: 22px;
+        text-decoration: none;
       }}
-      .answer-input:focus {{
-        outline: none;
-        border-color: #8fa68e;
-      }}
-      .finish {{
-        margin-top: 12px;
-        font-size: 15px;
-        color: #5c5348;
-        background: #f0ebe3;
-        border: 1px solid #dcd4c8;
-        padding: 12px 16px;
-        border-radius: 10px;
-      }}
-      button {{
-        background: #8fa68e;
-        color: #fff;
-        border: 0;
-        padding: 12px 20px;
-        border-radius: 10px;
-        font-size: 16px;
-        font-weight: 500;
-        cursor: pointer;
-        transition: background 0.2s, transform 0.1s;
-      }}
-      button:hover {{
-        background: #7a9179;
-      }}
-      button:active {{
-        transform: translateY(1px);
-      }}
-      .sidebar h2 {{
-        margin: 0 0 14px;
-        font-size: 14px;
-        text-transform: uppercase;
-        letter-spacing: 1px;
-        color: #8fa68e;
-        font-weight: 600;
-      }}
-      .history-item {{
-        border-bottom: 1px dashed #dcd4c8;
-        padding: 12px 0;
-      }}
-      .history-item:last-child {{
-        border-bottom: 0;
+      .game h2 {{
+        margin: 0 0 8px;
+        font-size: 20px;
       }}
-      .history-question {{
-        font-size: 14px;
-        margin-bottom: 4px;
+      .game p {{
+        margin: 0;
         color: #6b635c;
+        font-size: 14px;
+        line-height: 1.5;
       }}
-      .history-answer {{
-        font-size: 13px;
-        font-weight: 600;
-      }}
-      .history-correct {{
-        font-size: 13px;
-        color: #6b9b6a;
-      }}
-      .user-ok {{
-        color: #6b9b6a;
-      }}
-      .user-bad {{
-        color: #c4706a;
-      }}
-      .empty {{
-        font-size: 13px;
-        color: #9a9287;
-        font-style: italic;
-      }}
-      @media (max-width: 900px) {{
-        .layout {{
-          flex-direction: column;
-        }}
-        .sidebar {{
-          width: auto;
-          max-height: none;
+      @media (max-width: 640px) {{
+        body {{
+          padding: 20px;
         }}
-        .card-main {{
-          flex-direction: row;
+        .topline {{
           align-items: flex-start;
-          gap: 16px;
-        }}
-        .card-content {{
-          flex: 1;
-        }}
-        .card-image {{
-          width: 104px;
-          flex-shrink: 0;
-          margin: 0;
-        }}
-        .answer-form {{
           flex-direction: column;
-          align-items: stretch;
-          margin-top: 16px;
-        }}
-        .pronoun-inline {{
-          text-align: center;
-        }}
-        .verb-name {{
-          font-size: 20px;
-        }}
-        .tense {{
-          font-size: 14px;
-        }}
-        .gender {{
-          font-size: 12px;
         }}
-        .topline {{
-          align-items: flex-start;
+        .user-status {{
+          text-align: left;
         }}
       }}
     </style>
   </head>
   <body>
-    <div class="layout">
-      <div class="card">
-        <div class="card-main">
-          <div class="card-content">
-            {nav_html}
-            <div class="topline">
-              <div class="progress">{progress}</div>
-              <div class="user-status">
-                {escape(username)} · {practiced_count} practiced
-                {"<a class=\"logout\" href=\"/admin\">Admin</a>" if is_admin else ""}
-                <a class="logout" href="/logout">Logout</a>
-              </div>
-            </div>
-            {finish_note}
-            {question_html}
-          </div>
-          <div class="card-image">
-            {cat_image_html}
-          </div>
-        </div>
-        {form_html}
-      </div>
-      <aside class="sidebar">
-        <h2>History</h2>
-        {history_html}
-      </aside>
-    </div>
+    <main class="wrap">
+      {nav_html}
+      <h1>練習メニュー</h1>
+      <section class="games">
+        <a class="game" href="/verbs">
+          <h2>動詞練習</h2>
+          <p>イタリア語の動詞活用を入力して練習します。</p>
+        </a>
+        <a class="game" href="/flashcards">
+          <h2>単語カード</h2>
+          <p>イタリア語の単語を見て、日本語の意味を選びます。</p>
+        </a>
+        <a class="game" href="/cloze">
+          <h2>穴埋め</h2>
+          <p>イタリア語の文の空欄に入る単語を入力します。下に日本語訳が表示されます。</p>
+        </a>
+      </section>
+    </main>
   </body>
 </html>"""
 
 
-def render_daily(username, user, state, result=None, finished=False, streak=None):
-    nav_html = render_nav(username, user, "今日の練習")
-    total = max(1, int(state.get("total", 0) or 1))
-    index = min(int(state.get("index", 0)), total)
-    progress = f"{index + 1 if not finished else total}/{total}"
-
-    result_html = ""
-    if result:
-        css_class = "ok" if result["ok"] else "bad"
-        text = "正解です。" if result["ok"] else "不正解です。"
-        result_html = (
-            f'<div class="result {css_class}">{text} '
-            f'答え: {escape(result["answer"])}</div>'
-        )
-
-    if finished:
-        streak_value = streak if streak is not None else user.get("daily_streak", 0)
-        card_html = f"""
-          <div class="complete">
-            <h1>今日の練習完了</h1>
-            <p>次の日まで待ってください。</p>
-            <p>連続記録: {int(streak_value)}日</p>
-            <a class="next" href="/">メニューへ</a>
-          </div>
-        """
-    else:
-        item = state["items"][index]
-        new_badge = '<span class="new-badge">NEW</span>' if item.get("is_new") else ""
-        hidden_state = escape(encode_state(state))
-        game = item["game"]
-        game_label = {
-            "verb_form": "動詞練習",
-            "flashcard": "単語カード",
-            "cloze": "穴埋め",
-        }.get(game, "練習")
-        elo_line = (
-            f'<div class="meta">あなたのELO: {int(user.get("elo", DEFAULT_ELO))} / '
-            f'問題ELO: {int(item.get("question_elo", DEFAULT_ELO))}</div>'
-        )
-
-        if game == "verb_form":
-            tense_label = escape(build_tense_label(item["tense"]))
-            gender_label = escape(build_gender_label(item.get("gender", "")))
-            gender_html = f'<div class="meta">{gender_label}</div>' if gender_label else ""
-            card_html = f"""
-              <div class="kicker">{game_label}</div>
-              <div class="word">{escape(item["infinitive"])} {escape(item["ja"])} {new_badge}</div>
-              <div class="meta">{tense_label}</div>
-              {gender_html}
-              {elo_line}
-              <form method="post" action="/daily" class="answer-form">
-                <span class="pronoun-inline">{escape(item["pronoun"])}</span>
-                <input name="answer" type="text" autocomplete="off" autofocus />
-                <button type="submit">確認</button>
-                <input type="hidden" name="state" value="{hidden_state}" />
-              </form>
-            """
-        elif game == "flashcard":
-            option_buttons = "".join(
-                f'<button type="submit" name="answer" value="{escape(option)}">{escape(option)}</button>'
-                for option in item.get("options", [])
-            )
-            card_html = f"""
-              <div class="kicker">{game_label}</div>
-              <div class="prompt">この単語の意味は？</div>
-              <div class="word">{escape(item["word"])} {new_badge}</div>
-              {elo_line}
-              <form method="post" action="/daily" class="options">
-                <input type="hidden" name="state" value="{hidden_state}" />
-                {option_buttons}
-              </form>
-            """
-        else:
-            card_html = f"""
-              <div class="kicker">{game_label}</div>
-              <div class="sentence">{escape(item["sentence"])} {new_badge}</div>
-              <div class="translation">{escape(item["translation"])}</div>
-              {elo_line}
-              <form method="post" action="/daily" class="answer-form">
-                <input name="answer" type="text" autocomplete="off" autofocus />
-                <button type="submit">確認</button>
-                <input type="hidden" name="state" value="{hidden_state}" />
-              </form>
-            """
-
+def render_menu(username, user):
+    nav_html = render_nav(username, user, "メニュー")
+    daily_target = int(user.get("daily_target", DEFAULT_DAILY_TARGET))
+    daily_streak = int(user.get("daily_streak", 0))
+    vacation_checked = "checked" if user.get("daily_vacation_mode") else ""
+    vacation_text = "有効" if user.get("daily_vacation_mode") else "無効"
     return f"""<!doctype html>
 <html lang="ja">
   <head>
     <meta charset="utf-8" />
     <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <title>今日の練習</title>
+    <title>練習メニュー</title>
     <style>
       body {{
         font-family: Georgia, "Times New Roman", serif;
@@ -4419,7 +5323,7 @@ def render_daily(username, user, state, result=None, finished=False, streak=None
         padding: 32px;
       }}
       .wrap {{
-        max-width: 760px;
+        max-width: 880px;
         margin: 0 auto;
       }}
       .topline {{
@@ -4434,7 +5338,7 @@ def render_daily(username, user, state, result=None, finished=False, streak=None
         flex-wrap: wrap;
         gap: 12px;
       }}
-      .nav a, .logout, .next {{
+      .nav a, .logout {{
         color: #8fa68e;
         font-size: 13px;
         font-weight: 600;
@@ -4448,177 +5352,72 @@ def render_daily(username, user, state, result=None, finished=False, streak=None
         font-size: 13px;
         text-align: right;
       }}
-      .card {{
+      h1 {{
+        margin: 0 0 18px;
+        font-size: 28px;
+      }}
+      .daily-panel, .game {{
         background: #fffef9;
         border: 1px solid #e8e0d4;
         border-radius: 12px;
         box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
-        padding: 28px;
+        color: inherit;
+        padding: 22px;
       }}
-      .progress, .kicker, .prompt, .meta, .translation {{
-        color: #6b635c;
-        font-size: 14px;
-        margin-bottom: 10px;
+      .daily-panel {{
+        margin-bottom: 16px;
       }}
-      .kicker {{
-        color: #8fa68e;
-        font-weight: 700;
+      .daily-header {{
+        display: flex;
+        justify-content: space-between;
+        gap: 16px;
+        align-items: center;
+        margin-bottom: 14px;
       }}
-      .word, .sentence {{
-        font-size: 34px;
-        font-weight: 600;
-        line-height: 1.3;
-        margin-bottom: 12px;
+      .daily-header h2, .game h2 {{
+        margin: 0 0 8px;
+        font-size: 20px;
       }}
-      .sentence {{
-        font-size: 28px;
+      .daily-stats, .game p {{
+        color: #6b635c;
+        font-size: 14px;
+        line-height: 1.5;
+        margin: 0;
       }}
-      .new-badge {{
-        background: #c4706a;
-        border-radius: 999px;
-        color: #fff;
-        display: inline-block;
-        font-size: 11px;
-        margin-left: 8px;
-        padding: 3px 7px;
-        vertical-align: middle;
+      .daily-actions {{
+        display: grid;
+        grid-template-columns: 1fr auto;
+        gap: 12px;
+        align-items: end;
       }}
-      .answer-form {{
+      .settings {{
         display: flex;
+        flex-wrap: wrap;
+        gap: 12px;
         align-items: center;
-        gap: 10px;
-        margin-top: 18px;
       }}
-      .pronoun-inline {{
-        font-size: 18px;
-        font-weight: 600;
+      .settings label {{
+        color: #6b635c;
+        font-size: 13px;
       }}
-      input {{
-        flex: 1;
-        min-width: 0;
-        padding: 12px 14px;
-        font-size: 16px;
-        border: 2px solid #d8d0c4;
+      .settings input[type="number"] {{
+        width: 72px;
+        padding: 8px 10px;
+        border: 1px solid #d8d0c4;
         border-radius: 8px;
         background: #fffef9;
       }}
-      input:focus {{
-        border-color: #8fa68e;
-        outline: none;
-      }}
-      button, .next {{
+      .settings button, .start-daily {{
         background: #8fa68e;
-        color: #fff;
         border: 0;
         border-radius: 10px;
+        color: #fff;
         cursor: pointer;
-        display: inline-block;
-        font-size: 16px;
-        padding: 12px 18px;
-        text-align: center;
-      }}
-      .options {{
-        display: grid;
-        gap: 10px;
-        margin-top: 18px;
-      }}
-      .result {{
-        border-radius: 10px;
-        font-size: 14px;
-        margin-bottom: 18px;
-        padding: 12px 14px;
-      }}
-      .ok {{
-        background: #e9f1e8;
-        color: #557a53;
-      }}
-      .bad {{
-        background: #f7e7e4;
-        color: #9b4d48;
-      }}
-      .complete h1 {{
-        margin-top: 0;
-      }}
-      @media (max-width: 640px) {{
-        body {{
-          padding: 20px;
-        }}
-        .topline, .answer-form {{
-          align-items: stretch;
-          flex-direction: column;
-        }}
-        .user-status {{
-          text-align: left;
-        }}
-        .word, .sentence {{
-          font-size: 26px;
-        }}
-      }}
-    </style>
-  </head>
-  <body>
-    <main class="wrap">
-      {nav_html}
-      <section class="card">
-        <div class="progress">{progress}</div>
-        {result_html}
-        {card_html}
-      </section>
-    </main>
-  </body>
-</html>"""
-
-
-def render_menu(username, user):
-    nav_html = render_nav(username, user, "メニュー")
-    return f"""<!doctype html>
-<html lang="ja">
-  <head>
-    <meta charset="utf-8" />
-    <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <title>練習メニュー</title>
-    <style>
-      body {{
-        font-family: Georgia, "Times New Roman", serif;
-        background: #f5f0e6;
-        color: #3d3630;
-        margin: 0;
-        padding: 32px;
-      }}
-      .wrap {{
-        max-width: 880px;
-        margin: 0 auto;
-      }}
-      .topline {{
-        display: flex;
-        justify-content: space-between;
-        gap: 16px;
-        align-items: center;
-        margin-bottom: 20px;
-      }}
-      .nav {{
-        display: flex;
-        flex-wrap: wrap;
-        gap: 12px;
-      }}
-      .nav a, .logout {{
-        color: #8fa68e;
-        font-size: 13px;
+        font-size: 15px;
         font-weight: 600;
+        padding: 11px 16px;
         text-decoration: none;
       }}
-      .nav a.active {{
-        color: #4a4239;
-      }}
-      .user-status {{
-        color: #7a7065;
-        font-size: 13px;
-        text-align: right;
-      }}
-      h1 {{
-        margin: 0 0 18px;
-        font-size: 28px;
-      }}
       .games {{
         display: grid;
         grid-template-columns: repeat(auto-fit, minmax(240px, 1fr));
@@ -4626,32 +5425,19 @@ def render_menu(username, user):
       }}
       .game {{
         display: block;
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 12px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
-        color: inherit;
-        padding: 22px;
         text-decoration: none;
       }}
-      .game h2 {{
-        margin: 0 0 8px;
-        font-size: 20px;
-      }}
-      .game p {{
-        margin: 0;
-        color: #6b635c;
-        font-size: 14px;
-        line-height: 1.5;
-      }}
       @media (max-width: 640px) {{
         body {{
           padding: 20px;
         }}
-        .topline {{
+        .topline, .daily-header {{
           align-items: flex-start;
           flex-direction: column;
         }}
+        .daily-actions {{
+          grid-template-columns: 1fr;
+        }}
         .user-status {{
           text-align: left;
         }}
@@ -4662,6 +5448,37 @@ def render_menu(username, user):
     <main class="wrap">
       {nav_html}
       <h1>練習メニュー</h1>
+      <section class="daily-panel">
+        <div class="daily-header">
+          <div>
+            <h2>今日の練習</h2>
+            <p class="daily-stats">連続記録: {daily_streak}日 · {daily_target}問 · 休暇モード: {vacation_text}</p>
+          </div>
+          <a class="start-daily" href="/daily">開始</a>
+        </div>
+        <form method="post" action="/daily/settings" class="settings">
+          <label>
+            問題数
+            <input type="number" name="daily_target" min="3" max="100" value="{daily_target}" />
+          </label>
+          <label>
+            学習する言語
+            <select name="study_language">{language_options}</select>
+          </label>
+          <label>
+            学習する言語
+            <select name="study_language">{language_options}</select>
+          </label>
+          <label>
+            <select name="study_language">{language_options}</select>
+          </label>
+          <label>
+            <input type="checkbox" name="daily_vacation_mode" value="1" {vacation_checked} />
+            休暇モード
+          </label>
+          <button type="submit">保存</button>
+        </form>
+      </section>
       <section class="games">
         <a class="game" href="/verbs">
           <h2>動詞練習</h2>
@@ -4681,18 +5498,95 @@ def render_menu(username, user):
 </html>"""
 
 
+MENU_PAGE_TEMPLATE = PageTemplate("""<!doctype html>
+<html lang="ja">
+  <head>
+    <meta charset="utf-8" />
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <title>練習メニュー</title>
+    <link rel="stylesheet" href="{{stylesheet}}" />
+  </head>
+  <body>
+    <main class="wrap">
+      {{nav_html}}
+      <h1>練習メニュー</h1>
+      <section class="daily-panel">
+        <div>
+          <h2>今日の練習</h2>
+          <p class="daily-stats">{{daily_text}}</p>
+          <p class="daily-stats">連続記録: {{daily_streak}}日</p>
+        </div>
+        {{daily_action}}
+      </section>
+      <section class="games">
+        {{verb_card}}
+        <a class="game" href="/flashcards">
+          <h2>単語カード</h2>
+          <p>{{flashcard_description}}</p>
+        </a>
+        <a class="game" href="/cloze">
+          <h2>穴埋め</h2>
+          <p>{{cloze_description}}</p>
+        </a>
+      </section>
+    </main>
+  </body>
+</html>""",
+    stylesheet=asset_url("css/menu.css"),
+)
+
+
 def render_menu(username, user):
     nav_html = render_nav(username, user, "メニュー")
-    daily_target = int(user.get("daily_target", DEFAULT_DAILY_TARGET))
+    progress = daily_progress(username, user)
     daily_streak = int(user.get("daily_streak", 0))
+    daily_target = int(user.get("daily_target", DEFAULT_DAILY_TARGET))
+    language_info = STUDY_LANGUAGES[study_language(user)]
+    verb_card = (
+        f'''<a class="game" href="/verbs">
+          <h2>動詞練習</h2>
+          <p>{escape(language_info["short"])}の動詞活用を入力して練習します。</p>
+        </a>'''
+        if language_info.get("verb_enabled")
+        else ""
+    )
+
+    if progress["status"] == "completed":
+        daily_text = "今日の練習は完了しました。次の日まで待ってください。"
+        daily_action = '<span class="start-daily disabled">完了</span>'
+    elif progress["status"] == "in_progress":
+        daily_text = f'途中です: {progress["done"]}/{progress["total"]}問完了'
+        daily_action = '<a class="start-daily" href="/daily">続ける</a>'
+    else:
+        daily_text = f'今日の練習を始めましょう: {daily_target}問'
+        daily_action = '<a class="start-daily" href="/daily">開始</a>'
+
+    return MENU_PAGE_TEMPLATE.render(
+        nav_html=nav_html,
+        daily_text=daily_text,
+        daily_streak=daily_streak,
+        daily_action=daily_action,
+        verb_card=verb_card,
+        flashcard_description=escape(language_info["flashcard_description"]),
+        cloze_description=escape(language_info["cloze_description"]),
+    )
+
+
+def render_settings(username, user):
+    nav_html = render_nav(username, user, "設定")
+    daily_target = int(user.get("daily_target", DEFAULT_DAILY_TARGET))
     vacation_checked = "checked" if user.get("daily_vacation_mode") else ""
-    vacation_text = "有効" if user.get("daily_vacation_mode") else "無効"
+    current_language = study_language(user)
+    language_options = "".join(
+        f'<option value="{escape(key)}" {"selected" if key == current_language else ""}>{escape(info["label"])}</option>'
+        for key, info in STUDY_LANGUAGES.items()
+    )
     return f"""<!doctype html>
 <html lang="ja">
   <head>
     <meta charset="utf-8" />
     <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <title>練習メニュー</title>
+    <title>設定</title>
     <style>
       body {{
         font-family: Georgia, "Times New Roman", serif;
@@ -4702,7 +5596,7 @@ def render_menu(username, user):
         padding: 32px;
       }}
       .wrap {{
-        max-width: 880px;
+        max-width: 720px;
         margin: 0 auto;
       }}
       .topline {{
@@ -4731,62 +5625,34 @@ def render_menu(username, user):
         font-size: 13px;
         text-align: right;
       }}
-      h1 {{
-        margin: 0 0 18px;
-        font-size: 28px;
-      }}
-      .daily-panel, .game {{
+      .card {{
         background: #fffef9;
         border: 1px solid #e8e0d4;
         border-radius: 12px;
         box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
-        color: inherit;
-        padding: 22px;
+        padding: 24px;
       }}
-      .daily-panel {{
-        margin-bottom: 16px;
-      }}
-      .daily-header {{
-        display: flex;
-        justify-content: space-between;
-        gap: 16px;
-        align-items: center;
-        margin-bottom: 14px;
-      }}
-      .daily-header h2, .game h2 {{
-        margin: 0 0 8px;
-        font-size: 20px;
+      h1 {{
+        margin: 0 0 18px;
+        font-size: 28px;
       }}
-      .daily-stats, .game p {{
+      label {{
+        display: block;
         color: #6b635c;
         font-size: 14px;
-        line-height: 1.5;
-        margin: 0;
-      }}
-      .daily-actions {{
-        display: grid;
-        grid-template-columns: 1fr auto;
-        gap: 12px;
-        align-items: end;
-      }}
-      .settings {{
-        display: flex;
-        flex-wrap: wrap;
-        gap: 12px;
-        align-items: center;
-      }}
-      .settings label {{
-        color: #6b635c;
-        font-size: 13px;
+        margin: 0 0 14px;
       }}
-      .settings input[type="number"] {{
-        width: 72px;
-        padding: 8px 10px;
+      input[type="number"], select {{
+        display: block;
+        margin-top: 6px;
+        width: min(280px, 100%);
+        padding: 10px 12px;
         border: 1px solid #d8d0c4;
         border-radius: 8px;
         background: #fffef9;
+        font-size: 16px;
       }}
-      .settings button, .start-daily {{
+      button {{
         background: #8fa68e;
         border: 0;
         border-radius: 10px;
@@ -4795,28 +5661,15 @@ def render_menu(username, user):
         font-size: 15px;
         font-weight: 600;
         padding: 11px 16px;
-        text-decoration: none;
-      }}
-      .games {{
-        display: grid;
-        grid-template-columns: repeat(auto-fit, minmax(240px, 1fr));
-        gap: 16px;
-      }}
-      .game {{
-        display: block;
-        text-decoration: none;
       }}
       @media (max-width: 640px) {{
         body {{
           padding: 20px;
         }}
-        .topline, .daily-header {{
+        .topline {{
           align-items: flex-start;
           flex-direction: column;
         }}
-        .daily-actions {{
-          grid-template-columns: 1fr;
-        }}
         .user-status {{
           text-align: left;
         }}
@@ -4826,18 +5679,11 @@ def render_menu(username, user):
   <body>
     <main class="wrap">
       {nav_html}
-      <h1>練習メニュー</h1>
-      <section class="daily-panel">
-        <div class="daily-header">
-          <div>
-            <h2>今日の練習</h2>
-            <p class="daily-stats">連続記録: {daily_streak}日 · {daily_target}問 · 休暇モード: {vacation_text}</p>
-          </div>
-          <a class="start-daily" href="/daily">開始</a>
-        </div>
-        <form method="post" action="/daily/settings" class="settings">
+      <section class="card">
+        <h1>設定</h1>
+        <form method="post" action="/settings">
           <label>
-            問題数
+            今日の練習の問題数
             <input type="number" name="daily_target" min="3" max="100" value="{daily_target}" />
           </label>
           <label>
@@ -4845,10 +5691,59 @@ def render_menu(username, user):
             <select name="study_language">{language_options}</select>
           </label>
           <label>
-            学習する言語
-            <select name="study_language">{language_options}</select>
+            <input type="checkbox" name="daily_vacation_mode" value="1" {vacation_checked} />
+            休暇モード
+          </label>
+          <button type="submit">保存</button>
+        </form>
+      </section>
+    </main>
+  </body>
+</html>"""
+
+
+def load_content_sources():
+    init_db()
+    with get_db() as conn:
+        rows = conn.execute(
+            """
+            SELECT name, url, license_name, license_url, attribution
+            FROM content_sources
+            ORDER BY name
+            """
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def render_settings(username, user):
+    nav_html = render_nav(username, user, "設定")
+    daily_target = int(user.get("daily_target", DEFAULT_DAILY_TARGET))
+    vacation_checked = "checked" if user.get("daily_vacation_mode") else ""
+    current_language = study_language(user)
+    language_options = "".join(
+        f'<option value="{escape(key)}" {"selected" if key == current_language else ""}>{escape(info["label"])}</option>'
+        for key, info in STUDY_LANGUAGES.items()
+    )
+    return f"""<!doctype html>
+<html lang="ja">
+  <head>
+    <meta charset="utf-8" />
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <title>設定</title>
+    <link rel="stylesheet" href="{asset_url("css/settings.css")}" />
+  </head>
+  <body>
+    <main class="wrap">
+      {nav_html}
+      <section class="card">
+        <h1>設定</h1>
+        <form method="post" action="/settings">
+          <label>
+            今日の練習の問題数
+            <input type="number" name="daily_target" min="3" max="100" value="{daily_target}" />
           </label>
           <label>
+            学習する言語
             <select name="study_language">{language_options}</select>
           </label>
           <label>
@@ -4857,929 +5752,551 @@ def render_menu(username, user):
           </label>
           <button type="submit">保存</button>
         </form>
+        <div class="setting-links">
+          <a class="plain-link" href="/licenses">データとライセンス</a>
+        </div>
       </section>
-      <section class="games">
-        <a class="game" href="/verbs">
-          <h2>動詞練習</h2>
-          <p>イタリア語の動詞活用を入力して練習します。</p>
-        </a>
-        <a class="game" href="/flashcards">
-          <h2>単語カード</h2>
-          <p>イタリア語の単語を見て、日本語の意味を選びます。</p>
-        </a>
-        <a class="game" href="/cloze">
-          <h2>穴埋め</h2>
-          <p>イタリア語の文の空欄に入る単語を入力します。下に日本語訳が表示されます。</p>
-        </a>
+    </main>
+  </body>
+</html>"""
+
+
+def render_licenses(username, user):
+    nav_html = render_nav(username, user, "設定")
+    source_items = []
+    for source in load_content_sources():
+        source_items.append(
+            '<div class="source-item">'
+            f'<h2>{escape(source["name"])}</h2>'
+            f'<p>{escape(source["attribution"])}</p>'
+            f'<p><a href="{escape(source["url"])}">{escape(source["url"])}</a></p>'
+            f'<p>License: <a href="{escape(source["license_url"])}">{escape(source["license_name"])}</a></p>'
+            '</div>'
+        )
+    sources_html = "".join(source_items) or '<p class="muted">No external data sources registered.</p>'
+    return f"""<!doctype html>
+<html lang="ja">
+  <head>
+    <meta charset="utf-8" />
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <title>データとライセンス</title>
+    <link rel="stylesheet" href="{asset_url("css/licenses.css")}" />
+  </head>
+  <body>
+    <main class="wrap">
+      {nav_html}
+      <section class="card">
+        <h1>データとライセンス</h1>
+        {sources_html}
       </section>
     </main>
   </body>
 </html>"""
 
 
-def render_menu(username, user):
-    nav_html = render_nav(username, user, "メニュー")
-    progress = daily_progress(username, user)
-    daily_streak = int(user.get("daily_streak", 0))
-    daily_target = int(user.get("daily_target", DEFAULT_DAILY_TARGET))
-    language_info = STUDY_LANGUAGES[study_language(user)]
-    verb_card = (
-        f'''<a class="game" href="/verbs">
-          <h2>動詞練習</h2>
-          <p>{escape(language_info["short"])}の動詞活用を入力して練習します。</p>
-        </a>'''
-        if language_info.get("verb_enabled")
-        else ""
+FLASHCARD_PAGE_TEMPLATE = PageTemplate("""<!doctype html>
+<html lang="ja">
+  <head>
+    <meta charset="utf-8" />
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <title>単語カード</title>
+    <link rel="stylesheet" href="{{stylesheet}}" />
+  </head>
+  <body>
+    <main class="wrap">
+      {{nav_html}}
+      <section class="card">
+        {{result_html}}
+        <div class="prompt">この単語の意味は？</div>
+        <div class="word">{{word}} {{new_badge}}</div>
+        <div class="prompt">あなたのELO: {{user_elo}} / 問題ELO: {{question_elo}}</div>
+        <form method="post" action="/flashcards" class="options">
+          <input type="hidden" name="word" value="{{word}}" />
+          <input type="hidden" name="answer" value="{{translation}}" />
+          <input type="hidden" name="question_id" value="{{question_id}}" />
+          {{options_html}}
+        </form>
+      </section>
+    </main>
+  </body>
+</html>""",
+    stylesheet=asset_url("css/flashcards.css"),
+)
+
+
+def render_flashcards(username, user, card, options, result=None):
+    nav_html = render_nav(username, user, "単語カード")
+    new_badge = '<span class="new-badge">NEW</span>' if card.get("is_new") else ""
+    result_html = ""
+    if result:
+        css_class = "ok" if result["ok"] else "bad"
+        text = "正解です。" if result["ok"] else "不正解です。"
+        result_html = (
+            f'<div class="result {css_class}">{text} '
+            f'答え: {escape(result["answer"])}</div>'
+        )
+    option_buttons = []
+    for option in options:
+        option_buttons.append(
+            f'<button type="submit" name="choice" value="{escape(option)}">'
+            f"{escape(option)}</button>"
+        )
+    return FLASHCARD_PAGE_TEMPLATE.render(
+        nav_html=nav_html,
+        result_html=result_html,
+        word=escape(card["word"]),
+        new_badge=new_badge,
+        user_elo=int(user.get("elo", DEFAULT_ELO)),
+        question_elo=int(card.get("question_elo", DEFAULT_ELO)),
+        translation=escape(card["translation"]),
+        question_id=escape(str(card.get("question_id", ""))),
+        options_html="".join(option_buttons),
     )
 
-    if progress["status"] == "completed":
-        daily_text = "今日の練習は完了しました。次の日まで待ってください。"
-        daily_action = '<span class="start-daily disabled">完了</span>'
-    elif progress["status"] == "in_progress":
-        daily_text = f'途中です: {progress["done"]}/{progress["total"]}問完了'
-        daily_action = '<a class="start-daily" href="/daily">続ける</a>'
-    else:
-        daily_text = f'今日の練習を始めましょう: {daily_target}問'
-        daily_action = '<a class="start-daily" href="/daily">開始</a>'
 
-    return f"""<!doctype html>
+CLOZE_PAGE_TEMPLATE = PageTemplate("""<!doctype html>
 <html lang="ja">
   <head>
     <meta charset="utf-8" />
     <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <title>練習メニュー</title>
-    <style>
-      body {{
-        font-family: Georgia, "Times New Roman", serif;
-        background: #f5f0e6;
-        color: #3d3630;
-        margin: 0;
-        padding: 32px;
-      }}
-      .wrap {{
-        max-width: 880px;
-        margin: 0 auto;
-      }}
-      .topline {{
-        display: flex;
-        justify-content: space-between;
-        gap: 16px;
-        align-items: center;
-        margin-bottom: 20px;
-      }}
-      .nav {{
-        display: flex;
-        flex-wrap: wrap;
-        gap: 12px;
-      }}
-      .nav a, .logout {{
-        color: #8fa68e;
-        font-size: 13px;
-        font-weight: 600;
-        text-decoration: none;
-      }}
-      .nav a.active {{
-        color: #4a4239;
-      }}
-      .user-status {{
-        color: #7a7065;
-        font-size: 13px;
-        text-align: right;
-      }}
-      h1 {{
-        margin: 0 0 18px;
-        font-size: 28px;
-      }}
-      .daily-panel, .game {{
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 12px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
-        color: inherit;
-        padding: 22px;
-      }}
-      .daily-panel {{
-        display: flex;
-        justify-content: space-between;
-        gap: 16px;
-        align-items: center;
-        margin-bottom: 16px;
-      }}
-      .daily-panel h2, .game h2 {{
-        margin: 0 0 8px;
-        font-size: 20px;
-      }}
-      .daily-stats, .game p {{
-        color: #6b635c;
-        font-size: 14px;
-        line-height: 1.5;
-        margin: 0;
-      }}
-      .start-daily {{
-        background: #8fa68e;
-        border-radius: 10px;
-        color: #fff;
-        display: inline-block;
-        font-size: 15px;
-        font-weight: 600;
-        padding: 11px 16px;
-        text-decoration: none;
-        white-space: nowrap;
-      }}
-      .start-daily.disabled {{
-        background: #b8b0a5;
-      }}
-      .games {{
-        display: grid;
-        grid-template-columns: repeat(auto-fit, minmax(240px, 1fr));
-        gap: 16px;
-      }}
-      .game {{
-        display: block;
-        text-decoration: none;
-      }}
-      @media (max-width: 640px) {{
-        body {{
-          padding: 20px;
-        }}
-        .topline, .daily-panel {{
-          align-items: flex-start;
-          flex-direction: column;
-        }}
-        .user-status {{
-          text-align: left;
-        }}
-      }}
-    </style>
-  </head>
-  <body>
-    <main class="wrap">
-      {nav_html}
-      <h1>練習メニュー</h1>
-      <section class="daily-panel">
-        <div>
-          <h2>今日の練習</h2>
-          <p class="daily-stats">{daily_text}</p>
-          <p class="daily-stats">連続記録: {daily_streak}日</p>
-        </div>
-        {daily_action}
-      </section>
-      <section class="games">
-        {verb_card}
-        <a class="game" href="/flashcards">
-          <h2>単語カード</h2>
-          <p>{escape(language_info["flashcard_description"])}</p>
-        </a>
-        <a class="game" href="/cloze">
-          <h2>穴埋め</h2>
-          <p>{escape(language_info["cloze_description"])}</p>
-        </a>
-      </section>
-    </main>
-  </body>
-</html>"""
-
-
-def render_settings(username, user):
-    nav_html = render_nav(username, user, "設定")
-    daily_target = int(user.get("daily_target", DEFAULT_DAILY_TARGET))
-    vacation_checked = "checked" if user.get("daily_vacation_mode") else ""
-    current_language = study_language(user)
-    language_options = "".join(
-        f'<option value="{escape(key)}" {"selected" if key == current_language else ""}>{escape(info["label"])}</option>'
-        for key, info in STUDY_LANGUAGES.items()
-    )
-    return f"""<!doctype html>
-<html lang="ja">
-  <head>
-    <meta charset="utf-8" />
-    <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <title>設定</title>
-    <style>
-      body {{
-        font-family: Georgia, "Times New Roman", serif;
-        background: #f5f0e6;
-        color: #3d3630;
-        margin: 0;
-        padding: 32px;
-      }}
-      .wrap {{
-        max-width: 720px;
-        margin: 0 auto;
-      }}
-      .topline {{
-        display: flex;
-        justify-content: space-between;
-        gap: 16px;
-        align-items: center;
-        margin-bottom: 20px;
-      }}
-      .nav {{
-        display: flex;
-        flex-wrap: wrap;
-        gap: 12px;
-      }}
-      .nav a, .logout {{
-        color: #8fa68e;
-        font-size: 13px;
-        font-weight: 600;
-        text-decoration: none;
-      }}
-      .nav a.active {{
-        color: #4a4239;
-      }}
-      .user-status {{
-        color: #7a7065;
-        font-size: 13px;
-        text-align: right;
-      }}
-      .card {{
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 12px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
-        padding: 24px;
-      }}
-      h1 {{
-        margin: 0 0 18px;
-        font-size: 28px;
-      }}
-      label {{
-        display: block;
-        color: #6b635c;
-        font-size: 14px;
-        margin: 0 0 14px;
-      }}
-      input[type="number"], select {{
-        display: block;
-        margin-top: 6px;
-        width: min(280px, 100%);
-        padding: 10px 12px;
-        border: 1px solid #d8d0c4;
-        border-radius: 8px;
-        background: #fffef9;
-        font-size: 16px;
-      }}
-      button {{
-        background: #8fa68e;
-        border: 0;
-        border-radius: 10px;
-        color: #fff;
-        cursor: pointer;
-        font-size: 15px;
-        font-weight: 600;
-        padding: 11px 16px;
-      }}
-      @media (max-width: 640px) {{
-        body {{
-          padding: 20px;
-        }}
-        .topline {{
-          align-items: flex-start;
-          flex-direction: column;
-        }}
-        .user-status {{
-          text-align: left;
-        }}
-      }}
-    </style>
+    <title>穴埋め</title>
+    <link rel="stylesheet" href="{{stylesheet}}" />
   </head>
   <body>
     <main class="wrap">
-      {nav_html}
+      {{nav_html}}
       <section class="card">
-        <h1>設定</h1>
-        <form method="post" action="/settings">
-          <label>
-            今日の練習の問題数
-            <input type="number" name="daily_target" min="3" max="100" value="{daily_target}" />
-          </label>
-          <label>
-            学習する言語
-            <select name="study_language">{language_options}</select>
-          </label>
-          <label>
-            <input type="checkbox" name="daily_vacation_mode" value="1" {vacation_checked} />
-            休暇モード
-          </label>
-          <button type="submit">保存</button>
+        {{result_html}}
+        <div class="sentence">{{sentence}} {{new_badge}}</div>
+        <div class="translation">{{translation}}</div>
+        <div class="elo-line">あなたのELO: {{user_elo}} / 問題ELO: {{question_elo}}</div>
+        <form method="post" action="/cloze" class="answer-form">
+          <input name="answer" type="text" autocomplete="off" autofocus />
+          <button type="submit">確認</button>
+          <input type="hidden" name="question_id" value="{{question_id}}" />
+          <input type="hidden" name="correct_answer" value="{{answer}}" />
         </form>
       </section>
     </main>
   </body>
-</html>"""
+</html>""",
+    stylesheet=asset_url("css/cloze.css"),
+)
 
 
-def load_content_sources():
-    init_db()
-    with get_db() as conn:
-        rows = conn.execute(
-            """
-            SELECT name, url, license_name, license_url, attribution
-            FROM content_sources
-            ORDER BY name
-            """
-        ).fetchall()
-    return [dict(row) for row in rows]
+def render_cloze(username, user, question, result=None):
+    nav_html = render_nav(username, user, "穴埋め")
+    new_badge = '<span class="new-badge">NEW</span>' if question.get("is_new") else ""
+    result_html = ""
+    if result:
+        css_class = "ok" if result["ok"] else "bad"
+        text = "正解です。" if result["ok"] else "不正解です。"
+        result_html = (
+            f'<div class="result {css_class}">{text} '
+            f'答え: {escape(result["answer"])}</div>'
+        )
+    return CLOZE_PAGE_TEMPLATE.render(
+        nav_html=nav_html,
+        result_html=result_html,
+        sentence=escape(question["sentence"]),
+        new_badge=new_badge,
+        translation=escape(question["translation"]),
+        user_elo=int(user.get("elo", DEFAULT_ELO)),
+        question_elo=int(question.get("question_elo", DEFAULT_ELO)),
+        question_id=escape(str(question["question_id"])),
+        answer=escape(question["answer"]),
+    )
 
 
-def render_settings(username, user):
-    nav_html = render_nav(username, user, "設定")
-    daily_target = int(user.get("daily_target", DEFAULT_DAILY_TARGET))
-    vacation_checked = "checked" if user.get("daily_vacation_mode") else ""
-    current_language = study_language(user)
-    language_options = "".join(
-        f'<option value="{escape(key)}" {"selected" if key == current_language else ""}>{escape(info["label"])}</option>'
-        for key, info in STUDY_LANGUAGES.items()
-    )
-    return f"""<!doctype html>
-<html lang="ja">
-  <head>
-    <meta charset="utf-8" />
-    <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <title>設定</title>
-    <style>
-      body {{
-        font-family: Georgia, "Times New Roman", serif;
-        background: #f5f0e6;
-        color: #3d3630;
-        margin: 0;
-        padding: 32px;
-      }}
-      .wrap {{
-        max-width: 720px;
-        margin: 0 auto;
-      }}
-      .topline {{
-        display: flex;
-        justify-content: space-between;
-        gap: 16px;
-        align-items: center;
-        margin-bottom: 20px;
-      }}
-      .nav {{
-        display: flex;
-        flex-wrap: wrap;
-        gap: 12px;
-      }}
-      .nav a, .logout, .plain-link {{
-        color: #8fa68e;
-        font-size: 13px;
-        font-weight: 600;
-        text-decoration: none;
-      }}
-      .nav a.active {{
-        color: #4a4239;
-      }}
-      .user-status {{
-        color: #7a7065;
-        font-size: 13px;
-        text-align: right;
-      }}
-      .card {{
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 12px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
-        padding: 24px;
-      }}
-      h1 {{
-        margin: 0 0 18px;
-        font-size: 28px;
-      }}
-      label {{
-        display: block;
-        color: #6b635c;
-        font-size: 14px;
-        margin: 0 0 14px;
-      }}
-      input[type="number"] {{
-        display: block;
-        margin-top: 6px;
-        width: 96px;
-        padding: 10px 12px;
-        border: 1px solid #d8d0c4;
-        border-radius: 8px;
-        background: #fffef9;
-        font-size: 16px;
-      }}
-      button {{
-        background: #8fa68e;
-        border: 0;
-        border-radius: 10px;
-        color: #fff;
-        cursor: pointer;
-        font-size: 15px;
-        font-weight: 600;
-        padding: 11px 16px;
-      }}
-      .setting-links {{
-        border-top: 1px dashed #dcd4c8;
-        margin-top: 18px;
-        padding-top: 16px;
-      }}
-      @media (max-width: 640px) {{
-        body {{
-          padding: 20px;
-        }}
-        .topline {{
-          align-items: flex-start;
-          flex-direction: column;
-        }}
-        .user-status {{
-          text-align: left;
-        }}
-      }}
-    </style>
-  </head>
-  <body>
-    <main class="wrap">
-      {nav_html}
-      <section class="card">
-        <h1>設定</h1>
-        <form method="post" action="/settings">
-          <label>
-            今日の練習の問題数
-            <input type="number" name="daily_target" min="3" max="100" value="{daily_target}" />
-          </label>
-          <label>
-            学習する言語
-            <select name="study_language">{language_options}</select>
-          </label>
-          <label>
-            <input type="checkbox" name="daily_vacation_mode" value="1" {vacation_checked} />
-            休暇モード
-          </label>
-          <button type="submit">保存</button>
-        </form>
-        <div class="setting-links">
-          <a class="plain-link" href="/licenses">データとライセンス</a>
-        </div>
-      </section>
-    </main>
-  </body>
-</html>"""
+SCRAPER_BROWSER_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/126.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Language": "it-IT,it;q=0.9,en-US;q=0.7,en;q=0.6",
+    "Cache-Control": "no-cache",
+    "Pragma": "no-cache",
+    "Upgrade-Insecure-Requests": "1",
+}
 
 
-def render_licenses(username, user):
-    nav_html = render_nav(username, user, "設定")
-    source_items = []
-    for source in load_content_sources():
-        source_items.append(
-            '<div class="source-item">'
-            f'<h2>{escape(source["name"])}</h2>'
-            f'<p>{escape(source["attribution"])}</p>'
-            f'<p><a href="{escape(source["url"])}">{escape(source["url"])}</a></p>'
-            f'<p>License: <a href="{escape(source["license_url"])}">{escape(source["license_name"])}</a></p>'
-            '</div>'
-        )
-    sources_html = "".join(source_items) or '<p class="muted">No external data sources registered.</p>'
-    return f"""<!doctype html>
-<html lang="ja">
-  <head>
-    <meta charset="utf-8" />
-    <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <title>データとライセンス</title>
-    <style>
-      body {{
-        font-family: Georgia, "Times New Roman", serif;
-        background: #f5f0e6;
-        color: #3d3630;
-        margin: 0;
-        padding: 32px;
-      }}
-      .wrap {{
-        max-width: 820px;
-        margin: 0 auto;
-      }}
-      .topline {{
-        display: flex;
-        justify-content: space-between;
-        gap: 16px;
-        align-items: center;
-        margin-bottom: 20px;
-      }}
-      .nav {{
-        display: flex;
-        flex-wrap: wrap;
-        gap: 12px;
-      }}
-      .nav a, .logout, a {{
-        color: #8fa68e;
-        font-weight: 600;
-        text-decoration: none;
-      }}
-      .nav a {{
-        font-size: 13px;
-      }}
-      .user-status {{
-        color: #7a7065;
-        font-size: 13px;
-        text-align: right;
-      }}
-      .card {{
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 12px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
-        padding: 24px;
-      }}
-      h1 {{
-        margin: 0 0 18px;
-        font-size: 28px;
-      }}
-      h2 {{
-        font-size: 18px;
-        margin: 0 0 8px;
-      }}
-      p {{
-        color: #6b635c;
-        line-height: 1.5;
-        margin: 6px 0;
-      }}
-      .source-item {{
-        border-top: 1px dashed #dcd4c8;
-        padding: 16px 0;
-      }}
-      .source-item:first-of-type {{
-        border-top: 0;
-        padding-top: 0;
-      }}
-      .muted {{
-        color: #7a7065;
-      }}
-      @media (max-width: 640px) {{
-        body {{
-          padding: 20px;
-        }}
-        .topline {{
-          align-items: flex-start;
-          flex-direction: column;
-        }}
-        .user-status {{
-          text-align: left;
-        }}
-      }}
-    </style>
-  </head>
-  <body>
-    <main class="wrap">
-      {nav_html}
-      <section class="card">
-        <h1>データとライセンス</h1>
-        {sources_html}
-      </section>
-    </main>
-  </body>
-</html>"""
+def browser_like_headers(url, referer=""):
+    headers = dict(SCRAPER_BROWSER_HEADERS)
+    if referer:
+        headers["Referer"] = referer
+    return headers
 
 
-def render_flashcards(username, user, card, options, result=None):
-    nav_html = render_nav(username, user, "単語カード")
-    new_badge = '<span class="new-badge">NEW</span>' if card.get("is_new") else ""
-    result_html = ""
-    if result:
-        css_class = "ok" if result["ok"] else "bad"
-        text = "正解です。" if result["ok"] else "不正解です。"
-        result_html = (
-            f'<div class="result {css_class}">{text} '
-            f'答え: {escape(result["answer"])}</div>'
+def scraper_cache_ttl(url):
+    for library in SCRAPER_SOURCE_LIBRARY_BY_LANGUAGE.values():
+        for _, kind, source in library:
+            prefix, templated, suffix = source.partition("{query}")
+            if url == source or (templated and url.startswith(prefix) and url.endswith(suffix)):
+                return SCRAPER_CACHE_TTL_BY_KIND.get(kind, SCRAPER_CACHE_DEFAULT_TTL_SECONDS)
+    return SCRAPER_CACHE_DEFAULT_TTL_SECONDS
+
+
+def prepare_scraper_cache():
+    cache_dir = os.path.dirname(SCRAPER_CACHE_PATH)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    conn = get_db(SCRAPER_CACHE_PATH, foreign_keys=False)
+    apply_journal_mode(conn, SCRAPER_CACHE_PATH)
+    with conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS http_cache (
+                url TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                etag TEXT NOT NULL DEFAULT '',
+                last_modified TEXT NOT NULL DEFAULT '',
+                fetched_at REAL NOT NULL
+            )
+            """
         )
-    option_buttons = []
-    for option in options:
-        option_buttons.append(
-            f'<button type="submit" name="choice" value="{escape(option)}">'
-            f"{escape(option)}</button>"
+        conn.execute(
+            "DELETE FROM http_cache WHERE fetched_at < ?",
+            (time.time() - SCRAPER_CACHE_MAX_AGE_SECONDS,),
         )
-    return f"""<!doctype html>
-<html lang="ja">
-  <head>
-    <meta charset="utf-8" />
-    <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <title>単語カード</title>
-    <style>
-      body {{
-        font-family: Georgia, "Times New Roman", serif;
-        background: #f5f0e6;
-        color: #3d3630;
-        margin: 0;
-        padding: 32px;
-      }}
-      .wrap {{
-        max-width: 760px;
-        margin: 0 auto;
-      }}
-      .topline {{
-        display: flex;
-        justify-content: space-between;
-        gap: 16px;
-        align-items: center;
-        margin-bottom: 20px;
-      }}
-      .nav {{
-        display: flex;
-        flex-wrap: wrap;
-        gap: 12px;
-      }}
-      .nav a, .logout {{
-        color: #8fa68e;
-        font-size: 13px;
-        font-weight: 600;
-        text-decoration: none;
-      }}
-      .nav a.active {{
-        color: #4a4239;
-      }}
-      .user-status {{
-        color: #7a7065;
-        font-size: 13px;
-        text-align: right;
-      }}
-      .card {{
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 12px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
-        padding: 28px;
-      }}
-      .prompt {{
-        color: #6b635c;
-        font-size: 14px;
-        margin-bottom: 8px;
-      }}
-      .word {{
-        font-size: 36px;
-        font-weight: 600;
-        margin-bottom: 22px;
-      }}
-      .new-badge {{
-        background: #c4706a;
-        border-radius: 999px;
-        color: #fff;
-        display: inline-block;
-        font-size: 11px;
-        margin-left: 8px;
-        padding: 3px 7px;
-        vertical-align: middle;
-      }}
-      .options {{
-        display: grid;
-        gap: 10px;
-      }}
-      button, .next {{
-        background: #8fa68e;
-        color: #fff;
-        border: 0;
-        border-radius: 10px;
-        cursor: pointer;
-        display: block;
-        font-size: 16px;
-        padding: 13px 16px;
-        text-align: center;
-        text-decoration: none;
-      }}
-      .result {{
-        border-radius: 10px;
-        font-size: 14px;
-        margin-bottom: 18px;
-        padding: 12px 14px;
-      }}
-      .ok {{
-        background: #e9f1e8;
-        color: #557a53;
-      }}
-      .bad {{
-        background: #f7e7e4;
-        color: #9b4d48;
-      }}
-      @media (max-width: 640px) {{
-        body {{
-          padding: 20px;
-        }}
-        .topline {{
-          align-items: flex-start;
-          flex-direction: column;
-        }}
-        .user-status {{
-          text-align: left;
-        }}
-        .word {{
-          font-size: 30px;
-        }}
-      }}
-    </style>
-  </head>
-  <body>
-    <main class="wrap">
-      {nav_html}
-      <section class="card">
-        {result_html}
-        <div class="prompt">この単語の意味は？</div>
-        <div class="word">{escape(card["word"])} {new_badge}</div>
-        <div class="prompt">あなたのELO: {int(user.get("elo", DEFAULT_ELO))} / 問題ELO: {int(card.get("question_elo", DEFAULT_ELO))}</div>
-        <form method="post" action="/flashcards" class="options">
-          <input type="hidden" name="word" value="{escape(card["word"])}" />
-          <input type="hidden" name="answer" value="{escape(card["translation"])}" />
-          <input type="hidden" name="question_id" value="{escape(str(card.get("question_id", "")))}" />
-          {"".join(option_buttons)}
-        </form>
-      </section>
-    </main>
-  </body>
-</html>"""
+    try:
+        conn.executescript(SCRAPER_CORPUS_SQL)
+        SCRAPER_CACHE_STATE["corpus"] = True
+    except sqlite3.OperationalError as exc:
+        LOGGER.warning("Sentence corpus index disabled: %s", exc)
+        SCRAPER_CACHE_STATE["corpus"] = False
+    SCRAPER_CACHE_STATE["ready"] = True
 
 
-def render_cloze(username, user, question, result=None):
-    nav_html = render_nav(username, user, "穴埋め")
-    new_badge = '<span class="new-badge">NEW</span>' if question.get("is_new") else ""
-    result_html = ""
-    if result:
-        css_class = "ok" if result["ok"] else "bad"
-        text = "正解です。" if result["ok"] else "不正解です。"
-        result_html = (
-            f'<div class="result {css_class}">{text} '
-            f'答え: {escape(result["answer"])}</div>'
-        )
-    return f"""<!doctype html>
-<html lang="ja">
-  <head>
-    <meta charset="utf-8" />
-    <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <title>穴埋め</title>
-    <style>
-      body {{
-        font-family: Georgia, "Times New Roman", serif;
-        background: #f5f0e6;
-        color: #3d3630;
-        margin: 0;
-        padding: 32px;
-      }}
-      .wrap {{
-        max-width: 760px;
-        margin: 0 auto;
-      }}
-      .topline {{
-        display: flex;
-        justify-content: space-between;
-        gap: 16px;
-        align-items: center;
-        margin-bottom: 20px;
-      }}
-      .nav {{
-        display: flex;
-        flex-wrap: wrap;
-        gap: 12px;
-      }}
-      .nav a, .logout {{
-        color: #8fa68e;
-        font-size: 13px;
-        font-weight: 600;
-        text-decoration: none;
-      }}
-      .nav a.active {{
-        color: #4a4239;
-      }}
-      .user-status {{
-        color: #7a7065;
-        font-size: 13px;
-        text-align: right;
-      }}
-      .card {{
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 12px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
-        padding: 28px;
-      }}
-      .sentence {{
-        font-size: 30px;
-        font-weight: 600;
-        line-height: 1.35;
-        margin-bottom: 14px;
-      }}
-      .new-badge {{
-        background: #c4706a;
-        border-radius: 999px;
-        color: #fff;
-        display: inline-block;
-        font-size: 11px;
-        margin-left: 8px;
-        padding: 3px 7px;
-        vertical-align: middle;
-      }}
-      .translation, .elo-line {{
-        color: #6b635c;
-        font-size: 14px;
-        margin-bottom: 16px;
-      }}
-      .answer-form {{
-        display: flex;
-        gap: 10px;
-      }}
-      input {{
-        flex: 1;
-        min-width: 0;
-        padding: 12px 14px;
-        font-size: 16px;
-        border: 2px solid #d8d0c4;
-        border-radius: 8px;
-        background: #fffef9;
-      }}
-      input:focus {{
-        border-color: #8fa68e;
-        outline: none;
-      }}
-      button {{
-        background: #8fa68e;
-        color: #fff;
-        border: 0;
-        border-radius: 10px;
-        cursor: pointer;
-        font-size: 16px;
-        padding: 12px 18px;
-      }}
-      .result {{
-        border-radius: 10px;
-        font-size: 14px;
-        margin-bottom: 18px;
-        padding: 12px 14px;
-      }}
-      .ok {{
-        background: #e9f1e8;
-        color: #557a53;
-      }}
-      .bad {{
-        background: #f7e7e4;
-        color: #9b4d48;
-      }}
-      @media (max-width: 640px) {{
-        body {{
-          padding: 20px;
-        }}
-        .topline, .answer-form {{
-          align-items: stretch;
-          flex-direction: column;
-        }}
-        .user-status {{
-          text-align: left;
-        }}
-        .sentence {{
-          font-size: 24px;
-        }}
-      }}
-    </style>
-  </head>
-  <body>
-    <main class="wrap">
-      {nav_html}
-      <section class="card">
-        {result_html}
-        <div class="sentence">{escape(question["sentence"])} {new_badge}</div>
-        <div class="translation">{escape(question["translation"])}</div>
-        <div class="elo-line">あなたのELO: {int(user.get("elo", DEFAULT_ELO))} / 問題ELO: {int(question.get("question_elo", DEFAULT_ELO))}</div>
-        <form method="post" action="/cloze" class="answer-form">
-          <input name="answer" type="text" autocomplete="off" autofocus />
-          <button type="submit">確認</button>
-          <input type="hidden" name="question_id" value="{escape(str(question["question_id"]))}" />
-          <input type="hidden" name="correct_answer" value="{escape(question["answer"])}" />
-        </form>
-      </section>
-    </main>
-  </body>
-</html>"""
+def scraper_cache_db():
+    # Scraper pool threads all reach this on the first run; one of them
+    # creates the tables while the rest wait.
+    if not SCRAPER_CACHE_STATE["ready"]:
+        with SCRAPER_CACHE_INIT_LOCK:
+            if not SCRAPER_CACHE_STATE["ready"]:
+                prepare_scraper_cache()
+    return get_db(SCRAPER_CACHE_PATH, foreign_keys=False)
 
 
-SCRAPER_BROWSER_HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/126.0.0.0 Safari/537.36"
-    ),
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-    "Accept-Language": "it-IT,it;q=0.9,en-US;q=0.7,en;q=0.6",
-    "Cache-Control": "no-cache",
-    "Pragma": "no-cache",
-    "Upgrade-Insecure-Requests": "1",
-}
+@process_cache("scraper_cache")
+def reset_scraper_cache_state():
+    SCRAPER_CACHE_STATE["ready"] = False
 
 
-def browser_like_headers(url, referer=""):
-    headers = dict(SCRAPER_BROWSER_HEADERS)
-    if referer:
-        headers["Referer"] = referer
-    return headers
+def count_scraper_cache(outcome):
+    with SCRAPER_CACHE_LOCK:
+        SCRAPER_CACHE_STATS[outcome] += 1
+
+
+def scraper_cache_stats():
+    with SCRAPER_CACHE_LOCK:
+        return dict(SCRAPER_CACHE_STATS)
+
+
+def cached_scraper_response(url):
+    try:
+        return scraper_cache_db().execute(
+            "SELECT body, etag, last_modified, fetched_at FROM http_cache WHERE url = ?",
+            (url,),
+        ).fetchone()
+    except sqlite3.Error:
+        LOGGER.exception("Reading the scraper cache failed.")
+        count_scraper_cache("errors")
+        return None
+
+
+def store_scraper_response(url, body, etag, last_modified):
+    try:
+        with scraper_cache_db() as conn:
+            conn.execute(
+                """
+                INSERT INTO http_cache (url, body, etag, last_modified, fetched_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    body = excluded.body,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    fetched_at = excluded.fetched_at
+                """,
+                (url, body, etag or "", last_modified or "", time.time()),
+            )
+    except sqlite3.Error:
+        LOGGER.exception("Writing the scraper cache failed.")
+        count_scraper_cache("errors")
+
+
+def corpus_enabled():
+    try:
+        scraper_cache_db()
+    except sqlite3.Error:
+        return False
+    return SCRAPER_CACHE_STATE["corpus"]
+
+
+def corpus_match_query(terms):
+    phrases = []
+    for term in terms:
+        tokens = re.findall(r"[^\W_]+", normalize_match_text(term))
+        if tokens:
+            phrases.append('"' + " ".join(tokens) + '"')
+    return " OR ".join(phrases)
+
+
+def index_corpus_page(page, source):
+    if not corpus_enabled():
+        return
+    url = page["url"]
+    digest = page["digest"]
+    try:
+        with scraper_cache_db() as conn:
+            conn.execute("INSERT OR IGNORE INTO corpus_links (source, url) VALUES (?, ?)", (source, url))
+            row = conn.execute("SELECT digest FROM corpus_pages WHERE url = ?", (url,)).fetchone()
+            if row is not None and row["digest"] == digest:
+                return
+            conn.execute("DELETE FROM corpus_sentences WHERE url = ?", (url,))
+            conn.executemany(
+                "INSERT INTO corpus_sentences (url, sentence, translation, normalized) VALUES (?, ?, ?, ?)",
+                [
+                    (url, item["sentence"], item["translation"], normalize_match_text(item["sentence"]))
+                    for item in page["items"]
+                ],
+            )
+            conn.execute(
+                """
+                INSERT INTO corpus_pages (url, digest, indexed_at) VALUES (?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET digest = excluded.digest, indexed_at = excluded.indexed_at
+                """,
+                (url, digest, time.time()),
+            )
+    except sqlite3.Error:
+        LOGGER.exception("Indexing %s failed.", url)
+
+
+def link_corpus_url(source, url):
+    # A page another source already fetched still belongs to this source's
+    # crawl; its sentences are indexed under the url either way.
+    if not corpus_enabled():
+        return
+    try:
+        with scraper_cache_db() as conn:
+            conn.execute("INSERT OR IGNORE INTO corpus_links (source, url) VALUES (?, ?)", (source, url))
+    except sqlite3.Error:
+        LOGGER.exception("Linking %s to %s failed.", url, source)
+
+
+def mark_corpus_source(source):
+    if not corpus_enabled():
+        return
+    try:
+        with scraper_cache_db() as conn:
+            conn.execute(
+                """
+                INSERT INTO corpus_sources (source, indexed_at) VALUES (?, ?)
+                ON CONFLICT(source) DO UPDATE SET indexed_at = excluded.indexed_at
+                """,
+                (source, time.time()),
+            )
+    except sqlite3.Error:
+        LOGGER.exception("Recording the corpus crawl of %s failed.", source)
+
+
+def corpus_source_fresh(source):
+    if not corpus_enabled():
+        return False
+    try:
+        row = scraper_cache_db().execute(
+            "SELECT indexed_at FROM corpus_sources WHERE source = ?", (source,)
+        ).fetchone()
+    except sqlite3.Error:
+        return False
+    return row is not None and time.time() - row["indexed_at"] < scraper_cache_ttl(source)
+
+
+def corpus_matches(source, match_query):
+    return scraper_cache_db().execute(
+        """
+        SELECT s.url, s.sentence, s.translation, s.normalized
+        FROM corpus_fts
+        JOIN corpus_sentences s ON s.id = corpus_fts.rowid
+        JOIN corpus_links l ON l.url = s.url
+        WHERE corpus_fts MATCH ? AND l.source = ?
+        ORDER BY s.id
+        """,
+        (match_query, source),
+    ).fetchall()
+
+
+def fetch_url_text(url, opener=None, referer="", ttl=0):
+    return read_url_text(url, opener=opener, referer=referer, ttl=ttl)[0]
 
 
-def fetch_url_text(url, opener=None, referer=""):
+def text_digest(text):
+    return hashlib.sha256(text.encode("utf-8", errors="replace")).hexdigest()
+
+
+def read_url_text(url, opener=None, referer="", ttl=0, on_text=None):
+    # With a ttl the page goes through the scraper cache: fresh entries are
+    # served without a request and stale ones are revalidated. on_text sees
+    # the body as it is decoded; returning True stops reading. Returns
+    # (text, complete, digest). With on_text the body is not kept: text is
+    # None and only the first SCRAPER_CACHE_MAX_BODY_BYTES are buffered for
+    # the cache. A body cut short or over the cap is never cached.
+    cached = cached_scraper_response(url) if ttl else None
+    if cached is not None and time.time() - cached["fetched_at"] < ttl:
+        count_scraper_cache("hits")
+        if on_text is not None:
+            on_text(cached["body"])
+        return cached["body"], True, text_digest(cached["body"])
     opener = opener or build_opener(HTTPCookieProcessor(CookieJar()))
+    headers = browser_like_headers(url, referer=referer)
+    if cached is not None:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
     request = Request(
         url,
-        headers=browser_like_headers(url, referer=referer),
+        headers=headers,
     )
-    with opener.open(request, timeout=SCRAPER_TIMEOUT_SECONDS) as response:
-        content_type = response.headers.get_content_charset() or "utf-8"
-        raw = response.read(1_500_000)
-    return raw.decode(content_type, errors="replace")
+    try:
+        with opener.open(request, timeout=SCRAPER_TIMEOUT_SECONDS) as response:
+            content_type = response.headers.get_content_charset() or "utf-8"
+            decoder = codecs.getincrementaldecoder(content_type)(errors="replace")
+            etag = response.headers.get("ETag", "")
+            last_modified = response.headers.get("Last-Modified", "")
+            digest = hashlib.sha256()
+            chunks = []
+            keep = on_text is None or bool(ttl)
+            remaining = SCRAPER_MAX_PAGE_BYTES
+            stopped = False
+            while remaining > 0 and not stopped:
+                block = response.read(min(SCRAPER_READ_CHUNK_BYTES, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                text = decoder.decode(block)
+                digest.update(text.encode("utf-8", errors="replace"))
+                if on_text is not None and SCRAPER_MAX_PAGE_BYTES - remaining > SCRAPER_CACHE_MAX_BODY_BYTES:
+                    keep = False
+                    chunks = []
+                if keep:
+                    chunks.append(text)
+                stopped = (
+                    on_text is not None
+                    and bool(on_text(text))
+                    and getattr(response, "length", None) != 0
+                )
+            if not stopped:
+                text = decoder.decode(b"", final=True)
+                digest.update(text.encode("utf-8", errors="replace"))
+                if keep:
+                    chunks.append(text)
+                if on_text is not None and text:
+                    on_text(text)
+    except HTTPError as exc:
+        if exc.code != 304 or cached is None:
+            raise
+        store_scraper_response(
+            url,
+            cached["body"],
+            exc.headers.get("ETag") or cached["etag"],
+            exc.headers.get("Last-Modified") or cached["last_modified"],
+        )
+        count_scraper_cache("revalidated")
+        if on_text is not None:
+            on_text(cached["body"])
+        return cached["body"], True, text_digest(cached["body"])
+    text = "".join(chunks) if keep else None
+    if ttl and not stopped:
+        if keep:
+            store_scraper_response(url, text, etag, last_modified)
+        count_scraper_cache("misses")
+    if on_text is not None:
+        text = None
+    return text, not stopped, digest.hexdigest()
+
+
+def scraper_host_slot(url):
+    host = urlsplit(url).netloc.lower()
+    with SCRAPER_HOST_SLOTS_LOCK:
+        slot = SCRAPER_HOST_SLOTS.get(host)
+        if slot is None:
+            slot = SCRAPER_HOST_SLOTS[host] = threading.BoundedSemaphore(SCRAPER_HOST_CONCURRENCY)
+    return slot
+
+
+def load_scrape_page(url, opener=None, referer="", ttl=0, is_match=None, wanted=None, cancelled=None):
+    # Tatoeba JSON is parsed whole; HTML and feeds are parsed while they are
+    # read, and reading stops once the page holds as many matches as the
+    # search still wants or the search was cancelled.
+    started = time.perf_counter()
+    if is_tatoeba_api_url(url):
+        raw = fetch_url_text(url, opener=opener, referer=referer, ttl=ttl)
+        fetched = time.perf_counter()
+        page = parse_scrape_page(url, raw)
+        page["fetch_ms"] = (fetched - started) * 1000
+        page["parse_ms"] = (time.perf_counter() - fetched) * 1000
+        return page
+    extractor = SentenceExtractor(url, is_match=is_match)
+    parse_seconds = 0.0
+
+    def on_text(text):
+        nonlocal parse_seconds
+        feed_started = time.perf_counter()
+        extractor.feed(text)
+        parse_seconds += time.perf_counter() - feed_started
+        if cancelled is not None and cancelled.is_set():
+            return True
+        return wanted is not None and extractor.matches >= wanted()
+
+    _, complete, digest = read_url_text(url, opener=opener, referer=referer, ttl=ttl, on_text=on_text)
+    extractor.close()
+    page = extractor.page(digest, complete)
+    page["parse_ms"] = parse_seconds * 1000
+    page["fetch_ms"] = (time.perf_counter() - started) * 1000 - page["parse_ms"]
+    return page
+
+
+def fetch_scrape_page(url, opener=None, retry_forbidden=False, cancelled=None, ttl=0, is_match=None, wanted=None):
+    # Runs on a scraper pool thread: fetching and parsing happen here, report
+    # bookkeeping stays on the thread consuming iter_scrape_events. Returns
+    # (page or None, events describing skips and errors).
+    slot = scraper_host_slot(url)
+    while not slot.acquire(timeout=0.25):
+        if cancelled is not None and cancelled.is_set():
+            return None, []
+    try:
+        if cancelled is not None and cancelled.is_set():
+            return None, []
+        events = []
+        try:
+            return load_scrape_page(url, opener, "", ttl, is_match, wanted, cancelled), events
+        except HTTPError as exc:
+            if not retry_forbidden:
+                events.append({"type": "error", "message": f"{url}: HTTP {exc.code}"})
+            elif exc.code == 403:
+                root = site_root(url)
+                try:
+                    events.append({"type": "status", "message": f"Retrying {url} after opening {root}"})
+                    fetch_url_text(root, opener=opener)
+                    return load_scrape_page(url, opener, root, ttl, is_match, wanted, cancelled), events
+                except HTTPError as retry_exc:
+                    if retry_exc.code in {403, 404}:
+                        events.append({"type": "status", "message": f"Skipped {url}: HTTP {retry_exc.code}"})
+                    else:
+                        events.append({"type": "error", "message": f"{url}: HTTP {retry_exc.code}"})
+                except Exception as retry_exc:
+                    events.append({"type": "error", "message": f"{url}: {retry_exc}"})
+            elif exc.code == 404:
+                events.append({"type": "status", "message": f"Skipped {url}: HTTP 404"})
+            else:
+                events.append({"type": "error", "message": f"{url}: HTTP {exc.code}"})
+        except Exception as exc:
+            events.append({"type": "error", "message": f"{url}: {exc}"})
+        return None, events
+    finally:
+        slot.release()
 
 
 def site_root(url):
@@ -5787,137 +6304,166 @@ def site_root(url):
     return match.group(1) + "/" if match else url
 
 
-def html_to_text(raw):
-    cleaned = re.sub(r"(?is)<(script|style|noscript).*?</\1>", " ", raw)
-    cleaned = re.sub(r"(?s)<!--.*?-->", " ", cleaned)
-    cleaned = re.sub(r"(?s)<[^>]+>", " ", cleaned)
-    cleaned = unescape(cleaned)
-    return re.sub(r"\s+", " ", cleaned).strip()
-
+class SentenceExtractor(HTMLParser):
+    # Single pass over an HTML page or feed, fed in chunks: text outside
+    # script, style and noscript is split into sentence candidates on full
+    # stops, and <a href> and RSS <link> targets are collected in document
+    # order. Only the sentence being assembled is buffered; one that runs
+    # past MAX_BUFFER_CHARS is dropped since it can never be a candidate.
+    SKIPPED_TAGS = ("script", "style", "noscript")
+    MAX_CANDIDATE_CHARS = 1000
+    MAX_BUFFER_CHARS = 16 * 1024
+
+    def __init__(self, base_url, is_match=None):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.is_match = is_match
+        self.items = []
+        self.links = []
+        self.seen_links = set()
+        self.matches = 0
+        self.buffer = []
+        self.buffered = 0
+        self.skipping = None
+        self.link_text = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self.skipping = tag
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.add_link(href)
+        elif tag == "link" and not attrs:
+            self.link_text = []
+        self.add_text(" ")
+
+    def handle_endtag(self, tag):
+        if tag == self.skipping:
+            self.skipping = None
+        elif tag == "link" and self.link_text is not None:
+            self.add_link("".join(self.link_text))
+            self.link_text = None
+        self.add_text(" ")
+
+    def handle_data(self, data):
+        if self.skipping:
+            return
+        if self.link_text is not None:
+            self.link_text.append(data)
+        self.add_text(data)
 
-def extract_links(raw, base_url):
-    links = []
-    for match in re.finditer(r"(?is)<link>\s*(.*?)\s*</link>", raw):
-        links.append(urljoin(base_url, unescape(match.group(1).strip())))
-    for match in re.finditer(r'''(?is)<a\s+[^>]*href=["']([^"']+)["']''', raw):
-        links.append(urljoin(base_url, unescape(match.group(1).strip())))
-    deduped = []
-    seen = set()
-    for link in links:
-        if not link.startswith(("http://", "https://")) or link in seen:
-            continue
-        seen.add(link)
-        deduped.append(link)
-    return deduped[:SCRAPER_MAX_SOURCE_LINKS]
+    def handle_comment(self, data):
+        self.add_text(" ")
 
+    def unknown_decl(self, data):
+        # Feeds wrap item bodies in CDATA; keep their text, drop the markup.
+        if data.startswith("CDATA["):
+            self.handle_data(unescape(re.sub(r"(?s)<[^>]+>", " ", data[6:])))
 
-def sentence_candidates(text, min_chars=0, max_chars=320):
-    # Intentionally simple first pass: keep spans between full stops.
-    return [
-        part.strip()
-        for part in text.split(".")
-        if part.strip() and min_chars <= len(part.strip()) <= max_chars
-    ]
+    def add_link(self, href):
+        link = urljoin(self.base_url, href.strip())
+        if not link.startswith(("http://", "https://")) or link in self.seen_links:
+            return
+        self.seen_links.add(link)
+        if len(self.links) < SCRAPER_MAX_SOURCE_LINKS:
+            self.links.append(link)
+
+    def add_text(self, data):
+        parts = data.split(".")
+        for part in parts[:-1]:
+            self.buffer_text(part)
+            self.end_sentence()
+        self.buffer_text(parts[-1])
+
+    def buffer_text(self, text):
+        if self.buffered <= self.MAX_BUFFER_CHARS:
+            self.buffer.append(text)
+            self.buffered += len(text)
+
+    def end_sentence(self):
+        overflowed = self.buffered > self.MAX_BUFFER_CHARS
+        sentence = " ".join("".join(self.buffer).split())
+        self.buffer = []
+        self.buffered = 0
+        if overflowed or not sentence or len(sentence) > self.MAX_CANDIDATE_CHARS:
+            return
+        item = {"sentence": sentence, "translation": ""}
+        if self.is_match is not None:
+            item["match"] = self.is_match(sentence)
+            self.matches += item["match"]
+        self.items.append(item)
 
+    def close(self):
+        super().close()
+        self.end_sentence()
 
-def content_sentence_items(raw, url, min_chars=0, max_chars=320):
-    stripped = raw.lstrip()
-    if is_tatoeba_api_url(url) and stripped.startswith("{"):
-        try:
-            data = json.loads(stripped)
-        except json.JSONDecodeError:
-            return [
-                {"sentence": sentence, "translation": ""}
-                for sentence in sentence_candidates(html_to_text(raw), min_chars=min_chars, max_chars=max_chars)
-            ]
-        items = []
-        for row in data.get("data", []):
-            text = str(row.get("text", "")).strip()
-            if min_chars <= len(text) <= max_chars:
-                translations = []
-                raw_translations = row.get("translations", [])
-                if raw_translations and isinstance(raw_translations[0], list):
-                    translation_groups = raw_translations
-                else:
-                    translation_groups = [raw_translations]
-                for group in translation_groups:
-                    for translation in group or []:
-                        if translation.get("lang") == "jpn" and translation.get("text"):
-                            translations.append(str(translation["text"]).strip())
-                items.append(
-                    {
-                        "sentence": text.rstrip("."),
-                        "translation": translations[0] if translations else "",
-                    }
-                )
-        return items
-    return [
-        {"sentence": sentence, "translation": ""}
-        for sentence in sentence_candidates(html_to_text(raw), min_chars=min_chars, max_chars=max_chars)
-    ]
+    def page(self, digest, complete=True):
+        return {
+            "url": self.base_url,
+            "digest": digest,
+            "items": self.items,
+            "candidates": len(self.items),
+            "links": self.links,
+            "next_url": "",
+            "complete": complete,
+        }
 
 
 def is_tatoeba_api_url(url):
     return "api.tatoeba.org/" in url and "/v1/sentences" in url
 
 
-def tatoeba_next_url(raw):
-    if not raw.lstrip().startswith("{"):
-        return ""
+def tatoeba_page(url, raw):
+    # One json.loads per response: the sentences, the candidate count and the
+    # next page URL all come from the same parsed object.
     try:
-        data = json.loads(raw.lstrip())
+        data = json.loads(raw)
     except json.JSONDecodeError:
-        return ""
+        return None
+    rows = data.get("data", [])
+    items = []
+    for row in rows:
+        text = str(row.get("text", "")).strip()
+        if len(text) > SentenceExtractor.MAX_CANDIDATE_CHARS:
+            continue
+        translations = []
+        raw_translations = row.get("translations", [])
+        if raw_translations and isinstance(raw_translations[0], list):
+            translation_groups = raw_translations
+        else:
+            translation_groups = [raw_translations]
+        for group in translation_groups:
+            for translation in group or []:
+                if translation.get("lang") == "jpn" and translation.get("text"):
+                    translations.append(str(translation["text"]).strip())
+        items.append(
+            {
+                "sentence": text.rstrip("."),
+                "translation": translations[0] if translations else "",
+            }
+        )
     paging = data.get("paging", {}) or {}
-    return paging.get("next") or ""
-
-
-def content_sentence_count(raw, url):
-    stripped = raw.lstrip()
-    if is_tatoeba_api_url(url) and stripped.startswith("{"):
-        try:
-            data = json.loads(stripped)
-        except json.JSONDecodeError:
-            return len(sentence_candidates(html_to_text(raw), min_chars=0, max_chars=1000))
-        return len(data.get("data", []))
-    return len(sentence_candidates(html_to_text(raw), min_chars=0, max_chars=1000))
+    return {
+        "url": url,
+        "digest": text_digest(raw),
+        "items": items,
+        "candidates": len(rows),
+        "links": [],
+        "next_url": paging.get("next") or "",
+        "complete": True,
+    }
 
 
-def normalized_span_match(text, terms):
-    def span_normalize(value):
-        normalized = value.casefold()
-        normalized = re.sub(r"([aeiou])['`Â´]", r"\1", normalized)
-        normalized = unicodedata.normalize("NFD", normalized)
-        normalized = "".join(char for char in normalized if unicodedata.category(char) != "Mn")
-        normalized = normalized.replace("'", "").replace("`", "").replace("Â´", "")
-        return normalized
-
-    normalized_text = span_normalize(text)
-    best = None
-    for term in sorted((term for term in terms if term.strip()), key=len, reverse=True):
-        normalized_term = span_normalize(term.strip())
-        if not normalized_term:
-            continue
-        index = normalized_text.find(normalized_term)
-        if index != -1:
-            best = (index, index + len(normalized_term))
-            break
-    if best is None:
-        return ""
-    cursor = 0
-    start = None
-    end = None
-    for index, char in enumerate(text):
-        next_cursor = cursor + len(span_normalize(char))
-        if start is None and next_cursor > best[0]:
-            start = index
-        if start is not None and next_cursor >= best[1]:
-            end = index + 1
-            break
-        cursor = next_cursor
-    if start is None or end is None:
-        return ""
-    return text[start:end].strip()
+def parse_scrape_page(url, raw):
+    if is_tatoeba_api_url(url) and raw.lstrip().startswith("{"):
+        page = tatoeba_page(url, raw)
+        if page is not None:
+            return page
+    extractor = SentenceExtractor(url)
+    extractor.feed(raw)
+    extractor.close()
+    return extractor.page(text_digest(raw))
 
 
 def normalize_match_text(value):
@@ -5929,6 +6475,80 @@ def normalize_match_text(value):
     return text
 
 
+MATCH_FOLD_CACHE = {}
+
+
+def fold_match_char(char):
+    # Per-character form of normalize_match_text: casefolding and NFD both
+    # work character by character, so folding a text one character at a
+    # time gives the same string while keeping track of where each piece
+    # came from.
+    folded = MATCH_FOLD_CACHE.get(char)
+    if folded is None:
+        folded = "".join(
+            part
+            for part in unicodedata.normalize("NFD", char.casefold())
+            if unicodedata.category(part) != "Mn" and part not in "'`´"
+        )
+        MATCH_FOLD_CACHE[char] = folded
+    return folded
+
+
+def fold_with_offsets(text):
+    parts = []
+    offsets = []
+    for index, char in enumerate(text):
+        folded = fold_match_char(char)
+        if folded:
+            parts.append(folded)
+            offsets.extend([index] * len(folded))
+    return "".join(parts), offsets
+
+
+class TermMatcher:
+    # Search terms are normalized and compiled into one pattern up front;
+    # span() folds the text once and maps the match back to the original
+    # characters through the offset list. The lookahead finds the longest
+    # term starting at every position, and the longest match overall wins,
+    # earliest first.
+    def __init__(self, terms):
+        folded = []
+        for term in terms:
+            value = normalize_match_text(term)
+            if value and value not in folded:
+                folded.append(value)
+        self.terms = sorted(folded, key=len, reverse=True)
+        self.pattern = None
+        if self.terms:
+            self.pattern = re.compile("(?=(" + "|".join(re.escape(term) for term in self.terms) + "))")
+
+    def span(self, text):
+        if self.pattern is None:
+            return None
+        normalized, offsets = fold_with_offsets(text)
+        longest = len(self.terms[0])
+        best = None
+        for match in self.pattern.finditer(normalized):
+            length = len(match.group(1))
+            if best is None or length > best[1] - best[0]:
+                best = (match.start(), match.start() + length)
+                if length == longest:
+                    break
+        if best is None:
+            return None
+        return offsets[best[0]], offsets[best[1] - 1] + 1
+
+    def match(self, text):
+        span = self.span(text)
+        if span is None:
+            return ""
+        return text[span[0]:span[1]].strip()
+
+
+def normalized_span_match(text, terms):
+    return TermMatcher(terms).match(text)
+
+
 def scraper_word_pattern(terms):
     terms = sorted({normalize_match_text(term) for term in terms if term.strip()}, key=len, reverse=True)
     if not terms:
@@ -6002,6 +6622,7 @@ def scrape_example_sentences(search_terms, source_urls, result_limit=80, min_cha
 
 def iter_scrape_events(search_terms, source_urls, result_limit=80, min_chars=0, max_chars=320):
     word_pattern = scraper_word_pattern(search_terms)
+    term_matcher = TermMatcher(search_terms)
     result_limit = max(1, min(int(result_limit), SCRAPER_MAX_SENTENCES))
     min_chars = max(0, min(int(min_chars), 1000))
     max_chars = max(1, min(int(max_chars), 1000))
@@ -6020,1097 +6641,418 @@ def iter_scrape_events(search_terms, source_urls, result_limit=80, min_chars=0,
         "filtered_by_length": 0,
         "sentences_checked": 0,
         "matches": 0,
+        "cancelled": 0,
+        "indexed_sources": 0,
         "per_url": {},
+        "page_timings": [],
     }
     visited = set()
     results_count = 0
     opener = build_opener(HTTPCookieProcessor(CookieJar()))
 
-    def process_raw_url(url, raw):
+    def sentence_matches(sentence):
+        return bool(word_pattern and word_pattern.search(normalize_match_text(sentence)))
+
+    def usable_match(sentence):
+        # Streamed pages stop on this count, so it must only count sentences
+        # process_page keeps.
+        return min_chars <= len(sentence) <= max_chars and sentence_matches(sentence)
+
+    def matches_wanted():
+        # Read from pool threads without a lock; a stale value only means a
+        # page is read a little further than needed.
+        return result_limit - results_count
+
+    def process_page(page):
         nonlocal results_count
+        url = page["url"]
         before_matches = results_count
         events = []
-        candidate_count = content_sentence_count(raw, url)
-        filtered_items = content_sentence_items(raw, url, min_chars=min_chars, max_chars=max_chars)
+        candidate_count = page["candidates"]
+        filtered_items = [
+            item for item in page["items"] if min_chars <= len(item["sentence"]) <= max_chars
+        ]
         report["sentences_seen"] += candidate_count
         report["filtered_by_length"] += max(0, candidate_count - len(filtered_items))
         for item_data in filtered_items:
             sentence = item_data["sentence"]
             report["sentences_checked"] += 1
-            if word_pattern and word_pattern.search(normalize_match_text(sentence)):
+            matched = item_data["match"] if "match" in item_data else sentence_matches(sentence)
+            if matched:
                 results_count += 1
-                target = normalized_span_match(sentence, search_terms)
+                target = term_matcher.match(sentence)
                 item = {
                     "sentence": sentence + ".",
                     "source": url,
                     "target": target,
-                    "translation": item_data.get("translation", ""),
-                }
-                events.append({"type": "result", "item": item})
-                if results_count >= result_limit:
-                    break
-        found_here = results_count - before_matches
-        if found_here:
-            report["per_url"][url] = found_here
-        return events
-
-    def scan_url(url, follow_links=False):
-        nonlocal results_count
-        if url in visited or results_count >= result_limit:
-            return []
-        visited.add(url)
-        report["visited"] += 1
-        events = [{"type": "status", "message": f"Checking {url}"}]
-        try:
-            raw = fetch_url_text(url, opener=opener)
-        except HTTPError as exc:
-            if exc.code == 403:
-                root = site_root(url)
-                try:
-                    events.append({"type": "status", "message": f"Retrying {url} after opening {root}"})
-                    fetch_url_text(root, opener=opener)
-                    raw = fetch_url_text(url, opener=opener, referer=root)
-                except HTTPError as retry_exc:
-                    if retry_exc.code in {403, 404}:
-                        events.append({"type": "status", "message": f"Skipped {url}: HTTP {retry_exc.code}"})
-                    else:
-                        events.append({"type": "error", "message": f"{url}: HTTP {retry_exc.code}"})
-                    return events
-                except Exception as retry_exc:
-                    events.append({"type": "error", "message": f"{url}: {retry_exc}"})
-                    return events
-            elif exc.code == 404:
-                events.append({"type": "status", "message": f"Skipped {url}: HTTP 404"})
-                return events
-            else:
-                events.append({"type": "error", "message": f"{url}: HTTP {exc.code}"})
-                return events
-        except Exception as exc:
-            message = f"{url}: {exc}"
-            events.append({"type": "error", "message": message})
-            return events
-        events.extend(process_raw_url(url, raw))
-        if results_count >= result_limit:
-            report["matches"] = results_count
-            return events
-        if follow_links:
-            links = extract_links(raw, url)
-            report["links_found"] += len(links)
-            events.append({"type": "status", "message": f"Found {len(links)} article links in {url}"})
-            for link in links:
-                events.extend(scan_url(link, follow_links=False))
-                if results_count >= result_limit:
-                    report["matches"] = results_count
-                    return events
-        return events
-
-    def scan_tatoeba_source(url):
-        nonlocal results_count
-        next_url = url
-        page = 1
-        while next_url and results_count < result_limit:
-            if next_url in visited:
-                return
-            visited.add(next_url)
-            report["visited"] += 1
-            yield {"type": "status", "message": f"Checking Tatoeba page {page}: {next_url}"}
-            try:
-                raw = fetch_url_text(next_url)
-            except HTTPError as exc:
-                yield {"type": "error", "message": f"{next_url}: HTTP {exc.code}"}
-                return
-            except Exception as exc:
-                yield {"type": "error", "message": f"{next_url}: {exc}"}
-                return
-            for event in process_raw_url(next_url, raw):
-                yield event
-            if results_count >= result_limit:
-                return
-            next_url = tatoeba_next_url(raw)
-            page += 1
-
-    for source_url in source_urls:
-        if is_tatoeba_api_url(source_url):
-            yield from scan_tatoeba_source(source_url)
-        else:
-            for event in scan_url(source_url, follow_links=True):
-                yield event
-        if results_count >= result_limit:
-            break
-    report["matches"] = results_count
-    yield {"type": "report", "report": report}
-    yield {"type": "done", "message": f"Done. Found {results_count} results."}
-
-
-def create_cloze_from_phrase(phrase, answer, translation):
-    phrase = phrase.strip()
-    answer = answer.strip()
-    translation = translation.strip()
-    if not phrase or not answer or not translation:
-        return False, "Phrase, cloze text, and translation are required."
-    def span_normalize(value):
-        text = value.casefold()
-        text = re.sub(r"([aeiou])['`Â´]", r"\1", text)
-        text = unicodedata.normalize("NFD", text)
-        text = "".join(char for char in text if unicodedata.category(char) != "Mn")
-        text = text.replace("'", "").replace("`", "").replace("Â´", "")
-        return text
-
-    normalized_phrase = span_normalize(phrase)
-    normalized_answer = span_normalize(answer.strip())
-    normalized_index = normalized_phrase.find(normalized_answer)
-    if normalized_index == -1:
-        return False, "The cloze text was not found inside the selected phrase."
-    cursor = 0
-    start = None
-    end = None
-    for index, char in enumerate(phrase):
-        normalized_char = span_normalize(char)
-        next_cursor = cursor + len(normalized_char)
-        if start is None and next_cursor > normalized_index:
-            start = index
-        if start is not None and next_cursor >= normalized_index + len(normalized_answer):
-            end = index + 1
-            break
-        cursor = next_cursor
-    if start is None or end is None:
-        return False, "The cloze text was not found inside the selected phrase."
-    stored_answer = phrase[start:end].strip()
-    cloze_sentence = phrase[:start] + "____" + phrase[end:]
-    uid = make_cloze_uid(cloze_sentence, stored_answer)
-    content_hash = cloze_content_hash(cloze_sentence, stored_answer, translation)
-    with get_db() as conn:
-        conn.execute(
-            """
-            INSERT OR IGNORE INTO cloze_questions
-                (uid, sentence, answer, translation, content_hash, revision, elo, active, status, is_new)
-            VALUES (?, ?, ?, ?, ?, 1, ?, 1, 'approved', 1)
-            """,
-            (uid, cloze_sentence, stored_answer, translation, content_hash, DEFAULT_ELO),
-        )
-    return True, "Cloze card created."
-
-
-def extract_response_text(data):
-    if data.get("output_text"):
-        return data["output_text"]
-    chunks = []
-    for output in data.get("output", []):
-        for content in output.get("content", []):
-            if content.get("type") in {"output_text", "text"} and content.get("text"):
-                chunks.append(content["text"])
-    return "\n".join(chunks).strip()
-
-
-def translate_sentences_with_openai(sentences, api_key="", material_language=DEFAULT_STUDY_LANGUAGE):
-    api_key = (api_key or os.environ.get("OPENAI_API_KEY", "")).strip()
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY is not set.")
-    clean_sentences = [sentence.strip() for sentence in sentences if sentence.strip()]
-    if not clean_sentences:
-        return []
-    model = os.environ.get("OPENAI_TRANSLATION_MODEL", "gpt-4.1-mini")
-    source_name = "English" if scraper_language(material_language) == "ja_en" else "Italian"
-    prompt = (
-        f"Translate these {source_name} sentences into natural Japanese. "
-        "Return only a JSON object with key \"translations\", whose value is an array of strings in the same order.\n\n"
-        + json.dumps(clean_sentences, ensure_ascii=False)
-    )
-    payload = json.dumps(
-        {
-            "model": model,
-            "input": prompt,
-            "text": {"format": {"type": "json_object"}},
-        },
-        ensure_ascii=False,
-    ).encode("utf-8")
-    request = Request(
-        "https://api.openai.com/v1/responses",
-        data=payload,
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        method="POST",
-    )
-    with urlopen(request, timeout=45) as response:
-        data = json.loads(response.read().decode("utf-8"))
-    text = extract_response_text(data)
-    parsed = json.loads(text)
-    if isinstance(parsed, dict):
-        parsed = parsed.get("translations", [])
-    if not isinstance(parsed, list):
-        raise RuntimeError("OpenAI response did not contain a translation list.")
-    return [str(item) for item in parsed]
-
-
-def highlight_sentence_html(sentence, target):
-    if not target:
-        return escape(sentence)
-    start = normalize_match_text(sentence).find(normalize_match_text(target))
-    if start == -1:
-        return escape(sentence)
-    match = normalized_span_match(sentence, [target])
-    if not match:
-        return escape(sentence)
-    raw_start = sentence.find(match)
-    if raw_start == -1:
-        return escape(sentence)
-    raw_end = raw_start + len(match)
-    return (
-        escape(sentence[:raw_start])
-        + f'<span class="cloze-hit">{escape(sentence[raw_start:raw_end])}</span>'
-        + escape(sentence[raw_end:])
-    )
-
-
-def render_sentence_scraper(
-    username,
-    user,
-    material_language=None,
-    word="",
-    tense="",
-    sources="",
-    result_limit=20,
-    min_chars=40,
-    max_chars=180,
-    results=None,
-    errors=None,
-    report=None,
-    message="",
-):
-    nav_html = render_nav(username, user, "管理")
-    material_language = scraper_language(material_language or study_language(user))
-    default_source_list = SCRAPER_DEFAULT_SOURCES_BY_LANGUAGE.get(material_language, SCRAPER_DEFAULT_SOURCES)
-    source_library = SCRAPER_SOURCE_LIBRARY_BY_LANGUAGE.get(material_language, SCRAPER_SOURCE_LIBRARY)
-    default_sources = "\n".join(default_source_list)
-    sources_value = sources if sources else default_sources
-    results = results or []
-    errors = errors or []
-    report = report or {}
-    message_html = f'<div class="notice ok">{escape(message)}</div>' if message else ""
-    search_tense_options = '<option value="" selected>単語だけ</option>'
-    search_tense_options += "".join(
-        f'<option value="{escape(key)}" {"selected" if key == tense else ""}>{escape(info["label"])}</option>'
-        for key, info in SUPPORTED_TENSES.items()
-    )
-    language_options = "".join(
-        f'<option value="{escape(key)}" {"selected" if key == material_language else ""}>{escape(info["label"])}</option>'
-        for key, info in STUDY_LANGUAGES.items()
-    )
-    result_html = (
-        "".join(
-            '<div class="result-item">'
-            f'<input class="result-check" type="checkbox" />'
-            '<div class="result-main">'
-            f'<div class="sentence">{highlight_sentence_html(item["sentence"], item.get("target", ""))}</div>'
-            f'<button class="mini-button create-card-button" type="button" data-sentence="{escape(item["sentence"])}" data-target="{escape(item.get("target", ""))}" data-translation="{escape(item.get("translation", ""))}" onclick="openClozeModal(this)">+</button>'
-            '</div>'
-            f'<div class="translation">{escape(item.get("translation", ""))}</div>'
-            f'<div class="source">{escape(item["source"])}</div>'
-            "</div>"
-            for item in results
-        )
-        if results
-        else '<div class="empty">まだ例文はありません。</div>'
-    )
-    errors_html = (
-        '<div class="errors">'
-        + "".join(f'<div>{escape(error)}</div>' for error in errors[:12])
-        + "</div>"
-        if errors
-        else ""
-    )
-    report_html = ""
-    if report:
-        per_url = report.get("per_url", {})
-        per_url_html = "".join(
-            f'<li>{escape(url)}: {count}</li>'
-            for url, count in per_url.items()
-        )
-        terms_preview = ", ".join(report.get("search_terms", [])[:24])
-        terms_html = f'<div class="terms-preview">{escape(terms_preview)}</div>' if terms_preview else ""
-        report_html = f"""
-        <div class="run-report">
-          <strong>収集レポート</strong>
-          <div>入力ソース: {int(report.get("sources", 0))}</div>
-          <div>検索フォーム数: {int(report.get("terms", 0))}</div>
-          <div>結果上限: {int(report.get("result_limit", result_limit))}</div>
-          <div>最小文字数: {int(report.get("min_chars", min_chars))}</div>
-          <div>最大文字数: {int(report.get("max_chars", max_chars))}</div>
-          {terms_html}
-          <div>確認したURL: {int(report.get("visited", 0))}</div>
-          <div>見つけた記事リンク: {int(report.get("links_found", 0))}</div>
-          <div>取得した文: {int(report.get("sentences_seen", 0))}</div>
-          <div>文字数で除外: {int(report.get("filtered_by_length", 0))}</div>
-          <div>確認した文候補: {int(report.get("sentences_checked", 0))}</div>
-          <div>一致した例文: {int(report.get("matches", 0))}</div>
-          <ul>{per_url_html}</ul>
-        </div>
-        """
-    source_library_html = "".join(
-        '<label class="source-choice">'
-        f'<input type="checkbox" value="{escape(url)}" />'
-        f'<span><strong>{escape(name)}</strong><em>{escape(kind)}</em><code>{escape(url)}</code></span>'
-        "</label>"
-        for name, kind, url in source_library
-    )
-    all_source_urls = "\n".join(url for _, _, url in source_library)
-    sources_by_language_json = json.dumps(
-        {
-            key: "\n".join(value)
-            for key, value in SCRAPER_DEFAULT_SOURCES_BY_LANGUAGE.items()
-        },
-        ensure_ascii=False,
-    )
-    source_library_by_language_json = json.dumps(
-        {
-            key: [
-                {"name": name, "kind": kind, "url": url}
-                for name, kind, url in value
-            ]
-            for key, value in SCRAPER_SOURCE_LIBRARY_BY_LANGUAGE.items()
-        },
-        ensure_ascii=False,
-    )
-    return f"""<!doctype html>
-<html lang="ja">
-  <head>
-    <meta charset="utf-8" />
-    <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <title>例文スクレイパー</title>
-    <style>
-      body {{
-        font-family: Georgia, "Times New Roman", serif;
-        background: #f5f0e6;
-        color: #3d3630;
-        margin: 0;
-        padding: 32px;
-      }}
-      .wrap {{
-        max-width: 980px;
-        margin: 0 auto;
-      }}
-      .topline {{
-        display: flex;
-        justify-content: space-between;
-        gap: 16px;
-        align-items: center;
-        margin-bottom: 20px;
-      }}
-      .nav {{
-        display: flex;
-        flex-wrap: wrap;
-        gap: 12px;
-      }}
-      .nav a, .logout {{
-        color: #8fa68e;
-        font-size: 13px;
-        font-weight: 600;
-        text-decoration: none;
-      }}
-      .card {{
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 12px;
-        box-shadow: 0 12px 32px rgba(139, 125, 107, 0.12);
-        padding: 24px;
-      }}
-      h1 {{
-        margin: 0 0 18px;
-        font-size: 26px;
-      }}
-      label {{
-        color: #6b635c;
-        display: block;
-        font-size: 13px;
-        font-weight: 600;
-        margin: 12px 0 6px;
-      }}
-      input, textarea, select {{
-        box-sizing: border-box;
-        width: 100%;
-        padding: 10px 12px;
-        font-size: 15px;
-        border: 1px solid #d8d0c4;
-        border-radius: 8px;
-        background: #fffef9;
-      }}
-      .search-grid {{
-        display: grid;
-        gap: 12px;
-        grid-template-columns: minmax(0, 1fr) 170px 170px 120px 120px 120px;
-      }}
-      textarea {{
-        min-height: 120px;
-        resize: vertical;
-      }}
-      button {{
-        background: #8fa68e;
-        border: 0;
-        border-radius: 10px;
-        color: #fff;
-        cursor: pointer;
-        font-size: 15px;
-        font-weight: 600;
-        margin-top: 14px;
-        padding: 11px 16px;
-      }}
-      button.secondary {{
-        background: #b8aa97;
-      }}
-      .result-list {{
-        display: grid;
-        gap: 8px;
-        margin-top: 18px;
-      }}
-      .result-item {{
-        background: #faf7f0;
-        border: 1px solid #e8e0d4;
-        border-radius: 8px;
-        display: grid;
-        gap: 8px 10px;
-        grid-template-columns: auto minmax(0, 1fr);
-        padding: 12px;
-      }}
-      .result-check {{
-        margin-top: 3px;
-        width: auto;
-      }}
-      .result-main, .source, .translation {{
-        grid-column: 2;
-      }}
-      .sentence {{
-        font-size: 15px;
-        line-height: 1.45;
-      }}
-      .cloze-hit {{
-        background: #ffe08a;
-        border-radius: 4px;
-        color: #513f13;
-        padding: 0 3px;
-      }}
-      .result-main {{
-        align-items: flex-start;
-        display: grid;
-        gap: 10px;
-        grid-template-columns: minmax(0, 1fr) auto;
-      }}
-      .create-card-button {{
-        margin-top: 0;
-      }}
-      .source, .empty {{
-        color: #7a7065;
-        font-size: 12px;
-        margin-top: 5px;
-      }}
-      .translation {{
-        color: #557a53;
-        font-size: 13px;
-      }}
-      .created-card {{
-        opacity: 0.62;
-      }}
-      .scrape-actions {{
-        align-items: center;
-        display: flex;
-        flex-wrap: wrap;
-        gap: 10px;
-      }}
-      #openai-api-key {{
-        max-width: 260px;
-      }}
-      .source-library {{
-        border-top: 1px solid #e8e0d4;
-        margin-top: 16px;
-        padding-top: 14px;
-      }}
-      .source-library-head {{
-        align-items: center;
-        display: flex;
-        gap: 12px;
-        justify-content: space-between;
-        margin-bottom: 6px;
-      }}
-      .source-library-head h2 {{
-        font-size: 15px;
-        margin: 0;
-      }}
-      .source-summary {{
-        color: #7a7065;
-        font-size: 12px;
-        margin-top: 8px;
-      }}
-      .source-choice {{
-        align-items: start;
-        border-bottom: 1px solid #eee7dc;
-        display: grid;
-        gap: 10px;
-        grid-template-columns: auto minmax(0, 1fr);
-        padding: 8px 0;
-      }}
-      .source-choice input {{
-        margin-top: 3px;
-        width: auto;
-      }}
-      .source-choice em {{
-        color: #7a7065;
-        display: block;
-        font-size: 11px;
-        font-style: normal;
-      }}
-      .source-choice code {{
-        background: #faf7f0;
-        border: 1px solid #e8e0d4;
-        border-radius: 6px;
-        color: #6b635c;
-        font-family: Consolas, monospace;
-        font-size: 12px;
-        min-width: 0;
-        overflow: hidden;
-        padding: 5px 7px;
-        text-overflow: ellipsis;
-        white-space: nowrap;
-      }}
-      .source-picker-list {{
-        max-height: 52vh;
-        overflow: auto;
-      }}
-      .mini-button {{
-        border-radius: 7px;
-        font-size: 13px;
-        line-height: 1;
-        margin: 0;
-        min-width: 30px;
-        padding: 7px 8px;
-      }}
-      .errors {{
-        background: #f7e7e4;
-        border-radius: 8px;
-        color: #9b4d48;
-        font-size: 12px;
-        margin-top: 14px;
-        padding: 10px 12px;
-      }}
-      .run-report, .working {{
-        background: #f0ebe3;
-        border-radius: 8px;
-        color: #6b635c;
-        font-size: 13px;
-        line-height: 1.45;
-        margin-top: 14px;
-        padding: 10px 12px;
-      }}
-      .run-report ul {{
-        margin: 6px 0 0 18px;
-        padding: 0;
-      }}
-      .terms-preview {{
-        color: #7a7065;
-        font-size: 12px;
-        margin: 4px 0 6px;
-      }}
-      .working {{
-        display: none;
-      }}
-      .notice {{
-        border-radius: 8px;
-        font-size: 13px;
-        margin-bottom: 14px;
-        padding: 10px 12px;
-      }}
-      .ok {{
-        background: #e9f1e8;
-        color: #557a53;
-      }}
-      .modal-backdrop {{
-        align-items: center;
-        background: rgba(61, 54, 48, 0.42);
-        display: none;
-        inset: 0;
-        justify-content: center;
-        padding: 20px;
-        position: fixed;
-        z-index: 20;
-      }}
-      .modal {{
-        background: #fffef9;
-        border: 1px solid #e8e0d4;
-        border-radius: 10px;
-        box-shadow: 0 20px 60px rgba(61, 54, 48, 0.24);
-        max-width: 720px;
-        padding: 18px;
-        width: min(720px, 100%);
-      }}
-      .modal h2 {{
-        font-size: 18px;
-        margin: 0 0 8px;
-      }}
-      .modal-actions {{
-        display: flex;
-        gap: 10px;
-        justify-content: flex-end;
-      }}
-      .modal-actions .secondary {{
-        background: #b8aa97;
-      }}
-      @media (max-width: 720px) {{
-        .search-grid {{
-          grid-template-columns: 1fr;
-        }}
-      }}
-    </style>
-    <script>
-      function showScrapeStatus() {{
-        var box = document.getElementById("scrape-status");
-        if (box) {{
-          box.style.display = "block";
-          box.textContent = "ソースと記事リンクを確認中です。各ページは最大{SCRAPER_TIMEOUT_SECONDS}秒でタイムアウトし、各ソースから最大{SCRAPER_MAX_SOURCE_LINKS}件の記事を確認します。";
-        }}
-      }}
-      function escapeHtml(value) {{
-        return String(value).replace(/[&<>"']/g, function(char) {{
-          return {{"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}}[char];
-        }});
-      }}
-      var scrapeController = null;
-      var scraperDefaultSources = {sources_by_language_json};
-      var scraperSourceLibrary = {source_library_by_language_json};
-      function scraperLanguage() {{
-        var input = document.querySelector("select[name='material_language']");
-        return input ? input.value : "{escape(material_language)}";
-      }}
-      function sourceStorageKey() {{
-        return "verbiScraperSourcesV4:" + scraperLanguage();
-      }}
-      function highlightTarget(sentence, target) {{
-        if (!target) {{
-          return escapeHtml(sentence);
-        }}
-        var index = sentence.toLocaleLowerCase().indexOf(target.toLocaleLowerCase());
-        if (index === -1) {{
-          return escapeHtml(sentence);
-        }}
-        return escapeHtml(sentence.slice(0, index)) +
-          '<span class="cloze-hit">' + escapeHtml(sentence.slice(index, index + target.length)) + '</span>' +
-          escapeHtml(sentence.slice(index + target.length));
-      }}
-      function appendScrapeResult(item) {{
-        var list = document.getElementById("result-list");
-        if (!list) {{
-          return;
-        }}
-        var empty = list.querySelector(".empty");
-        if (empty) {{
-          empty.remove();
-        }}
-        var div = document.createElement("div");
-        div.className = "result-item";
-        div.dataset.sentence = item.sentence || "";
-        div.dataset.target = item.target || "";
-        div.dataset.translation = item.translation || "";
-        div.innerHTML =
-          '<input class="result-check" type="checkbox" />' +
-          '<div class="result-main">' +
-          '<div class="sentence">' + highlightTarget(item.sentence || "", item.target || "") + '</div>' +
-          '<button class="mini-button create-card-button" type="button" data-sentence="' + escapeHtml(item.sentence || "") + '" data-target="' + escapeHtml(item.target || "") + '" data-translation="' + escapeHtml(item.translation || "") + '" onclick="openClozeModal(this)">+</button>' +
-          '</div>' +
-          '<div class="translation">' + escapeHtml(item.translation || "") + '</div>' +
-          '<div class="source">' + escapeHtml(item.source) + '</div>';
-        list.appendChild(div);
-      }}
-      function appendScrapeError(message) {{
-        var box = document.getElementById("errors-container");
-        if (!box) {{
-          return;
-        }}
-        var errors = box.querySelector(".errors");
-        if (!errors) {{
-          errors = document.createElement("div");
-          errors.className = "errors";
-          box.appendChild(errors);
-        }}
-        var line = document.createElement("div");
-        line.textContent = message;
-        errors.appendChild(line);
-      }}
-      function updateScrapeReport(report) {{
-        var box = document.getElementById("report-container");
-        if (!box || !report) {{
-          return;
-        }}
-        var terms = (report.search_terms || []).slice(0, 24).join(", ");
-        var perUrl = Object.entries(report.per_url || {{}}).map(function(entry) {{
-          return "<li>" + escapeHtml(entry[0]) + ": " + Number(entry[1]) + "</li>";
-        }}).join("");
-        box.innerHTML =
-          '<div class="run-report">' +
-          '<strong>収集レポート</strong>' +
-          '<div>入力ソース: ' + Number(report.sources || 0) + '</div>' +
-          '<div>検索フォーム数: ' + Number(report.terms || 0) + '</div>' +
-          '<div>結果上限: ' + Number(report.result_limit || 0) + '</div>' +
-          '<div>最小文字数: ' + Number(report.min_chars || 0) + '</div>' +
-          '<div>最大文字数: ' + Number(report.max_chars || 0) + '</div>' +
-          (terms ? '<div class="terms-preview">' + escapeHtml(terms) + '</div>' : '') +
-          '<div>確認したURL: ' + Number(report.visited || 0) + '</div>' +
-          '<div>見つけた記事リンク: ' + Number(report.links_found || 0) + '</div>' +
-          '<div>取得した文: ' + Number(report.sentences_seen || 0) + '</div>' +
-          '<div>文字数で除外: ' + Number(report.filtered_by_length || 0) + '</div>' +
-          '<div>確認した文候補: ' + Number(report.sentences_checked || 0) + '</div>' +
-          '<div>一致した例文: ' + Number(report.matches || 0) + '</div>' +
-          '<ul>' + perUrl + '</ul>' +
-          '</div>';
-      }}
-      function setScrapeStatus(message) {{
-        var box = document.getElementById("scrape-status");
-        if (box) {{
-          box.style.display = "block";
-          box.textContent = message;
-        }}
-      }}
-      function startScrapeStream(form) {{
-        if (!window.fetch || !window.TextDecoder || !window.ReadableStream) {{
-          showScrapeStatus();
-          return true;
-        }}
-        showScrapeStatus();
-        scrapeController = new AbortController();
-        document.getElementById("stop-scrape-button").style.display = "inline-block";
-        document.getElementById("result-list").innerHTML = '<div class="empty">検索中...</div>';
-        document.getElementById("errors-container").innerHTML = "";
-        document.getElementById("report-container").innerHTML = "";
-        fetch("/admin/sentence-scraper/stream", {{
-          method: "POST",
-          body: new URLSearchParams(new FormData(form))
-          , signal: scrapeController.signal
-        }}).then(function(response) {{
-          if (!response.body) {{
-            form.submit();
-            return;
-          }}
-          var reader = response.body.getReader();
-          var decoder = new TextDecoder();
-          var buffer = "";
-          function pump() {{
-            return reader.read().then(function(chunk) {{
-              if (chunk.done) {{
-                if (buffer.trim()) {{
-                  handleScrapeLine(buffer.trim());
-                }}
-                return;
-              }}
-              buffer += decoder.decode(chunk.value, {{stream: true}});
-              var lines = buffer.split("\\n");
-              buffer = lines.pop();
-              lines.forEach(handleScrapeLine);
-              return pump();
-            }});
-          }}
-          return pump();
-        }}).catch(function(error) {{
-          if (error.name === "AbortError") {{
-            setScrapeStatus("Stopped.");
-          }} else {{
-            appendScrapeError(error.message || String(error));
-          }}
-        }}).finally(function() {{
-          document.getElementById("stop-scrape-button").style.display = "none";
-          scrapeController = null;
-        }});
-        return false;
-      }}
-      function stopScrape() {{
-        if (scrapeController) {{
-          scrapeController.abort();
-        }}
-      }}
-      function selectedResultItems() {{
-        return Array.from(document.querySelectorAll(".result-item")).filter(function(item) {{
-          var checkbox = item.querySelector(".result-check");
-          return checkbox && checkbox.checked;
-        }});
-      }}
-      function setResultSelection(mode) {{
-        document.querySelectorAll(".result-item").forEach(function(item) {{
-          var checkbox = item.querySelector(".result-check");
-          if (!checkbox) {{
-            return;
-          }}
-          if (mode === "all") {{
-            checkbox.checked = true;
-          }} else if (mode === "missing") {{
-            checkbox.checked = !(item.dataset.translation || "").trim();
-          }} else if (mode === "translated") {{
-            checkbox.checked = Boolean((item.dataset.translation || "").trim());
-          }} else if (mode === "clear") {{
-            checkbox.checked = false;
-          }}
-        }});
-      }}
-      function translateSelectedResults() {{
-        var items = selectedResultItems();
-        if (!items.length) {{
-          setScrapeStatus("No results selected.");
-          return;
-        }}
-        setScrapeStatus("Translating selected results...");
-        var sentences = items.map(function(item) {{ return item.dataset.sentence || ""; }});
-        var apiKeyInput = document.getElementById("openai-api-key");
-        var apiKey = apiKeyInput ? apiKeyInput.value : "";
-        fetch("/admin/sentence-scraper/translate", {{
-          method: "POST",
-          body: new URLSearchParams({{items: JSON.stringify(sentences), api_key: apiKey, material_language: scraperLanguage()}})
-        }}).then(function(response) {{
-          return response.json();
-        }}).then(function(data) {{
-          if (data.error) {{
-            appendScrapeError(data.error);
-            return;
-          }}
-          (data.translations || []).forEach(function(translation, index) {{
-            var item = items[index];
-            if (!item) {{
-              return;
-            }}
-            item.dataset.translation = translation;
-            var translationBox = item.querySelector(".translation");
-            if (translationBox) {{
-              translationBox.textContent = translation;
-            }}
-            var button = item.querySelector(".create-card-button");
-            if (button) {{
-              button.setAttribute("data-translation", translation);
-            }}
-          }});
-          setScrapeStatus("Translations added.");
-        }}).catch(function(error) {{
-          appendScrapeError(error.message || String(error));
-        }});
-      }}
-      function createSelectedCards() {{
-        var items = selectedResultItems();
-        if (!items.length) {{
-          setScrapeStatus("No results selected.");
-          return;
-        }}
-        var cards = items.map(function(item) {{
-          return {{
-            phrase: item.dataset.sentence || "",
-            answer: item.dataset.target || "",
-            translation: item.dataset.translation || ""
-          }};
-        }});
-        setScrapeStatus("Creating selected cards...");
-        fetch("/admin/sentence-scraper/create-cloze-batch", {{
-          method: "POST",
-          body: new URLSearchParams({{items: JSON.stringify(cards), material_language: scraperLanguage()}})
-        }}).then(function(response) {{
-          return response.json();
-        }}).then(function(data) {{
-          if (data.error) {{
-            appendScrapeError(data.error);
-            return;
-          }}
-          (data.results || []).forEach(function(result, index) {{
-            var item = items[index];
-            if (!item) {{
-              return;
-            }}
-            if (result.ok) {{
-              item.classList.add("created-card");
-              var checkbox = item.querySelector(".result-check");
-              if (checkbox) {{
-                checkbox.checked = false;
-              }}
-            }} else {{
-              appendScrapeError(result.error || "Card could not be created.");
-            }}
-          }});
-          setScrapeStatus("Created " + Number(data.created || 0) + " cards. Skipped " + Number(data.skipped || 0) + ".");
-        }}).catch(function(error) {{
-          appendScrapeError(error.message || String(error));
-        }});
-      }}
-      function handleScrapeLine(line) {{
-        if (!line) {{
-          return;
-        }}
-        var event = JSON.parse(line);
-        if (event.type === "status") {{
-          setScrapeStatus(event.message);
-        }} else if (event.type === "result") {{
-          appendScrapeResult(event.item);
-        }} else if (event.type === "error") {{
-          appendScrapeError(event.message);
-        }} else if (event.type === "report") {{
-          updateScrapeReport(event.report);
-        }} else if (event.type === "done") {{
-          setScrapeStatus(event.message);
-        }}
-      }}
-      function addSource(button) {{
-        var textarea = document.querySelector("textarea[name='sources']");
-        var url = button.getAttribute("data-source");
-        if (!textarea || !url) {{
-          return;
-        }}
-        addSources([url]);
-      }}
-      function addSources(urls) {{
-        var textarea = document.querySelector("textarea[name='sources']");
-        if (!textarea) {{
-          return;
-        }}
-        var lines = textarea.value.split(/\\r?\\n/).map(function(line) {{ return line.trim(); }});
-        urls.forEach(function(url) {{
-          if (lines.indexOf(url) === -1) {{
-            lines.push(url);
-          }}
-        }});
-        lines = lines.filter(function(line, index) {{
-          return line && lines.indexOf(line) === index;
-        }});
-        textarea.value = lines.join("\\n");
-      }}
-      function addAllSources() {{
-        var urls = document.getElementById("all-source-urls").value.split(/\\r?\\n/);
-        addSources(urls);
-      }}
-      function renderSourceChoices() {{
-        var list = document.querySelector("#source-modal .source-picker-list");
-        if (!list) {{
-          return;
-        }}
-        var sources = scraperSourceLibrary[scraperLanguage()] || [];
-        list.innerHTML = sources.map(function(source) {{
-          return '<label class="source-choice">' +
-            '<input type="checkbox" value="' + escapeHtml(source.url || "") + '" />' +
-            '<span><strong>' + escapeHtml(source.name || "") + '</strong>' +
-            '<em>' + escapeHtml(source.kind || "") + '</em>' +
-            '<code>' + escapeHtml(source.url || "") + '</code></span>' +
-            '</label>';
-        }}).join("");
-        var allUrls = document.getElementById("all-source-urls");
-        if (allUrls) {{
-          allUrls.value = sources.map(function(source) {{ return source.url || ""; }}).join("\\n");
-        }}
-      }}
-      function sourceTextarea() {{
-        return document.querySelector("textarea[name='sources']");
-      }}
-      function sourceLines() {{
-        var textarea = sourceTextarea();
-        if (!textarea) {{
-          return [];
-        }}
-        return textarea.value.split(/\\r?\\n/).map(function(line) {{ return line.trim(); }}).filter(Boolean);
-      }}
-      function updateSourceSummary() {{
-        var summary = document.getElementById("source-summary");
-        if (summary) {{
-          summary.textContent = sourceLines().length + " sources selected";
-        }}
-      }}
-      function openSourceModal() {{
-        var selected = sourceLines();
-        document.querySelectorAll("#source-modal input[type='checkbox']").forEach(function(input) {{
-          input.checked = selected.indexOf(input.value) !== -1;
-        }});
-        document.getElementById("source-modal").style.display = "flex";
-      }}
-      function closeSourceModal() {{
-        document.getElementById("source-modal").style.display = "none";
-      }}
-      function applySourceSelection() {{
-        var urls = [];
-        document.querySelectorAll("#source-modal input[type='checkbox']:checked").forEach(function(input) {{
-          urls.push(input.value);
-        }});
-        var textarea = sourceTextarea();
-        if (textarea) {{
-          textarea.value = urls.join("\\n");
-          localStorage.setItem(sourceStorageKey(), textarea.value);
-        }}
-        updateSourceSummary();
-        closeSourceModal();
-      }}
-      function setAllSourceChoices(checked) {{
-        document.querySelectorAll("#source-modal input[type='checkbox']").forEach(function(input) {{
-          input.checked = checked;
-        }});
-      }}
-      function useRecommendedSources() {{
-        var textarea = sourceTextarea();
-        var defaults = document.getElementById("default-source-urls");
-        if (textarea && defaults) {{
-          textarea.value = defaults.value;
-          localStorage.setItem(sourceStorageKey(), textarea.value);
-        }}
-        updateSourceSummary();
-        closeSourceModal();
-      }}
-      function restoreSavedSources() {{
-        var saved = localStorage.getItem(sourceStorageKey());
-        var textarea = sourceTextarea();
-        if (saved && textarea) {{
-          textarea.value = saved;
-        }}
-        updateSourceSummary();
-      }}
-      function changeScraperLanguage() {{
-        renderSourceChoices();
-        var textarea = sourceTextarea();
-        if (textarea) {{
-          var saved = localStorage.getItem(sourceStorageKey());
-          textarea.value = saved || scraperDefaultSources[scraperLanguage()] || "";
-        }}
-        var tense = document.querySelector("select[name='tense']");
-        if (tense) {{
-          var italian = scraperLanguage() === "it_ja";
-          tense.disabled = !italian;
-          if (!italian) {{
-            tense.value = "";
-          }}
-        }}
-        var hiddenLanguage = document.querySelector("#cloze-modal input[name='material_language']");
-        if (hiddenLanguage) {{
-          hiddenLanguage.value = scraperLanguage();
-        }}
-        updateSourceSummary();
-      }}
-      function openClozeModal(button) {{
-        var sentence = button.getAttribute("data-sentence") || "";
-        var target = button.getAttribute("data-target") || "";
-        var translation = button.getAttribute("data-translation") || "";
-        var hiddenLanguage = document.querySelector("#cloze-modal input[name='material_language']");
-        if (hiddenLanguage) {{
-          hiddenLanguage.value = scraperLanguage();
-        }}
-        document.getElementById("cloze-phrase").value = sentence;
-        document.getElementById("cloze-answer").value = target;
-        document.getElementById("cloze-translation").value = translation;
-        document.getElementById("cloze-modal").style.display = "flex";
-        document.getElementById("cloze-answer").focus();
-      }}
-      function closeClozeModal() {{
-        document.getElementById("cloze-modal").style.display = "none";
-      }}
-      function useSelectedClozeText() {{
-        var phrase = document.getElementById("cloze-phrase");
-        var answer = document.getElementById("cloze-answer");
-        if (!phrase || !answer) {{
-          return;
-        }}
-        var selected = phrase.value.substring(phrase.selectionStart, phrase.selectionEnd).trim();
-        if (selected) {{
-          answer.value = selected;
-        }}
-      }}
-      document.addEventListener("DOMContentLoaded", function() {{
-        restoreSavedSources();
-        changeScraperLanguage();
-      }});
-    </script>
+                    "translation": item_data.get("translation", ""),
+                }
+                events.append({"type": "result", "item": item})
+                if results_count >= result_limit:
+                    break
+        found_here = results_count - before_matches
+        if found_here:
+            report["per_url"][url] = found_here
+        return events
+
+    def answer_from_corpus(source):
+        nonlocal results_count
+        report["indexed_sources"] += 1
+        yield {"type": "status", "message": f"Searching the local index for {source}"}
+        claimed = set()
+        for row in corpus_matches(source, match_query):
+            url = row["url"]
+            if url not in claimed:
+                if url in visited:
+                    continue
+                visited.add(url)
+                claimed.add(url)
+            sentence = row["sentence"]
+            if not min_chars <= len(sentence) <= max_chars:
+                continue
+            report["sentences_checked"] += 1
+            if not word_pattern or not word_pattern.search(row["normalized"]):
+                continue
+            results_count += 1
+            report["per_url"][url] = report["per_url"].get(url, 0) + 1
+            yield {
+                "type": "result",
+                "item": {
+                    "sentence": sentence + ".",
+                    "source": url,
+                    "target": term_matcher.match(sentence),
+                    "translation": row["translation"],
+                },
+            }
+            if results_count >= result_limit:
+                return
+
+    # Fetches run on a bounded pool and are handled in the order they finish.
+    # Sources marked "source" have their article links followed once; each
+    # Tatoeba page queues the next one; both inherit the source's cache ttl.
+    # Reaching result_limit, or the client closing the stream, cancels
+    # whatever is still outstanding. A source counts as indexed once every
+    # page reached from it has been processed.
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=SCRAPER_FETCH_WORKERS, thread_name_prefix="verbi-scraper")
+    pending = {}
+    outstanding = {}
+    incomplete_sources = set()
+    match_query = corpus_match_query(search_terms)
+
+    def submit(url, kind, source, page=1, ttl=None):
+        ttl = scraper_cache_ttl(url) if ttl is None else ttl
+        visited.add(url)
+        report["visited"] += 1
+        tatoeba = kind == "tatoeba"
+        future = executor.submit(
+            fetch_scrape_page,
+            url,
+            opener=None if tatoeba else opener,
+            retry_forbidden=not tatoeba,
+            cancelled=cancelled,
+            ttl=ttl,
+            is_match=usable_match,
+            wanted=matches_wanted,
+        )
+        pending[future] = (url, kind, source, page, ttl)
+        outstanding[source] = outstanding.get(source, 0) + 1
+        if tatoeba:
+            return {"type": "status", "message": f"Checking Tatoeba page {page}: {url}"}
+        return {"type": "status", "message": f"Checking {url}"}
+
+    try:
+        live_sources = []
+        for source_url in source_urls:
+            if match_query and corpus_source_fresh(source_url):
+                yield from answer_from_corpus(source_url)
+                if results_count >= result_limit:
+                    break
+            else:
+                live_sources.append(source_url)
+        for source_url in live_sources:
+            if results_count >= result_limit:
+                break
+            if source_url not in visited:
+                kind = "tatoeba" if is_tatoeba_api_url(source_url) else "source"
+                yield submit(source_url, kind, source_url)
+        while pending and results_count < result_limit:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, kind, source, page_number, ttl = pending.pop(future)
+                page, events = future.result()
+                yield from events
+                if page is None:
+                    # A failed or cancelled article leaves the crawl
+                    # incomplete too; otherwise the source would be answered
+                    # from the index without it for the whole ttl.
+                    incomplete_sources.add(source)
+                else:
+                    if not page["complete"]:
+                        incomplete_sources.add(source)
+                    # Queue the next Tatoeba page before matching this one so
+                    # its fetch overlaps the matching.
+                    if kind == "tatoeba" and page["next_url"] and page["next_url"] not in visited:
+                        yield submit(page["next_url"], "tatoeba", source, page_number + 1, ttl)
+                    index_corpus_page(page, source)
+                    match_started = time.perf_counter()
+                    events = process_page(page)
+                    report["page_timings"].append(
+                        {
+                            "url": url,
+                            "page": page_number if kind == "tatoeba" else None,
+                            "fetch_ms": round(page["fetch_ms"], 1),
+                            "parse_ms": round(page["parse_ms"], 1),
+                            "match_ms": round((time.perf_counter() - match_started) * 1000, 1),
+                            "sentences": page["candidates"],
+                        }
+                    )
+                    yield from events
+                    if results_count >= result_limit:
+                        break
+                    if kind == "source":
+                        links = page["links"]
+                        report["links_found"] += len(links)
+                        yield {"type": "status", "message": f"Found {len(links)} article links in {url}"}
+                        for link in links:
+                            if link not in visited:
+                                yield submit(link, "link", source, ttl=ttl)
+                            else:
+                                link_corpus_url(source, link)
+                outstanding[source] -= 1
+                if not outstanding[source] and source not in incomplete_sources:
+                    mark_corpus_source(source)
+        report["cancelled"] = len(pending)
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+    report["matches"] = results_count
+    yield {"type": "report", "report": report}
+    yield {"type": "done", "message": f"Done. Found {results_count} results."}
+
+
+def create_cloze_from_phrase(phrase, answer, translation):
+    phrase = phrase.strip()
+    answer = answer.strip()
+    translation = translation.strip()
+    if not phrase or not answer or not translation:
+        return False, "Phrase, cloze text, and translation are required."
+    span = TermMatcher([answer]).span(phrase)
+    if span is None:
+        return False, "The cloze text was not found inside the selected phrase."
+    start, end = span
+    stored_answer = phrase[start:end].strip()
+    cloze_sentence = phrase[:start] + "____" + phrase[end:]
+    uid = make_cloze_uid(cloze_sentence, stored_answer)
+    content_hash = cloze_content_hash(cloze_sentence, stored_answer, translation)
+    with get_db() as conn:
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO cloze_questions
+                (uid, sentence, answer, translation, content_hash, revision, elo, active, status, is_new)
+            VALUES (?, ?, ?, ?, ?, 1, ?, 1, 'approved', 1)
+            """,
+            (uid, cloze_sentence, stored_answer, translation, content_hash, DEFAULT_ELO),
+        )
+        row = conn.execute("SELECT id FROM cloze_questions WHERE uid = ?", (uid,)).fetchone()
+    if row:
+        refresh_indexed_card("cloze", row["id"])
+    return True, "Cloze card created."
+
+
+def extract_response_text(data):
+    if data.get("output_text"):
+        return data["output_text"]
+    chunks = []
+    for output in data.get("output", []):
+        for content in output.get("content", []):
+            if content.get("type") in {"output_text", "text"} and content.get("text"):
+                chunks.append(content["text"])
+    return "\n".join(chunks).strip()
+
+
+def translate_sentences_with_openai(sentences, api_key="", material_language=DEFAULT_STUDY_LANGUAGE):
+    api_key = (api_key or os.environ.get("OPENAI_API_KEY", "")).strip()
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY is not set.")
+    clean_sentences = [sentence.strip() for sentence in sentences if sentence.strip()]
+    if not clean_sentences:
+        return []
+    model = os.environ.get("OPENAI_TRANSLATION_MODEL", "gpt-4.1-mini")
+    source_name = "English" if scraper_language(material_language) == "ja_en" else "Italian"
+    prompt = (
+        f"Translate these {source_name} sentences into natural Japanese. "
+        "Return only a JSON object with key \"translations\", whose value is an array of strings in the same order.\n\n"
+        + json.dumps(clean_sentences, ensure_ascii=False)
+    )
+    payload = json.dumps(
+        {
+            "model": model,
+            "input": prompt,
+            "text": {"format": {"type": "json_object"}},
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+    request = Request(
+        "https://api.openai.com/v1/responses",
+        data=payload,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        },
+        method="POST",
+    )
+    with urlopen(request, timeout=45) as response:
+        data = json.loads(response.read().decode("utf-8"))
+    text = extract_response_text(data)
+    parsed = json.loads(text)
+    if isinstance(parsed, dict):
+        parsed = parsed.get("translations", [])
+    if not isinstance(parsed, list):
+        raise RuntimeError("OpenAI response did not contain a translation list.")
+    return [str(item) for item in parsed]
+
+
+def highlight_sentence_html(sentence, target):
+    span = TermMatcher([target]).span(sentence) if target else None
+    if span is None:
+        return escape(sentence)
+    raw_start, raw_end = span
+    return (
+        escape(sentence[:raw_start])
+        + f'<span class="cloze-hit">{escape(sentence[raw_start:raw_end])}</span>'
+        + escape(sentence[raw_end:])
+    )
+
+
+def render_sentence_scraper(
+    username,
+    user,
+    material_language=None,
+    word="",
+    tense="",
+    sources="",
+    result_limit=20,
+    min_chars=40,
+    max_chars=180,
+    results=None,
+    errors=None,
+    report=None,
+    message="",
+):
+    nav_html = render_nav(username, user, "管理")
+    material_language = scraper_language(material_language or study_language(user))
+    default_source_list = SCRAPER_DEFAULT_SOURCES_BY_LANGUAGE.get(material_language, SCRAPER_DEFAULT_SOURCES)
+    source_library = SCRAPER_SOURCE_LIBRARY_BY_LANGUAGE.get(material_language, SCRAPER_SOURCE_LIBRARY)
+    default_sources = "\n".join(default_source_list)
+    sources_value = sources if sources else default_sources
+    results = results or []
+    errors = errors or []
+    report = report or {}
+    message_html = f'<div class="notice ok">{escape(message)}</div>' if message else ""
+    search_tense_options = '<option value="" selected>単語だけ</option>'
+    search_tense_options += "".join(
+        f'<option value="{escape(key)}" {"selected" if key == tense else ""}>{escape(info["label"])}</option>'
+        for key, info in SUPPORTED_TENSES.items()
+    )
+    language_options = "".join(
+        f'<option value="{escape(key)}" {"selected" if key == material_language else ""}>{escape(info["label"])}</option>'
+        for key, info in STUDY_LANGUAGES.items()
+    )
+    result_html = (
+        "".join(
+            '<div class="result-item">'
+            f'<input class="result-check" type="checkbox" />'
+            '<div class="result-main">'
+            f'<div class="sentence">{highlight_sentence_html(item["sentence"], item.get("target", ""))}</div>'
+            f'<button class="mini-button create-card-button" type="button" data-sentence="{escape(item["sentence"])}" data-target="{escape(item.get("target", ""))}" data-translation="{escape(item.get("translation", ""))}" onclick="openClozeModal(this)">+</button>'
+            '</div>'
+            f'<div class="translation">{escape(item.get("translation", ""))}</div>'
+            f'<div class="source">{escape(item["source"])}</div>'
+            "</div>"
+            for item in results
+        )
+        if results
+        else '<div class="empty">まだ例文はありません。</div>'
+    )
+    errors_html = (
+        '<div class="errors">'
+        + "".join(f'<div>{escape(error)}</div>' for error in errors[:12])
+        + "</div>"
+        if errors
+        else ""
+    )
+    report_html = ""
+    if report:
+        per_url = report.get("per_url", {})
+        per_url_html = "".join(
+            f'<li>{escape(url)}: {count}</li>'
+            for url, count in per_url.items()
+        )
+        page_timings = report.get("page_timings", [])
+        timing_totals = " / ".join(
+            f'{sum(float(timing.get(key, 0)) for timing in page_timings):.0f}'
+            for key in ("fetch_ms", "parse_ms", "match_ms")
+        )
+        terms_preview = ", ".join(report.get("search_terms", [])[:24])
+        terms_html = f'<div class="terms-preview">{escape(terms_preview)}</div>' if terms_preview else ""
+        report_html = f"""
+        <div class="run-report">
+          <strong>収集レポート</strong>
+          <div>入力ソース: {int(report.get("sources", 0))}</div>
+          <div>検索フォーム数: {int(report.get("terms", 0))}</div>
+          <div>結果上限: {int(report.get("result_limit", result_limit))}</div>
+          <div>最小文字数: {int(report.get("min_chars", min_chars))}</div>
+          <div>最大文字数: {int(report.get("max_chars", max_chars))}</div>
+          {terms_html}
+          <div>確認したURL: {int(report.get("visited", 0))}</div>
+          <div>見つけた記事リンク: {int(report.get("links_found", 0))}</div>
+          <div>取得した文: {int(report.get("sentences_seen", 0))}</div>
+          <div>文字数で除外: {int(report.get("filtered_by_length", 0))}</div>
+          <div>確認した文候補: {int(report.get("sentences_checked", 0))}</div>
+          <div>一致した例文: {int(report.get("matches", 0))}</div>
+          <div>中止した取得: {int(report.get("cancelled", 0))}</div>
+          <div>索引から検索したソース: {int(report.get("indexed_sources", 0))}</div>
+          <div>ページ処理 {len(page_timings)}件 (取得/解析/照合 ms): {timing_totals}</div>
+          <ul>{per_url_html}</ul>
+        </div>
+        """
+    source_library_html = "".join(
+        '<label class="source-choice">'
+        f'<input type="checkbox" value="{escape(url)}" />'
+        f'<span><strong>{escape(name)}</strong><em>{escape(kind)}</em><code>{escape(url)}</code></span>'
+        "</label>"
+        for name, kind, url in source_library
+    )
+    all_source_urls = "\n".join(url for _, _, url in source_library)
+    scraper_config_json = json.dumps(
+        {
+            "timeoutSeconds": SCRAPER_TIMEOUT_SECONDS,
+            "maxSourceLinks": SCRAPER_MAX_SOURCE_LINKS,
+            "materialLanguage": material_language,
+            "defaultSources": {
+                key: "\n".join(value)
+                for key, value in SCRAPER_DEFAULT_SOURCES_BY_LANGUAGE.items()
+            },
+            "sourceLibrary": {
+                key: [
+                    {"name": name, "kind": kind, "url": url}
+                    for name, kind, url in value
+                ]
+                for key, value in SCRAPER_SOURCE_LIBRARY_BY_LANGUAGE.items()
+            },
+        },
+        ensure_ascii=False,
+    ).replace("</", "<\\/")
+    return f"""<!doctype html>
+<html lang="ja">
+  <head>
+    <meta charset="utf-8" />
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <title>例文スクレイパー</title>
+    <link rel="stylesheet" href="{asset_url("css/sentence-scraper.css")}" />
+    <script>window.VERBI_SCRAPER = {scraper_config_json};</script>
+    <script src="{asset_url("js/sentence-scraper.js")}"></script>
   </head>
   <body>
     <main class="wrap">
@@ -7214,6 +7156,14 @@ def render_sentence_scraper(
 </html>"""
 
 
+def parse_json_body(environ):
+    try:
+        length = int(environ.get("CONTENT_LENGTH", "0"))
+    except ValueError:
+        length = 0
+    return json.loads(environ["wsgi.input"].read(length).decode("utf-8") or "null")
+
+
 def parse_post(environ):
     try:
         length = int(environ.get("CONTENT_LENGTH", "0"))
@@ -7235,174 +7185,425 @@ def answer_key(value):
     return normalize_match_text(normalize_answer(value))
 
 
-def answers_match(user_answer, correct_answer):
-    return answer_key(user_answer) == answer_key(correct_answer)
+def answers_match(user_answer, correct_answer):
+    return answer_key(user_answer) == answer_key(correct_answer)
+
+
+def static_file_entry(path):
+    # One stat per request; the file is re-read only when its mtime or size
+    # changed. Files above STATIC_CACHE_FILE_MAX_BYTES are never held in
+    # memory and are streamed from disk instead.
+    real_static_dir = os.path.realpath(STATIC_DIR)
+    file_path = os.path.realpath(os.path.join(real_static_dir, path.lstrip("/")))
+    if os.path.commonpath([real_static_dir, file_path]) != real_static_dir:
+        return None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    if not os.path.isfile(file_path):
+        return None
+    with STATIC_CACHE_LOCK:
+        entry = STATIC_CACHE.get(file_path)
+        if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            STATIC_CACHE.move_to_end(file_path)
+            STATIC_CACHE_STATS["hits"] += 1
+            return entry
+        STATIC_CACHE_STATS["misses"] += 1
+    content = None
+    if stat.st_size <= STATIC_CACHE_FILE_MAX_BYTES:
+        with open(file_path, "rb") as f:
+            content = f.read()
+        etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+    else:
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type.endswith(("javascript", "json", "+xml")):
+        content_type += "; charset=utf-8"
+    entry = {
+        "path": file_path,
+        "mtime_ns": stat.st_mtime_ns,
+        "mtime": int(stat.st_mtime),
+        "size": stat.st_size,
+        "content": content,
+        "content_type": content_type,
+        "etag": etag,
+        "last_modified": formatdate(stat.st_mtime, usegmt=True),
+    }
+    if content is not None:
+        with STATIC_CACHE_LOCK:
+            previous = STATIC_CACHE.pop(file_path, None)
+            if previous is not None:
+                STATIC_CACHE_STATS["bytes"] -= len(previous["content"])
+            STATIC_CACHE[file_path] = entry
+            STATIC_CACHE_STATS["bytes"] += len(content)
+            while STATIC_CACHE_STATS["bytes"] > STATIC_CACHE_MAX_BYTES and len(STATIC_CACHE) > 1:
+                _, evicted = STATIC_CACHE.popitem(last=False)
+                STATIC_CACHE_STATS["bytes"] -= len(evicted["content"])
+                STATIC_CACHE_STATS["evictions"] += 1
+    return entry
+
+
+@process_cache("static_files")
+def clear_static_cache():
+    with STATIC_CACHE_LOCK:
+        STATIC_CACHE.clear()
+        STATIC_CACHE_STATS["bytes"] = 0
+
+
+def static_cache_stats():
+    with STATIC_CACHE_LOCK:
+        return dict(STATIC_CACHE_STATS, files=len(STATIC_CACHE))
+
+
+def etag_matches(header, etag):
+    # Compressed responses carry the ETag with an encoding suffix; any
+    # encoding of the same file revalidates it.
+    candidates = {etag_identity(value.strip().removeprefix("W/")) for value in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def encoded_etag(etag, encoding):
+    weak = "W/" if etag.startswith("W/") else ""
+    return f'{weak}{etag.removeprefix("W/")[:-1]}-{encoding}"'
+
+
+def etag_identity(etag):
+    for encoding in COMPRESSION_LEVELS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def not_modified(environ, entry):
+    if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+    if if_none_match:
+        return etag_matches(if_none_match, entry["etag"])
+    if_modified_since = environ.get("HTTP_IF_MODIFIED_SINCE")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return since is not None and entry["mtime"] <= since.timestamp()
+    return False
+
+
+def requested_range(environ, entry):
+    # Only a single byte range is honoured; anything else gets the whole file.
+    # Returns None for the whole file, (start, end) inclusive, or False when
+    # the range cannot be satisfied.
+    header = environ.get("HTTP_RANGE", "")
+    if not header.startswith("bytes=") or "," in header:
+        return None
+    if_range = environ.get("HTTP_IF_RANGE")
+    if if_range and if_range not in (entry["etag"], entry["last_modified"]):
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    size = entry["size"]
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return False
+    return start, end
+
 
+def iter_file_range(f, start, length, block_size=STATIC_BLOCK_SIZE):
+    try:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(block_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def serve_static_file(environ, start_response, path):
+    asset_path, digest = split_asset_fingerprint(path)
+    entry = static_file_entry(asset_path)
+    if entry is None:
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"Not Found"]
+    # Only a URL whose fingerprint matches the current file may be cached
+    # forever; anything else is revalidated through its ETag.
+    immutable = digest is not None and digest == asset_fingerprint(asset_path)
+    headers = [
+        ("ETag", entry["etag"]),
+        ("Last-Modified", entry["last_modified"]),
+        ("Cache-Control", STATIC_IMMUTABLE_CACHE_CONTROL if immutable else "no-cache"),
+        ("Accept-Ranges", "bytes"),
+    ]
+    if not_modified(environ, entry):
+        start_response("304 Not Modified", headers)
+        return [b""]
+    byte_range = requested_range(environ, entry)
+    if byte_range is False:
+        start_response(
+            "416 Range Not Satisfiable",
+            [("Content-Range", f"bytes */{entry['size']}"), ("Content-Length", "0")] + headers,
+        )
+        return [b""]
+    start, end = byte_range or (0, entry["size"] - 1)
+    length = end - start + 1
+    headers = [("Content-Type", entry["content_type"]), ("Content-Length", str(length))] + headers
+    if byte_range:
+        headers.append(("Content-Range", f"bytes {start}-{end}/{entry['size']}"))
+    start_response("206 Partial Content" if byte_range else "200 OK", headers)
+    if environ.get("REQUEST_METHOD") == "HEAD":
+        return [b""]
+    if entry["content"] is not None:
+        return [entry["content"][start:end + 1]]
+    f = open(entry["path"], "rb")
+    file_wrapper = environ.get("wsgi.file_wrapper")
+    if file_wrapper is not None and not byte_range:
+        # Lets gunicorn (and wsgiref) hand the file to sendfile().
+        return file_wrapper(f, STATIC_BLOCK_SIZE)
+    return iter_file_range(f, start, length)
+
+
+def route(path, methods=("GET",), auth="user", material=True, forbidden="redirect", prefix=False):
+    # auth is checked by run_route: "public" routes run before any user
+    # lookup, "bootstrap" only while no users exist, "login" before a session
+    # is required, "reset" only while the user must choose a password, and
+    # "user" / "admin" for signed-in users. material=False skips selecting
+    # the user's material database.
+    def register(handler):
+        entry = {
+            "name": handler.__name__.removeprefix("handle_"),
+            "handler": handler,
+            "auth": auth,
+            "material": material,
+            "forbidden": forbidden,
+        }
+        if prefix:
+            ROUTE_PREFIXES.append((path, entry))
+        else:
+            for method in methods:
+                ROUTES[(method, path)] = entry
+        return handler
+    return register
+
+
+@route("/static/", auth="public", material=False, prefix=True)
+def handle_static(environ, start_response, username, user):
+    return serve_static_file(environ, start_response, environ.get("PATH_INFO", "")[8:])
+
+
+@route("/logout", methods=("GET", "POST"), auth="public", material=False)
+def handle_logout(environ, start_response, username, user):
+    headers = [("Content-Type", "text/html; charset=utf-8")]
+    forget_session(get_cookie(environ, "verbi_session"))
+    clear_session_cookie(headers)
+    return redirect(start_response, "/", headers)
+
+
+@route("/setup", methods=("POST",), auth="bootstrap", material=False)
+def handle_setup(environ, start_response, username, user):
+    form = parse_post(environ)
+    name = form.get("name", "").strip() or "admin"
+    password = form.get("password", "")
+    confirm_password = form.get("confirm_password", "")
+    if len(password) < 4:
+        body = render_first_admin_setup("4文字以上で入力してください。")
+        return html_response(start_response, body)
+    if password != confirm_password:
+        body = render_first_admin_setup("パスワードが一致しません。")
+        return html_response(start_response, body)
+
+    token = secrets.token_urlsafe(32)
+    save_users(
+        {
+            "users": {
+                name: {
+                    "name": name,
+                    "password": password_hash(password),
+                    "elo": DEFAULT_ELO,
+                    "password_reset_required": False,
+                    "state": {"practiced_count": 0},
+                    "session_token": token,
+                    "is_admin": True,
+                }
+            }
+        }
+    )
+    headers = []
+    set_session_cookie(headers, token)
+    return redirect(start_response, "/", headers)
 
-def serve_static_file(path):
-    static_dir = os.path.join(os.path.dirname(__file__), "static")
-    file_path = os.path.join(static_dir, path.lstrip("/"))
 
-    # Security check to prevent directory traversal
-    real_static_dir = os.path.realpath(static_dir)
-    real_file_path = os.path.realpath(file_path)
-    if not real_file_path.startswith(real_static_dir):
-        return None, None
+@route("/login", methods=("POST",), auth="login", material=False)
+def handle_login(environ, start_response, username, user):
+    form = parse_post(environ)
+    name = form.get("name", "").strip()
+    password = form.get("password", "")
 
-    if not os.path.exists(file_path) or not os.path.isfile(file_path):
-        return None, None
+    if not name:
+        body = render_login("名前を入力してください。")
+        return html_response(start_response, body)
 
-    content_type = "application/octet-stream"
-    if file_path.endswith(".jpg") or file_path.endswith(".jpeg"):
-        content_type = "image/jpeg"
-    elif file_path.endswith(".png"):
-        content_type = "image/png"
-    elif file_path.endswith(".gif"):
-        content_type = "image/gif"
-    elif file_path.endswith(".svg"):
-        content_type = "image/svg+xml"
-    elif file_path.endswith(".css"):
-        content_type = "text/css"
-    elif file_path.endswith(".js"):
-        content_type = "application/javascript"
-
-    with open(file_path, "rb") as f:
-        content = f.read()
-
-    return content, content_type
-
-
-def application(environ, start_response):
-    path = environ.get("PATH_INFO", "")
-
-    # Serve static files
-    if path.startswith("/static/"):
-        content, content_type = serve_static_file(path[8:])  # Remove "/static/" prefix
-        if content is not None:
-            start_response("200 OK", [("Content-Type", content_type)])
-            return [content]
-        else:
-            start_response("404 Not Found", [("Content-Type", "text/plain")])
-            return [b"Not Found"]
+    user = load_user(name)
+    if not user:
+        body = render_login("名前またはパスワードが違います。")
+        return html_response(start_response, body)
+
+    if not user.get("password_reset_required") and (
+        not password or not verify_password(password, user.get("password", ""))
+    ):
+        body = render_login("名前またはパスワードが違います。")
+        return html_response(start_response, body)
+
+    user["session_token"] = secrets.token_urlsafe(32)
+    save_users({"users": {name: user}})
+
+    headers = []
+    set_session_cookie(headers, user["session_token"])
+    return redirect(start_response, "/", headers)
+
+
+@route("/set-password", methods=("POST",), auth="reset", material=False)
+def handle_set_password(environ, start_response, username, user):
+    form = parse_post(environ)
+    password = form.get("password", "")
+    confirm_password = form.get("confirm_password", "")
+    if len(password) < 4:
+        body = render_password_setup(username, "4文字以上で入力してください。")
+        return html_response(start_response, body)
+    if password != confirm_password:
+        body = render_password_setup(username, "パスワードが一致しません。")
+        return html_response(start_response, body)
+    saved_user = load_user(username)
+    if saved_user:
+        saved_user["password"] = password_hash(password)
+        saved_user["password_reset_required"] = False
+        save_users({"users": {username: saved_user}})
+    return redirect(start_response, "/")
+
+
+@route("/api/answers", methods=("POST",))
+def handle_answer_batch(environ, start_response, username, user):
+    try:
+        payload = parse_json_body(environ)
+        answers = payload.get("answers") if isinstance(payload, dict) else payload
+        if not isinstance(answers, list):
+            raise ValueError("Expected a list of answers.")
+        if len(answers) > ANSWER_BATCH_MAX:
+            raise ValueError(f"At most {ANSWER_BATCH_MAX} answers per batch.")
+        body = apply_answer_batch(username, answers)
+        status = "200 OK"
+        if body is None:
+            body, status = {"error": "Unknown user."}, "404 Not Found"
+    except (ValueError, UnicodeDecodeError) as exc:
+        body, status = {"error": str(exc)}, "400 Bad Request"
+    start_response(status, [("Content-Type", "application/json; charset=utf-8")])
+    return [json.dumps(body, ensure_ascii=False).encode("utf-8")]
+
+
+@route("/admin", methods=("GET", "POST"), auth="admin", material=False)
+def handle_admin(environ, start_response, username, user):
+    users = load_users()
+    body = render_admin(users)
+    return html_response(start_response, body)
 
-    if path == "/logout":
-        headers = [("Content-Type", "text/html; charset=utf-8")]
-        clear_session_cookie(headers)
-        return redirect(start_response, "/", headers)
 
-    if not has_users():
-        if path == "/setup" and environ.get("REQUEST_METHOD") == "POST":
-            form = parse_post(environ)
-            name = form.get("name", "").strip() or "admin"
-            password = form.get("password", "")
-            confirm_password = form.get("confirm_password", "")
-            if len(password) < 4:
-                body = render_first_admin_setup("4文字以上で入力してください。")
-                start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-                return [body.encode("utf-8")]
-            if password != confirm_password:
-                body = render_first_admin_setup("パスワードが一致しません。")
-                start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-                return [body.encode("utf-8")]
-
-            token = secrets.token_urlsafe(32)
-            save_users(
-                {
-                    "users": {
-                        name: {
-                            "name": name,
-                            "password": password_hash(password),
-                            "elo": DEFAULT_ELO,
-                            "password_reset_required": False,
-                            "state": {"practiced_count": 0},
-                            "session_token": token,
-                            "is_admin": True,
-                        }
-                    }
-                }
+@route("/admin/sentence-scraper/stream", methods=("POST",), auth="admin")
+def handle_scraper_stream(environ, start_response, username, user):
+    form = parse_post(environ)
+    word = form.get("word", "").strip()
+    tense = form.get("tense", "").strip()
+    material_language = scraper_language(form.get("material_language", ""))
+    try:
+        result_limit = int(form.get("result_limit", "20"))
+    except ValueError:
+        result_limit = 20
+    try:
+        min_chars = int(form.get("min_chars", "40"))
+    except ValueError:
+        min_chars = 40
+    try:
+        max_chars = int(form.get("max_chars", "180"))
+    except ValueError:
+        max_chars = 180
+    def stream():
+        try:
+            set_active_material_key(material_language)
+            search_terms = scraper_search_terms(word, tense, material_language)
+            source_urls = expand_source_urls(
+                form.get("sources", "").splitlines(),
+                word,
+                search_terms,
             )
-            headers = []
-            set_session_cookie(headers, token)
-            return redirect(start_response, "/", headers)
-
-        body = render_first_admin_setup()
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
+            for event in iter_scrape_events(
+                search_terms,
+                source_urls,
+                result_limit=result_limit,
+                min_chars=min_chars,
+                max_chars=max_chars,
+            ):
+                yield (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+        except (RuntimeError, ValueError) as exc:
+            yield (json.dumps({"type": "error", "message": str(exc)}, ensure_ascii=False) + "\n").encode("utf-8")
+            report = {
+                "sources": 0,
+                "terms": 0,
+                "result_limit": result_limit,
+                "min_chars": min_chars,
+                "max_chars": max_chars,
+                "visited": 0,
+                "links_found": 0,
+                "sentences_seen": 0,
+                "filtered_by_length": 0,
+                "sentences_checked": 0,
+                "matches": 0,
+                "cancelled": 0,
+                "indexed_sources": 0,
+                "per_url": {},
+                "page_timings": [],
+            }
+            yield (json.dumps({"type": "report", "report": report}, ensure_ascii=False) + "\n").encode("utf-8")
+            yield (json.dumps({"type": "done", "message": "Done. Found 0 results."}, ensure_ascii=False) + "\n").encode("utf-8")
 
-    if path == "/login" and environ.get("REQUEST_METHOD") == "POST":
-        form = parse_post(environ)
-        name = form.get("name", "").strip()
-        password = form.get("password", "")
-        users = load_users()
-
-        if not name:
-            body = render_login("名前を入力してください。")
-            start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-            return [body.encode("utf-8")]
-
-        user = users["users"].get(name)
-        if not user:
-            body = render_login("名前またはパスワードが違います。")
-            start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-            return [body.encode("utf-8")]
-
-        if not user.get("password_reset_required") and (
-            not password or not verify_password(password, user.get("password", ""))
-        ):
-            body = render_login("名前またはパスワードが違います。")
-            start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-            return [body.encode("utf-8")]
+    start_response(
+        "200 OK",
+        [
+            ("Content-Type", "application/x-ndjson; charset=utf-8"),
+            ("Cache-Control", "no-cache"),
+            ("X-Accel-Buffering", "no"),
+        ],
+    )
+    return stream()
 
-        user["session_token"] = secrets.token_urlsafe(32)
-        save_users(users)
 
-        headers = []
-        set_session_cookie(headers, user["session_token"])
-        return redirect(start_response, "/", headers)
+@route("/admin/sentence-scraper/translate", methods=("POST",), auth="admin", forbidden="json")
+def handle_scraper_translate(environ, start_response, username, user):
+    form = parse_post(environ)
+    try:
+        sentences = json.loads(form.get("items", "[]"))
+        translations = translate_sentences_with_openai(
+            sentences,
+            form.get("api_key", ""),
+            form.get("material_language", ""),
+        )
+        body = {"translations": translations}
+    except Exception as exc:
+        body = {"error": str(exc)}
+    start_response("200 OK", [("Content-Type", "application/json; charset=utf-8")])
+    return [json.dumps(body, ensure_ascii=False).encode("utf-8")]
 
-    username, user = current_user(environ)
-    if not user:
-        body = render_login()
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
-    set_active_material_language(user)
 
-    if user.get("password_reset_required"):
-        if path == "/set-password" and environ.get("REQUEST_METHOD") == "POST":
-            form = parse_post(environ)
-            password = form.get("password", "")
-            confirm_password = form.get("confirm_password", "")
-            if len(password) < 4:
-                body = render_password_setup(username, "4文字以上で入力してください。")
-                start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-                return [body.encode("utf-8")]
-            if password != confirm_password:
-                body = render_password_setup(username, "パスワードが一致しません。")
-                start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-                return [body.encode("utf-8")]
-            users = load_users()
-            saved_user = users["users"].get(username)
-            if saved_user:
-                saved_user["password"] = password_hash(password)
-                saved_user["password_reset_required"] = False
-                save_users(users)
-            return redirect(start_response, "/")
-
-        body = render_password_setup(username)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
-
-    if path == "/admin":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
-        users = load_users()
-        body = render_admin(users)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
-
-    if path == "/admin/sentence-scraper/stream" and environ.get("REQUEST_METHOD") == "POST":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
+@route("/admin/sentence-scraper", methods=("GET", "POST"), auth="admin")
+def handle_sentence_scraper(environ, start_response, username, user):
+    if environ.get("REQUEST_METHOD") == "POST":
         form = parse_post(environ)
         word = form.get("word", "").strip()
         tense = form.get("tense", "").strip()
@@ -7419,417 +7620,264 @@ def application(environ, start_response):
             max_chars = int(form.get("max_chars", "180"))
         except ValueError:
             max_chars = 180
-        def stream():
-            try:
-                set_active_material_key(material_language)
-                search_terms = scraper_search_terms(word, tense, material_language)
-                source_urls = expand_source_urls(
-                    form.get("sources", "").splitlines(),
-                    word,
-                    search_terms,
-                )
-                for event in iter_scrape_events(
-                    search_terms,
-                    source_urls,
-                    result_limit=result_limit,
-                    min_chars=min_chars,
-                    max_chars=max_chars,
-                ):
-                    yield (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
-            except (RuntimeError, ValueError) as exc:
-                yield (json.dumps({"type": "error", "message": str(exc)}, ensure_ascii=False) + "\n").encode("utf-8")
-                report = {
-                    "sources": 0,
-                    "terms": 0,
-                    "result_limit": result_limit,
-                    "min_chars": min_chars,
-                    "max_chars": max_chars,
-                    "visited": 0,
-                    "links_found": 0,
-                    "sentences_seen": 0,
-                    "filtered_by_length": 0,
-                    "sentences_checked": 0,
-                    "matches": 0,
-                    "per_url": {},
-                }
-                yield (json.dumps({"type": "report", "report": report}, ensure_ascii=False) + "\n").encode("utf-8")
-                yield (json.dumps({"type": "done", "message": "Done. Found 0 results."}, ensure_ascii=False) + "\n").encode("utf-8")
-
-        start_response(
-            "200 OK",
-            [
-                ("Content-Type", "application/x-ndjson; charset=utf-8"),
-                ("Cache-Control", "no-cache"),
-                ("X-Accel-Buffering", "no"),
-            ],
-        )
-        return stream()
-
-    if path == "/admin/sentence-scraper/translate" and environ.get("REQUEST_METHOD") == "POST":
-        if not user.get("is_admin"):
-            start_response("403 Forbidden", [("Content-Type", "application/json; charset=utf-8")])
-            return [json.dumps({"error": "Forbidden"}).encode("utf-8")]
-        form = parse_post(environ)
+        sources = form.get("sources", "")
         try:
-            sentences = json.loads(form.get("items", "[]"))
-            translations = translate_sentences_with_openai(
-                sentences,
-                form.get("api_key", ""),
-                form.get("material_language", ""),
-            )
-            body = {"translations": translations}
-        except Exception as exc:
-            body = {"error": str(exc)}
-        start_response("200 OK", [("Content-Type", "application/json; charset=utf-8")])
-        return [json.dumps(body, ensure_ascii=False).encode("utf-8")]
-
-    if path == "/admin/sentence-scraper":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
-        if environ.get("REQUEST_METHOD") == "POST":
-            form = parse_post(environ)
-            word = form.get("word", "").strip()
-            tense = form.get("tense", "").strip()
-            material_language = scraper_language(form.get("material_language", ""))
-            try:
-                result_limit = int(form.get("result_limit", "20"))
-            except ValueError:
-                result_limit = 20
-            try:
-                min_chars = int(form.get("min_chars", "40"))
-            except ValueError:
-                min_chars = 40
-            try:
-                max_chars = int(form.get("max_chars", "180"))
-            except ValueError:
-                max_chars = 180
-            sources = form.get("sources", "")
-            try:
-                set_active_material_key(material_language)
-                search_terms = scraper_search_terms(word, tense, material_language)
-                source_urls = expand_source_urls(sources.splitlines(), word, search_terms)
-                results, errors, report = scrape_example_sentences(
-                    search_terms,
-                    source_urls,
-                    result_limit=result_limit,
-                    min_chars=min_chars,
-                    max_chars=max_chars,
-                )
-            except (RuntimeError, ValueError) as exc:
-                results, errors, report = [], [str(exc)], {
-                    "sources": 0,
-                    "terms": 0,
-                    "result_limit": result_limit,
-                    "min_chars": min_chars,
-                    "max_chars": max_chars,
-                }
-            body = render_sentence_scraper(
-                username,
-                user,
-                material_language=material_language,
-                word=word,
-                tense=tense,
-                sources=sources,
+            set_active_material_key(material_language)
+            search_terms = scraper_search_terms(word, tense, material_language)
+            source_urls = expand_source_urls(sources.splitlines(), word, search_terms)
+            results, errors, report = scrape_example_sentences(
+                search_terms,
+                source_urls,
                 result_limit=result_limit,
                 min_chars=min_chars,
                 max_chars=max_chars,
-                results=results,
-                errors=errors,
-                report=report,
             )
-        else:
-            body = render_sentence_scraper(username, user)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
-
-    if path == "/admin/sentence-scraper/create-cloze" and environ.get("REQUEST_METHOD") == "POST":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
-        form = parse_post(environ)
-        material_language = scraper_language(form.get("material_language", ""))
-        set_active_material_key(material_language)
-        ok, text = create_cloze_from_phrase(
-            form.get("phrase", ""),
-            form.get("answer", ""),
-            form.get("translation", ""),
-        )
+        except (RuntimeError, ValueError) as exc:
+            results, errors, report = [], [str(exc)], {
+                "sources": 0,
+                "terms": 0,
+                "result_limit": result_limit,
+                "min_chars": min_chars,
+                "max_chars": max_chars,
+            }
         body = render_sentence_scraper(
             username,
             user,
             material_language=material_language,
-            message=text if ok else "",
-            errors=[] if ok else [text],
+            word=word,
+            tense=tense,
+            sources=sources,
+            result_limit=result_limit,
+            min_chars=min_chars,
+            max_chars=max_chars,
+            results=results,
+            errors=errors,
+            report=report,
         )
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
+    else:
+        body = render_sentence_scraper(username, user)
+    return html_response(start_response, body)
+
+
+@route("/admin/sentence-scraper/create-cloze", methods=("POST",), auth="admin")
+def handle_scraper_create_cloze(environ, start_response, username, user):
+    form = parse_post(environ)
+    material_language = scraper_language(form.get("material_language", ""))
+    set_active_material_key(material_language)
+    ok, text = create_cloze_from_phrase(
+        form.get("phrase", ""),
+        form.get("answer", ""),
+        form.get("translation", ""),
+    )
+    body = render_sentence_scraper(
+        username,
+        user,
+        material_language=material_language,
+        message=text if ok else "",
+        errors=[] if ok else [text],
+    )
+    return html_response(start_response, body)
 
-    if path == "/admin/sentence-scraper/create-cloze-batch" and environ.get("REQUEST_METHOD") == "POST":
-        if not user.get("is_admin"):
-            start_response("403 Forbidden", [("Content-Type", "application/json; charset=utf-8")])
-            return [json.dumps({"error": "Forbidden"}).encode("utf-8")]
-        form = parse_post(environ)
-        try:
-            material_language = scraper_language(form.get("material_language", ""))
-            set_active_material_key(material_language)
-            items = json.loads(form.get("items", "[]"))
-            if not isinstance(items, list):
-                raise ValueError("Invalid card list.")
-            results = []
-            created = 0
-            for item in items[:SCRAPER_MAX_SENTENCES]:
-                if not isinstance(item, dict):
-                    results.append({"ok": False, "error": "Invalid selected item."})
-                    continue
-                ok, text = create_cloze_from_phrase(
-                    str(item.get("phrase", "")),
-                    str(item.get("answer", "")),
-                    str(item.get("translation", "")),
-                )
-                if ok:
-                    created += 1
-                    results.append({"ok": True})
-                else:
-                    results.append({"ok": False, "error": text})
-            body = {
-                "created": created,
-                "skipped": max(0, len(items[:SCRAPER_MAX_SENTENCES]) - created),
-                "results": results,
-            }
-        except Exception as exc:
-            body = {"error": str(exc)}
-        start_response("200 OK", [("Content-Type", "application/json; charset=utf-8")])
-        return [json.dumps(body, ensure_ascii=False).encode("utf-8")]
-
-    if path == "/admin/content":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
-        query = parse_qs(environ.get("QUERY_STRING", ""))
-        active_tab = (query.get("tab") or ["review"])[0]
-        body = render_content_admin(load_pending_content(), active_tab=active_tab)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
-
-    if path == "/admin/content/import-tense" and environ.get("REQUEST_METHOD") == "POST":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
-        form = parse_post(environ)
-        ok, text = import_verbecc_verb_tense(
-            form.get("infinitive", ""),
-            form.get("ja", ""),
-            form.get("tense", "presente"),
-        )
-        if ok:
-            body = render_content_admin(message=text, active_tab="tenses")
-        else:
-            body = render_content_admin(error=text, active_tab="tenses")
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
 
-    if path == "/admin/content/approve" and environ.get("REQUEST_METHOD") == "POST":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
-        form = parse_post(environ)
-        content_id = form.get("id", "")
-        message = ""
-        error = ""
-        with get_db() as conn:
-            row = conn.execute(
-                """
-                SELECT id, content_type, payload_json
-                FROM pending_content
-                WHERE id = ? AND status = 'pending'
-                """,
-                (content_id,),
-            ).fetchone()
-            if not row:
-                error = "候補が見つかりません。"
+@route("/admin/sentence-scraper/create-cloze-batch", methods=("POST",), auth="admin", forbidden="json")
+def handle_scraper_create_cloze_batch(environ, start_response, username, user):
+    form = parse_post(environ)
+    try:
+        material_language = scraper_language(form.get("material_language", ""))
+        set_active_material_key(material_language)
+        items = json.loads(form.get("items", "[]"))
+        if not isinstance(items, list):
+            raise ValueError("Invalid card list.")
+        results = []
+        created = 0
+        for item in items[:SCRAPER_MAX_SENTENCES]:
+            if not isinstance(item, dict):
+                results.append({"ok": False, "error": "Invalid selected item."})
+                continue
+            ok, text = create_cloze_from_phrase(
+                str(item.get("phrase", "")),
+                str(item.get("answer", "")),
+                str(item.get("translation", "")),
+            )
+            if ok:
+                created += 1
+                results.append({"ok": True})
             else:
-                ok, text = approve_pending_content(conn, row, username)
-                if ok:
-                    message = text
-                else:
-                    error = text
-        body = render_content_admin(message=message, error=error)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
-
-    if path == "/admin/content/approve" and environ.get("REQUEST_METHOD") == "POST":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
-        form = parse_post(environ)
-        content_id = form.get("id", "")
-        message = "承認しました。"
-        error = ""
-        with get_db() as conn:
-            row = conn.execute(
-                """
-                SELECT id, content_type, payload_json
-                FROM pending_content
-                WHERE id = ? AND status = 'pending'
-                """,
-                (content_id,),
-            ).fetchone()
-            if not row:
-                error = "候補が見つかりません。"
-                message = ""
+                results.append({"ok": False, "error": text})
+        body = {
+            "created": created,
+            "skipped": max(0, len(items[:SCRAPER_MAX_SENTENCES]) - created),
+            "results": results,
+        }
+    except Exception as exc:
+        body = {"error": str(exc)}
+    start_response("200 OK", [("Content-Type", "application/json; charset=utf-8")])
+    return [json.dumps(body, ensure_ascii=False).encode("utf-8")]
+
+
+@route("/admin/content", methods=("GET", "POST"), auth="admin")
+def handle_content_admin(environ, start_response, username, user):
+    query = parse_qs(environ.get("QUERY_STRING", ""))
+    active_tab = (query.get("tab") or ["review"])[0]
+    body = render_content_admin(load_pending_content(), active_tab=active_tab)
+    return html_response(start_response, body)
+
+
+@route("/admin/content/import-tense", methods=("POST",), auth="admin")
+def handle_import_tense(environ, start_response, username, user):
+    form = parse_post(environ)
+    ok, text = import_verbecc_verb_tense(
+        form.get("infinitive", ""),
+        form.get("ja", ""),
+        form.get("tense", "presente"),
+    )
+    if ok:
+        body = render_content_admin(message=text, active_tab="tenses")
+    else:
+        body = render_content_admin(error=text, active_tab="tenses")
+    return html_response(start_response, body)
+
+
+@route("/admin/content/approve", methods=("POST",), auth="admin")
+def handle_approve_content(environ, start_response, username, user):
+    form = parse_post(environ)
+    content_id = form.get("id", "")
+    message = ""
+    error = ""
+    with get_db() as conn:
+        row = conn.execute(
+            """
+            SELECT id, content_type, payload_json
+            FROM pending_content
+            WHERE id = ? AND status = 'pending'
+            """,
+            (content_id,),
+        ).fetchone()
+        if not row:
+            error = "候補が見つかりません。"
+        else:
+            ok, text = approve_pending_content(conn, row, username)
+            if ok:
+                message = text
             else:
-                payload = json.loads(row["payload_json"])
-                if row["content_type"] == "cloze":
-                    conn.execute(
-                        """
-                        INSERT OR IGNORE INTO cloze_questions
-                            (sentence, answer, translation, elo, active, status, is_new)
-                        VALUES (?, ?, ?, ?, 1, 'approved', 1)
-                        """,
-                        (
-                            payload.get("sentence", ""),
-                            payload.get("answer", ""),
-                            payload.get("translation", ""),
-                            DEFAULT_ELO,
-                        ),
-                    )
-                    conn.execute(
-                        """
-                        UPDATE pending_content
-                        SET status = 'approved',
-                            reviewed_by = ?,
-                            reviewed_at = CURRENT_TIMESTAMP
-                        WHERE id = ?
-                        """,
-                        (username, content_id),
-                    )
-                else:
-                    error = "未対応の種類です。"
-                    message = ""
-        body = render_content_admin(load_pending_content(), message=message, error=error)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
-
-    if path == "/admin/content/reject" and environ.get("REQUEST_METHOD") == "POST":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
-        form = parse_post(environ)
-        content_id = form.get("id", "")
-        with get_db() as conn:
-            conn.execute(
-                """
-                UPDATE pending_content
-                SET status = 'rejected',
-                    reviewed_by = ?,
-                    reviewed_at = CURRENT_TIMESTAMP
-                WHERE id = ? AND status = 'pending'
-                """,
-                (username, content_id),
-            )
-        body = render_content_admin(
-            load_pending_content(), message="候補を却下しました。"
+                error = text
+    if message:
+        # Approving a flashcard or verb form may create or rename a verb that
+        # cards of the other kind share.
+        if row["content_type"] == "cloze":
+            invalidate_card_index("cloze")
+        else:
+            invalidate_card_index("flashcard", "verb_form")
+    body = render_content_admin(message=message, error=error)
+    return html_response(start_response, body)
+
+
+@route("/admin/content/reject", methods=("POST",), auth="admin")
+def handle_reject_content(environ, start_response, username, user):
+    form = parse_post(environ)
+    content_id = form.get("id", "")
+    with get_db() as conn:
+        conn.execute(
+            """
+            UPDATE pending_content
+            SET status = 'rejected',
+                reviewed_by = ?,
+                reviewed_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'pending'
+            """,
+            (username, content_id),
         )
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
+    body = render_content_admin(
+        load_pending_content(), message="候補を却下しました。"
+    )
+    return html_response(start_response, body)
 
-    if path == "/admin/content/edit" and environ.get("REQUEST_METHOD") == "POST":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
-        form = parse_post(environ)
-        if update_approved_card(form):
-            body = render_content_admin(message="カードを更新しました。")
-        else:
-            body = render_content_admin(error="カードを更新できませんでした。")
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
 
-    if path == "/admin/content/delete" and environ.get("REQUEST_METHOD") == "POST":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
-        form = parse_post(environ)
-        if delete_approved_card(form):
-            body = render_content_admin(message="カードを削除しました。")
-        else:
-            body = render_content_admin(error="カードを削除できませんでした。")
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
+@route("/admin/content/edit", methods=("POST",), auth="admin")
+def handle_edit_card(environ, start_response, username, user):
+    form = parse_post(environ)
+    if update_approved_card(form):
+        refresh_card_index_after_admin_change(form, edited=True)
+        body = render_content_admin(message="カードを更新しました。")
+    else:
+        body = render_content_admin(error="カードを更新できませんでした。")
+    return html_response(start_response, body)
 
-    if path == "/admin/content/reset-elo" and environ.get("REQUEST_METHOD") == "POST":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
-        form = parse_post(environ)
-        if reset_approved_card_elo(form):
-            body = render_content_admin(message="ELOをリセットしました。")
-        else:
-            body = render_content_admin(error="ELOをリセットできませんでした。")
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
 
-    if path == "/admin/create-user" and environ.get("REQUEST_METHOD") == "POST":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
-        form = parse_post(environ)
-        name = form.get("name", "").strip()
-        users = load_users()
-        if not name:
-            body = render_admin(users, error="ユーザー名を入力してください。")
-        elif name in users["users"]:
-            body = render_admin(users, error="そのユーザーはすでに存在します。")
-        else:
-            users["users"][name] = {
-                "name": name,
-                "password": "",
-                "elo": DEFAULT_ELO,
-                "password_reset_required": True,
-                "state": {"practiced_count": 0},
-                "session_token": "",
-                "is_admin": False,
-            }
-            save_users(users)
-            body = render_admin(users, message=f"{name}を作成しました。")
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
-
-    if path == "/admin/reset-password" and environ.get("REQUEST_METHOD") == "POST":
-        if not user.get("is_admin"):
-            return redirect(start_response, "/")
-        form = parse_post(environ)
-        name = form.get("name", "").strip()
-        users = load_users()
-        target = users["users"].get(name)
-        if not target:
-            body = render_admin(users, error="ユーザーが見つかりません。")
-        elif target.get("is_admin"):
-            body = render_admin(users, error="管理者のパスワードはここではリセットできません。")
-        else:
-            target["password"] = ""
-            target["password_reset_required"] = True
-            target["session_token"] = ""
-            save_users(users)
-            body = render_admin(users, message=f"{name}のパスワードをリセットしました。")
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
-
-    if path in ("", "/"):
-        body = render_menu(username, user)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
-
-    if path == "/settings":
-        if environ.get("REQUEST_METHOD") == "POST":
-            form = parse_post(environ)
-            update_daily_settings(
-                username,
-                form.get("daily_target", DEFAULT_DAILY_TARGET),
-                form.get("daily_vacation_mode") == "1",
-                form.get("study_language"),
-            )
-            return redirect(start_response, "/settings")
-        body = render_settings(username, user)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
+@route("/admin/content/delete", methods=("POST",), auth="admin")
+def handle_delete_card(environ, start_response, username, user):
+    form = parse_post(environ)
+    if delete_approved_card(form):
+        refresh_card_index_after_admin_change(form)
+        body = render_content_admin(message="カードを削除しました。")
+    else:
+        body = render_content_admin(error="カードを削除できませんでした。")
+    return html_response(start_response, body)
+
+
+@route("/admin/content/reset-elo", methods=("POST",), auth="admin")
+def handle_reset_card_elo(environ, start_response, username, user):
+    form = parse_post(environ)
+    if reset_approved_card_elo(form):
+        refresh_card_index_after_admin_change(form)
+        body = render_content_admin(message="ELOをリセットしました。")
+    else:
+        body = render_content_admin(error="ELOをリセットできませんでした。")
+    return html_response(start_response, body)
+
+
+@route("/admin/create-user", methods=("POST",), auth="admin", material=False)
+def handle_create_user(environ, start_response, username, user):
+    form = parse_post(environ)
+    name = form.get("name", "").strip()
+    users = load_users()
+    if not name:
+        body = render_admin(users, error="ユーザー名を入力してください。")
+    elif name in users["users"]:
+        body = render_admin(users, error="そのユーザーはすでに存在します。")
+    else:
+        users["users"][name] = {
+            "name": name,
+            "password": "",
+            "elo": DEFAULT_ELO,
+            "password_reset_required": True,
+            "state": {"practiced_count": 0},
+            "session_token": "",
+            "is_admin": False,
+        }
+        save_users(users)
+        body = render_admin(users, message=f"{name}を作成しました。")
+    return html_response(start_response, body)
+
+
+@route("/admin/reset-password", methods=("POST",), auth="admin", material=False)
+def handle_reset_password(environ, start_response, username, user):
+    form = parse_post(environ)
+    name = form.get("name", "").strip()
+    users = load_users()
+    target = users["users"].get(name)
+    if not target:
+        body = render_admin(users, error="ユーザーが見つかりません。")
+    elif target.get("is_admin"):
+        body = render_admin(users, error="管理者のパスワードはここではリセットできません。")
+    else:
+        target["password"] = ""
+        target["password_reset_required"] = True
+        target["session_token"] = ""
+        save_users(users)
+        body = render_admin(users, message=f"{name}のパスワードをリセットしました。")
+    return html_response(start_response, body)
 
-    if path == "/licenses":
-        body = render_licenses(username, user)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
 
-    if path == "/daily/settings" and environ.get("REQUEST_METHOD") == "POST":
+@route("/", methods=("GET", "POST"))
+def handle_menu(environ, start_response, username, user):
+    body = render_menu(username, user)
+    return html_response(start_response, body)
+
+
+@route("/settings", methods=("GET", "POST"))
+def handle_settings(environ, start_response, username, user):
+    if environ.get("REQUEST_METHOD") == "POST":
         form = parse_post(environ)
         update_daily_settings(
             username,
@@ -7837,142 +7885,165 @@ def application(environ, start_response):
             form.get("daily_vacation_mode") == "1",
             form.get("study_language"),
         )
-        return redirect(start_response, "/")
+        return redirect(start_response, "/settings")
+    body = render_settings(username, user)
+    return html_response(start_response, body)
 
-    if path == "/daily":
-        result = None
-        finished = False
-        streak = None
-        if daily_completed_today(user):
-            body = render_daily(username, user, {"total": 1, "index": 1, "items": []}, finished=True)
-            start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-            return [body.encode("utf-8")]
-        if environ.get("REQUEST_METHOD") == "POST":
-            form = parse_post(environ)
-            state = decode_daily_state(form.get("state", ""))
-            if not state or not state.get("items"):
-                return redirect(start_response, "/daily")
-            index = int(state.get("index", 0))
-            if index >= len(state["items"]):
-                streak = complete_daily(username)
-                clear_saved_daily_state(username)
-                user = load_users()["users"].get(username, user)
-                body = render_daily(username, user, state, finished=True, streak=streak)
-                start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-                return [body.encode("utf-8")]
-
-            item = state["items"][index]
-            raw_answer = form.get("answer", "")
-            if item["game"] == "flashcard":
-                correct_answer = item["translation"]
-                ok = raw_answer == correct_answer
-                game = "flashcard"
-                update_function = update_elo
-            elif item["game"] == "cloze":
-                correct_answer = normalize_answer(item["answer"])
-                ok = answers_match(raw_answer, item["answer"])
-                game = "cloze"
-                update_function = update_cloze_elo
-            else:
-                correct_answer = normalize_answer(item["answer"])
-                ok = answers_match(raw_answer, item["answer"])
-                game = "verb_form"
-                update_function = update_elo
-
-            question_id = item.get("question_id", "")
-            if question_id:
-                if update_function == update_cloze_elo:
-                    update_function(username, int(question_id), ok)
-                else:
-                    update_function(username, int(question_id), ok, game)
 
-            state["history"].append(
-                {
-                    "game": item["game"],
-                    "ok": ok,
-                    "answer": correct_answer,
-                }
-            )
-            state["index"] = index + 1
-            user = increment_practiced_count(username) or user
-            result = {"ok": ok, "answer": correct_answer}
-
-            if state["index"] >= len(state["items"]):
-                finished = True
-                streak = complete_daily(username)
-                clear_saved_daily_state(username)
-                user = load_users()["users"].get(username, user)
+@route("/licenses", methods=("GET", "POST"))
+def handle_licenses(environ, start_response, username, user):
+    body = render_licenses(username, user)
+    return html_response(start_response, body)
+
+
+@route("/daily/settings", methods=("POST",))
+def handle_daily_settings(environ, start_response, username, user):
+    form = parse_post(environ)
+    update_daily_settings(
+        username,
+        form.get("daily_target", DEFAULT_DAILY_TARGET),
+        form.get("daily_vacation_mode") == "1",
+        form.get("study_language"),
+    )
+    return redirect(start_response, "/")
+
+
+@route("/daily", methods=("GET", "POST"))
+def handle_daily(environ, start_response, username, user):
+    result = None
+    finished = False
+    streak = None
+    if daily_completed_today(user):
+        body = render_daily(username, user, {"total": 1, "index": 1, "items": []}, finished=True)
+        return html_response(start_response, body)
+    if environ.get("REQUEST_METHOD") == "POST":
+        form = parse_post(environ)
+        state = decode_daily_state(form.get("state", ""))
+        if not state or not state.get("items"):
+            return redirect(start_response, "/daily")
+        index = int(state.get("index", 0))
+        if index >= len(state["items"]):
+            streak = complete_daily(username)
+            clear_saved_daily_state(username)
+            user = load_user(username) or user
+            body = render_daily(username, user, state, finished=True, streak=streak)
+            return html_response(start_response, body)
+
+        item = state["items"][index]
+        raw_answer = form.get("answer", "")
+        if item["game"] == "flashcard":
+            correct_answer = item["translation"]
+            ok = raw_answer == correct_answer
+            game = "flashcard"
+            update_function = update_elo
+        elif item["game"] == "cloze":
+            correct_answer = normalize_answer(item["answer"])
+            ok = answers_match(raw_answer, item["answer"])
+            game = "cloze"
+            update_function = update_cloze_elo
+        else:
+            correct_answer = normalize_answer(item["answer"])
+            ok = answers_match(raw_answer, item["answer"])
+            game = "verb_form"
+            update_function = update_elo
+
+        question_id = item.get("question_id", "")
+        if question_id:
+            if update_function == update_cloze_elo:
+                update_function(username, int(question_id), ok)
             else:
-                save_daily_state(username, state)
+                update_function(username, int(question_id), ok, game)
+
+        state["history"].append(
+            {
+                "game": item["game"],
+                "ok": ok,
+                "answer": correct_answer,
+            }
+        )
+        state["index"] = index + 1
+        user = increment_practiced_count(username) or user
+        result = {"ok": ok, "answer": correct_answer}
+
+        if state["index"] >= len(state["items"]):
+            finished = True
+            streak = complete_daily(username)
+            clear_saved_daily_state(username)
+            user = load_user(username) or user
         else:
-            state = load_saved_daily_state(username)
-            if not state:
-                state = build_daily_state(user)
-                save_daily_state(username, state)
+            save_daily_state(username, state)
+    else:
+        state = load_saved_daily_state(username)
+        if not state:
+            state = build_daily_state(user)
+            save_daily_state(username, state)
+
+    body = render_daily(
+        username,
+        user,
+        state,
+        result=result,
+        finished=finished,
+        streak=streak,
+    )
+    return html_response(start_response, body)
+
 
-        body = render_daily(
+@route("/flashcards", methods=("GET", "POST"))
+def handle_flashcards(environ, start_response, username, user):
+    if environ.get("REQUEST_METHOD") == "POST":
+        form = parse_post(environ)
+        choice = form.get("choice", "")
+        answer = form.get("answer", "")
+        question_id = form.get("question_id", "")
+        ok = choice == answer
+        elo_result = None
+        if question_id:
+            elo_result = update_elo(username, int(question_id), ok, "flashcard")
+        user = increment_practiced_count(username) or user
+        card, options = pick_flashcard(user)
+        body = render_flashcards(
             username,
             user,
-            state,
-            result=result,
-            finished=finished,
-            streak=streak,
+            card,
+            options,
+            result={"ok": ok, "answer": answer, "elo": elo_result},
         )
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
-
-    if path == "/flashcards":
-        if environ.get("REQUEST_METHOD") == "POST":
-            form = parse_post(environ)
-            choice = form.get("choice", "")
-            answer = form.get("answer", "")
-            question_id = form.get("question_id", "")
-            ok = choice == answer
-            elo_result = None
-            if question_id:
-                elo_result = update_elo(username, int(question_id), ok, "flashcard")
-            user = increment_practiced_count(username) or user
-            card, options = pick_flashcard(user)
-            body = render_flashcards(
-                username,
-                user,
-                card,
-                options,
-                result={"ok": ok, "answer": answer, "elo": elo_result},
-            )
-        else:
-            card, options = pick_flashcard(user)
-            body = render_flashcards(username, user, card, options)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
-
-    if path == "/cloze":
-        if environ.get("REQUEST_METHOD") == "POST":
-            form = parse_post(environ)
-            user_answer = normalize_answer(form.get("answer", ""))
-            correct_answer = normalize_answer(form.get("correct_answer", ""))
-            question_id = form.get("question_id", "")
-            ok = answers_match(user_answer, correct_answer)
-            if question_id:
-                update_cloze_elo(username, int(question_id), ok)
-            user = increment_practiced_count(username) or user
-            question = pick_cloze_question(user)
-            body = render_cloze(
-                username,
-                user,
-                question,
-                result={"ok": ok, "answer": correct_answer},
-            )
-        else:
-            question = pick_cloze_question(user)
-            body = render_cloze(username, user, question)
-        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-        return [body.encode("utf-8")]
+    else:
+        card, options = pick_flashcard(user)
+        body = render_flashcards(username, user, card, options)
+    return html_response(start_response, body)
 
-    if path.startswith("/verbs") and not STUDY_LANGUAGES[study_language(user)].get("verb_enabled"):
-        return redirect(start_response, "/")
 
-    if path == "/verbs" and environ.get("REQUEST_METHOD") == "POST":
+@route("/cloze", methods=("GET", "POST"))
+def handle_cloze(environ, start_response, username, user):
+    if environ.get("REQUEST_METHOD") == "POST":
+        form = parse_post(environ)
+        user_answer = normalize_answer(form.get("answer", ""))
+        correct_answer = normalize_answer(form.get("correct_answer", ""))
+        question_id = form.get("question_id", "")
+        ok = answers_match(user_answer, correct_answer)
+        if question_id:
+            update_cloze_elo(username, int(question_id), ok)
+        user = increment_practiced_count(username) or user
+        question = pick_cloze_question(user)
+        body = render_cloze(
+            username,
+            user,
+            question,
+            result={"ok": ok, "answer": correct_answer},
+        )
+    else:
+        question = pick_cloze_question(user)
+        body = render_cloze(username, user, question)
+    return html_response(start_response, body)
+
+
+@route("/verbs", methods=("GET", "POST"))
+def handle_verbs(environ, start_response, username, user):
+    if not STUDY_LANGUAGES[study_language(user)].get("verb_enabled"):
+        return redirect(start_response, "/")
+    if environ.get("REQUEST_METHOD") == "POST":
         form = parse_post(environ)
         state = decode_state(form.get("state", ""))
         user_answer = normalize_answer(form.get("user_answer", ""))
@@ -8007,7 +8078,7 @@ def application(environ, start_response):
             is_admin=user.get("is_admin", False),
             finished=finished,
         )
-    elif path == "/verbs":
+    else:
         state = {"count": 0, "history": []}
         question = pick_question(user)
         count = practiced_count(user)
@@ -8020,16 +8091,314 @@ def application(environ, start_response):
             is_admin=user.get("is_admin", False),
             finished=False,
         )
-    else:
-        return redirect(start_response, "/")
+    return html_response(start_response, body)
+
+
+def handle_not_found(environ, start_response, username, user):
+    return redirect(start_response, "/")
+
+
+NOT_FOUND_ROUTE = {
+    "name": "not_found",
+    "handler": handle_not_found,
+    "auth": "user",
+    "material": False,
+    "forbidden": "redirect",
+}
+
+
+def find_route(method, path):
+    entry = ROUTES.get(("GET" if method == "HEAD" else method, path or "/"))
+    if entry is not None:
+        return entry
+    for prefix, entry in ROUTE_PREFIXES:
+        if path.startswith(prefix):
+            return entry
+    return NOT_FOUND_ROUTE
+
+
+def forbidden_response(entry, start_response):
+    if entry["forbidden"] == "json":
+        start_response("403 Forbidden", [("Content-Type", "application/json; charset=utf-8")])
+        return [json.dumps({"error": "Forbidden"}).encode("utf-8")]
+    return redirect(start_response, "/")
+
+
+def run_route(entry, environ, start_response):
+    auth = entry["auth"]
+    if auth == "public":
+        return entry["handler"](environ, start_response, "", None)
+    if not has_users():
+        if auth == "bootstrap":
+            return entry["handler"](environ, start_response, "", None)
+        return html_response(start_response, render_first_admin_setup())
+    if auth == "bootstrap":
+        entry, auth = NOT_FOUND_ROUTE, NOT_FOUND_ROUTE["auth"]
+    if auth == "login":
+        return entry["handler"](environ, start_response, "", None)
+    username, user = current_user(environ)
+    if not user:
+        return html_response(start_response, render_login())
+    if entry["material"]:
+        set_active_material_language(user)
+    if user.get("password_reset_required"):
+        if auth == "reset":
+            return entry["handler"](environ, start_response, username, user)
+        return html_response(start_response, render_password_setup(username))
+    if auth == "reset":
+        entry = NOT_FOUND_ROUTE
+    if auth == "admin" and not user.get("is_admin"):
+        return forbidden_response(entry, start_response)
+    return entry["handler"](environ, start_response, username, user)
+
+
+def record_route_timing(name, elapsed):
+    with ROUTE_STATS_LOCK:
+        stats = ROUTE_STATS.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["count"] += 1
+        stats["total_ms"] += elapsed * 1000
+        stats["max_ms"] = max(stats["max_ms"], elapsed * 1000)
+
+
+def route_stats():
+    with ROUTE_STATS_LOCK:
+        return {
+            name: dict(stats, mean_ms=stats["total_ms"] / stats["count"])
+            for name, stats in ROUTE_STATS.items()
+        }
+
+
+def handle_request(environ, start_response):
+    entry = find_route(environ.get("REQUEST_METHOD", "GET"), environ.get("PATH_INFO", ""))
+    started = time.perf_counter()
+    try:
+        return run_route(entry, environ, start_response)
+    finally:
+        # Streaming responses are timed until their iterator is returned.
+        record_route_timing(entry["name"], time.perf_counter() - started)
+
+
+def available_encodings():
+    # In order of preference.
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate_encoding(accept_encoding):
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            weights[name.strip()] = quality
+    best, best_quality = None, 0.0
+    for encoding in available_encodings():
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class ResponseCompressor:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self.compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVELS["zstd"]).compressobj()
+        elif encoding == "br":
+            self.compressor = brotli.Compressor(quality=COMPRESSION_LEVELS["br"])
+        else:
+            self.compressor = zlib.compressobj(COMPRESSION_LEVELS["gzip"], zlib.DEFLATED, 31)
+
+    def compress(self, data, flush=False):
+        # flush=True pushes out everything written so far, so a streamed
+        # NDJSON line reaches the client without waiting for the next one.
+        if self.encoding == "br":
+            out = self.compressor.process(data)
+            return out + self.compressor.flush() if flush else out
+        out = self.compressor.compress(data)
+        if not flush:
+            return out
+        if self.encoding == "zstd":
+            return out + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return out + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+def compress_body(encoding, body, etag=None):
+    # Static assets carry an ETag, so their compressed form is reused.
+    key = (etag, encoding) if etag else None
+    if key:
+        with COMPRESSION_CACHE_LOCK:
+            cached = COMPRESSION_CACHE.get(key)
+            if cached is not None:
+                COMPRESSION_CACHE.move_to_end(key)
+                return cached
+    compressor = ResponseCompressor(encoding)
+    compressed = compressor.compress(body) + compressor.finish()
+    if key:
+        with COMPRESSION_CACHE_LOCK:
+            COMPRESSION_CACHE[key] = compressed
+            while len(COMPRESSION_CACHE) > COMPRESSION_CACHE_MAX_ENTRIES:
+                COMPRESSION_CACHE.popitem(last=False)
+    return compressed
+
+
+def compress_stream(encoding, result):
+    compressor = ResponseCompressor(encoding)
+    try:
+        for chunk in result:
+            if chunk:
+                out = compressor.compress(chunk, flush=True)
+                if out:
+                    yield out
+        yield compressor.finish()
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+
+
+def header_value(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def compressed_headers(headers, encoding, length=None):
+    # Each encoding is a different byte representation, so it gets its own
+    # strong validator.
+    vary = header_value(headers, "Vary")
+    etag = header_value(headers, "ETag")
+    headers = [
+        (key, value)
+        for key, value in headers
+        if key.lower() not in ("content-length", "vary", "etag")
+    ]
+    if etag:
+        headers.append(("ETag", encoded_etag(etag, encoding)))
+    headers.append(("Content-Encoding", encoding))
+    headers.append(("Vary", f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"))
+    if length is not None:
+        headers.append(("Content-Length", str(length)))
+    return headers
+
 
-    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-    return [body.encode("utf-8")]
+def compress_responses(app):
+    # Compresses text responses for clients that accept it. Lists of bytes
+    # are compressed whole (skipped below COMPRESSION_MIN_BYTES); any other
+    # iterable is treated as a stream and flushed chunk by chunk, except
+    # wsgi.file_wrapper responses, which are passed through so the server
+    # can still use sendfile().
+    def middleware(environ, start_response):
+        encoding = negotiate_encoding(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None or environ.get("REQUEST_METHOD") == "HEAD":
+            return app(environ, start_response)
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            # Every route calls start_response before returning its body.
+            captured.update(status=status, headers=headers, exc_info=exc_info)
+
+        result = app(environ, capture)
+        status, headers = captured["status"], captured["headers"]
+        content_type = header_value(headers, "Content-Type") or ""
+        etag = header_value(headers, "ETag")
+        if status.startswith("304") and etag:
+            # Answer a revalidation of the encoded copy with its own ETag.
+            encoded = encoded_etag(etag, encoding)
+            if encoded in environ.get("HTTP_IF_NONE_MATCH", ""):
+                headers = [(key, value) for key, value in headers if key.lower() != "etag"]
+                headers += [("ETag", encoded), ("Vary", "Accept-Encoding")]
+                start_response(status, headers, captured["exc_info"])
+                return result
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if (
+            not status.startswith("200")
+            or header_value(headers, "Content-Encoding")
+            or not content_type.startswith(COMPRESSIBLE_TYPES)
+            or (isinstance(file_wrapper, type) and isinstance(result, file_wrapper))
+        ):
+            start_response(status, headers, captured["exc_info"])
+            return result
+        if not isinstance(result, (list, tuple)):
+            start_response(status, compressed_headers(headers, encoding), captured["exc_info"])
+            return compress_stream(encoding, result)
+        body = b"".join(result)
+        if hasattr(result, "close"):
+            result.close()
+        if len(body) < COMPRESSION_MIN_BYTES:
+            start_response(status, headers, captured["exc_info"])
+            return [body]
+        compressed = compress_body(encoding, body, etag)
+        start_response(status, compressed_headers(headers, encoding, len(compressed)), captured["exc_info"])
+        return [compressed]
+
+    return middleware
+
+
+def warmup():
+    # Builds the process-level caches a first request would otherwise pay
+    # for. Safe to call again; everything it touches is cached. Connections
+    # opened here belong to this process, so a preloading master must reset
+    # the "db_pool" cache before forking.
+    with startup_step("warmup"):
+        with startup_step("schema"):
+            init_db(DB_PATH)
+            for path in MATERIAL_DB_PATHS.values():
+                init_db(path)
+            has_users()
+        for language, path in MATERIAL_DB_PATHS.items():
+            for kind in CARD_INDEX_QUERIES:
+                with startup_step(f"card_index {language} {kind}"):
+                    card_index(kind, path)
+        with startup_step("fallback_verbs"):
+            fallback_verbs()
+        with startup_step("static_files"):
+            for root, _, names in os.walk(STATIC_DIR):
+                for name in names:
+                    static_file_entry(os.path.relpath(os.path.join(root, name), STATIC_DIR))
+        with startup_step("verbecc"):
+            try:
+                get_verbecc_conjugator()
+            except RuntimeError as exc:
+                LOGGER.warning("Skipping Verbecc warmup: %s", exc)
+    return startup_report()
+
+
+application = compress_responses(handle_request)
+STARTUP_TIMINGS.insert(
+    0,
+    {
+        "step": "app module",
+        "depth": 0,
+        "self_ms": (time.perf_counter() - IMPORT_STARTED) * 1000,
+        "total_ms": (time.perf_counter() - IMPORT_STARTED) * 1000,
+    },
+)
 
 
 if __name__ == "__main__":
     from wsgiref.simple_server import make_server
 
+    logging.basicConfig(level=logging.INFO)
+    check_storage_settings()
+    warmup()
     with make_server("0.0.0.0", 8000, application) as httpd:
         print("Serving on http://127.0.0.1:8000")
         httpd.serve_forever()
@@ -0,0 +1,253 @@
+import atexit
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Benchmarks run against scratch copies of the databases, never data/.
+BENCH_DIR = tempfile.mkdtemp(prefix="verbi-bench-")
+atexit.register(shutil.rmtree, BENCH_DIR, True)
+os.environ["VERBI_DB_PATH"] = os.path.join(BENCH_DIR, "runtime.db")
+
+import app  # noqa: E402
+
+
+def scratch_material_db(language="it_ja"):
+    path = os.path.join(BENCH_DIR, os.path.basename(app.MATERIAL_DB_PATHS[language]))
+    if not os.path.exists(path):
+        shutil.copyfile(app.MATERIAL_DB_PATHS[language], path)
+    app.MATERIAL_DB_PATHS[language] = path
+    app.ACTIVE_MATERIAL_DB.set(path)
+    app.reset_process_caches()
+    return path
+
+
+def timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def sql_pick(user, kind, excluded_uids):
+    # Control: the query-per-pick path the card index replaced. Every pick
+    # re-reads the whole pool and the user's seen set from SQLite.
+    force_new = random.random() < app.NEW_CONTENT_CHANCE
+    with app.get_db() as conn:
+        rows = conn.execute(app.CARD_INDEX_QUERIES[kind]).fetchall()
+    with app.get_runtime_db() as conn:
+        seen = {
+            row["card_uid"]
+            for row in conn.execute(
+                "SELECT card_uid FROM user_card_state WHERE user_name = ? AND card_type = ?",
+                (user["name"], kind),
+            )
+        }
+    rows = app.exclude_card_uids(rows, excluded_uids)
+    unseen_rows = [row for row in rows if row["uid"] not in seen]
+    seen_rows = [row for row in rows if row["uid"] in seen]
+    rows = (unseen_rows if force_new and unseen_rows else seen_rows) or rows
+    return app.weighted_row_by_elo(rows, int(user.get("elo", app.DEFAULT_ELO)))
+
+
+def bench_daily(repeat=5, cards=3000):
+    path = scratch_material_db()
+    with app.get_db(path) as conn:
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO cloze_questions (uid, sentence, answer, translation, elo)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [
+                (f"bench_{i}", f"Frase {i} ____ di prova.", "parola", "テスト", random.randint(800, 1700))
+                for i in range(cards)
+            ],
+        )
+        verb_uids = [row["uid"] for row in conn.execute("SELECT uid FROM questions WHERE kind = 'verb_form'")]
+    user = {"name": "bench", "elo": app.DEFAULT_ELO, "study_language": "it_ja"}
+    app.init_db(app.DB_PATH)
+    with app.get_runtime_db() as conn:
+        conn.execute("INSERT OR IGNORE INTO users (name) VALUES ('bench')")
+        conn.executemany(
+            "INSERT OR IGNORE INTO user_card_state (user_name, card_uid, card_type) VALUES ('bench', ?, ?)",
+            [(f"bench_{i}", "cloze") for i in range(0, cards, 2)]
+            + [(uid, "verb_form") for uid in verb_uids[::2]],
+        )
+    app.reset_process_caches("seen_cards")
+
+    def sql_loop(counts):
+        used = set()
+        for kind, count in counts.items():
+            for _ in range(count):
+                row = sql_pick(user, kind, used)
+                if row:
+                    used.add(row["uid"])
+
+    def per_pick(counts):
+        used = set()
+        pickers = {
+            "verb_form": lambda: app.pick_question(user, excluded_uids=used, allow_fallback=False),
+            "flashcard": lambda: app.pick_flashcard(user, excluded_uids=used, allow_fallback=False)[0],
+            "cloze": lambda: app.pick_cloze_question(user, excluded_uids=used),
+        }
+        for kind, count in counts.items():
+            for _ in range(count):
+                question = pickers[kind]()
+                if question:
+                    used.add(question["card_uid"])
+
+    # All three build the same verb form / flashcard / cloze mix.
+    print(f"daily set build, {cards} extra cloze cards (best of {repeat}, ms)")
+    print(f"{'target':>8} {'mix':>12} {'sql/pick':>10} {'index/pick':>10} {'batched':>10}")
+    for target in (10, 20, 50, 100):
+        counts = app.distribute_daily_counts(target)
+        mix = "/".join(str(counts[kind]) for kind in ("verb_form", "flashcard", "cloze"))
+        control = timed(lambda: sql_loop(counts), repeat)
+        looped = timed(lambda: per_pick(counts), repeat)
+        batched = timed(lambda: app.build_daily_state(user, target), repeat)
+        print(f"{target:>8} {mix:>12} {control:>10.2f} {looped:>10.2f} {batched:>10.2f}")
+
+
+def bench_pages(repeat=5, renders=200):
+    scratch_material_db()
+    app.init_db(app.DB_PATH)
+    user = {
+        "name": "bench",
+        "elo": app.DEFAULT_ELO,
+        "is_admin": True,
+        "study_language": "it_ja",
+        "daily_target": app.DEFAULT_DAILY_TARGET,
+        "daily_streak": 3,
+        "daily_last_completed": None,
+        "state": {"practiced_count": 42},
+    }
+    question = app.pick_question(user)
+    cloze = app.pick_cloze_question(user)
+    card, options = app.pick_flashcard(user)
+    daily = app.build_daily_state(user)
+    pages = {
+        "verbs": (app.VERB_PAGE_TEMPLATE, lambda: app.render_page(question, {"count": 0, "history": []}, "bench", 42)),
+        "daily": (app.DAILY_PAGE_TEMPLATE, lambda: app.render_daily("bench", user, daily)),
+        "menu": (app.MENU_PAGE_TEMPLATE, lambda: app.render_menu("bench", user)),
+        "flashcards": (app.FLASHCARD_PAGE_TEMPLATE, lambda: app.render_flashcards("bench", user, card, options)),
+        "cloze": (app.CLOZE_PAGE_TEMPLATE, lambda: app.render_cloze("bench", user, cloze)),
+    }
+    print(f"page render, {renders} renders per run (best of {repeat})")
+    print(f"{'page':>12} {'us/render':>10} {'bytes':>8} {'static':>8} {'dynamic':>8}")
+    for name, (template, render) in pages.items():
+        body = render()
+        elapsed = timed(lambda: [render() for _ in range(renders)], repeat)
+        print(
+            f"{name:>12} {elapsed * 1000 / renders:>10.1f} {len(body):>8} "
+            f"{template.static_bytes:>8} {len(body) - template.static_bytes:>8}"
+        )
+
+
+def wsgi_get(path, cookie="", accept_encoding=""):
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "wsgi.input": io.BytesIO(b""),
+        "HTTP_COOKIE": cookie,
+        "HTTP_ACCEPT_ENCODING": accept_encoding,
+    }
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = status
+        response["headers"] = dict(headers)
+
+    result = app.application(environ, start_response)
+    body = b"".join(result)
+    if hasattr(result, "close"):
+        result.close()
+    return response["headers"], body
+
+
+def bench_compression(repeat=5):
+    scratch_material_db()
+    app.init_db(app.DB_PATH)
+    token = "bench-session"
+    with app.get_runtime_db() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO users (name, password_hash, session_token, is_admin) VALUES ('bench', '', ?, 1)",
+            (token,),
+        )
+    cookie = f"verbi_session={token}"
+    routes = [
+        "/",
+        "/daily",
+        "/flashcards",
+        "/cloze",
+        "/verbs",
+        "/settings",
+        "/admin",
+        "/admin/content",
+        "/admin/sentence-scraper",
+        app.asset_url("css/content-admin.css"),
+        app.asset_url("js/sentence-scraper.js"),
+    ]
+    encodings = app.available_encodings()
+    print(f"response bytes per route (best of {repeat} for ms)")
+    print(f"{'route':>34} {'identity':>9} " + " ".join(f"{name + ' bytes/ratio/ms':>22}" for name in encodings))
+    for route in routes:
+        _, plain = wsgi_get(route, cookie)
+        cells = []
+        for encoding in encodings:
+            headers, body = wsgi_get(route, cookie, encoding)
+            elapsed = timed(lambda: wsgi_get(route, cookie, encoding), repeat)
+            if headers.get("Content-Encoding") != encoding:
+                cells.append(f"{'-':>22}")
+                continue
+            cells.append(f"{len(body):>8} {len(body) / len(plain):>6.0%} {elapsed:>6.2f}")
+        print(f"{route[:34]:>34} {len(plain):>9} " + " ".join(cells))
+
+
+def bench_matching(repeat=5, sentences=10000):
+    rng = random.Random(7)
+    terms = ["mangio", "mangi", "mangia", "mangiamo", "mangiate", "mangiano", "ho mangiato", "mangiò", "mangerò"]
+    words = ["perché", "città", "l'uomo", "è", "già", "più", "caffè", "la", "mela", "oggi", "sempre", "Così"]
+    corpus = []
+    for i in range(sentences):
+        sentence = [rng.choice(words) for _ in range(rng.randint(6, 18))]
+        if i % 3 == 0:
+            sentence.insert(rng.randrange(len(sentence)), rng.choice(terms).upper() if i % 2 else rng.choice(terms))
+        corpus.append(" ".join(sentence))
+    matcher = app.TermMatcher(terms)
+    print(f"term matching over {sentences} sentences, {len(terms)} terms (best of {repeat}, ms)")
+    print(f"{'operation':>12} {'per-call':>10} {'shared':>10}")
+    span = (
+        timed(lambda: [app.normalized_span_match(sentence, terms) for sentence in corpus], repeat),
+        timed(lambda: [matcher.match(sentence) for sentence in corpus], repeat),
+    )
+    print(f"{'span':>12} {span[0]:>10.2f} {span[1]:>10.2f}")
+    targets = [matcher.match(sentence) for sentence in corpus]
+    highlight = timed(lambda: [app.highlight_sentence_html(s, t) for s, t in zip(corpus, targets)], repeat)
+    print(f"{'highlight':>12} {highlight:>10.2f} {'-':>10}")
+
+
+BENCHMARKS = {
+    "daily": bench_daily,
+    "pages": bench_pages,
+    "compression": bench_compression,
+    "matching": bench_matching,
+}
+
+
+def main(names):
+    for name in names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            raise SystemExit(f"Unknown benchmark {name!r}; choose from {', '.join(BENCHMARKS)}.")
+        BENCHMARKS[name]()
+        print()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
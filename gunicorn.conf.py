@@ -0,0 +1,22 @@
+import logging
+
+logging.basicConfig(level=logging.INFO, format="[%(process)d] %(levelname)s %(name)s: %(message)s")
+
+
+def when_ready(server):
+    # With --preload the master has already imported the app, so the caches
+    # are built once here and shared copy-on-write by every worker.
+    if not server.cfg.preload_app:
+        return
+    import app
+
+    app.warmup()
+    app.reset_process_caches("db_pool")
+
+
+def post_fork(server, worker):
+    import app
+
+    app.warmup()
+    if app.ELO_WRITE_BEHIND:
+        app.start_elo_writer()
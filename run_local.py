@@ -1,7 +1,8 @@
+import logging
 from socketserver import ThreadingMixIn
 from wsgiref.simple_server import WSGIServer, make_server
 
-from app import application
+from app import application, check_storage_settings, warmup
 
 
 class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
@@ -9,6 +10,9 @@ class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    check_storage_settings()
+    warmup()
     with make_server("127.0.0.1", 8000, application, server_class=ThreadingWSGIServer) as httpd:
         print("Serving on http://127.0.0.1:8000", flush=True)
         httpd.serve_forever()
@@ -0,0 +1,459 @@
+function showScrapeStatus() {
+  var box = document.getElementById("scrape-status");
+  if (box) {
+    box.style.display = "block";
+    box.textContent = "ソースと記事リンクを確認中です。各ページは最大" + scraperConfig.timeoutSeconds + "秒でタイムアウトし、各ソースから最大" + scraperConfig.maxSourceLinks + "件の記事を確認します。";
+  }
+}
+function escapeHtml(value) {
+  return String(value).replace(/[&<>"']/g, function(char) {
+    return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}[char];
+  });
+}
+var scraperConfig = window.VERBI_SCRAPER || {};
+var scrapeController = null;
+var scraperDefaultSources = scraperConfig.defaultSources;
+var scraperSourceLibrary = scraperConfig.sourceLibrary;
+function scraperLanguage() {
+  var input = document.querySelector("select[name='material_language']");
+  return input ? input.value : scraperConfig.materialLanguage;
+}
+function sourceStorageKey() {
+  return "verbiScraperSourcesV4:" + scraperLanguage();
+}
+function highlightTarget(sentence, target) {
+  if (!target) {
+    return escapeHtml(sentence);
+  }
+  var index = sentence.toLocaleLowerCase().indexOf(target.toLocaleLowerCase());
+  if (index === -1) {
+    return escapeHtml(sentence);
+  }
+  return escapeHtml(sentence.slice(0, index)) +
+    '<span class="cloze-hit">' + escapeHtml(sentence.slice(index, index + target.length)) + '</span>' +
+    escapeHtml(sentence.slice(index + target.length));
+}
+function appendScrapeResult(item) {
+  var list = document.getElementById("result-list");
+  if (!list) {
+    return;
+  }
+  var empty = list.querySelector(".empty");
+  if (empty) {
+    empty.remove();
+  }
+  var div = document.createElement("div");
+  div.className = "result-item";
+  div.dataset.sentence = item.sentence || "";
+  div.dataset.target = item.target || "";
+  div.dataset.translation = item.translation || "";
+  div.innerHTML =
+    '<input class="result-check" type="checkbox" />' +
+    '<div class="result-main">' +
+    '<div class="sentence">' + highlightTarget(item.sentence || "", item.target || "") + '</div>' +
+    '<button class="mini-button create-card-button" type="button" data-sentence="' + escapeHtml(item.sentence || "") + '" data-target="' + escapeHtml(item.target || "") + '" data-translation="' + escapeHtml(item.translation || "") + '" onclick="openClozeModal(this)">+</button>' +
+    '</div>' +
+    '<div class="translation">' + escapeHtml(item.translation || "") + '</div>' +
+    '<div class="source">' + escapeHtml(item.source) + '</div>';
+  list.appendChild(div);
+}
+function appendScrapeError(message) {
+  var box = document.getElementById("errors-container");
+  if (!box) {
+    return;
+  }
+  var errors = box.querySelector(".errors");
+  if (!errors) {
+    errors = document.createElement("div");
+    errors.className = "errors";
+    box.appendChild(errors);
+  }
+  var line = document.createElement("div");
+  line.textContent = message;
+  errors.appendChild(line);
+}
+function updateScrapeReport(report) {
+  var box = document.getElementById("report-container");
+  if (!box || !report) {
+    return;
+  }
+  var terms = (report.search_terms || []).slice(0, 24).join(", ");
+  var perUrl = Object.entries(report.per_url || {}).map(function(entry) {
+    return "<li>" + escapeHtml(entry[0]) + ": " + Number(entry[1]) + "</li>";
+  }).join("");
+  var pageTimings = report.page_timings || [];
+  var timingTotals = ["fetch_ms", "parse_ms", "match_ms"].map(function(key) {
+    return pageTimings.reduce(function(total, timing) {
+      return total + Number(timing[key] || 0);
+    }, 0).toFixed(0);
+  }).join(" / ");
+  box.innerHTML =
+    '<div class="run-report">' +
+    '<strong>収集レポート</strong>' +
+    '<div>入力ソース: ' + Number(report.sources || 0) + '</div>' +
+    '<div>検索フォーム数: ' + Number(report.terms || 0) + '</div>' +
+    '<div>結果上限: ' + Number(report.result_limit || 0) + '</div>' +
+    '<div>最小文字数: ' + Number(report.min_chars || 0) + '</div>' +
+    '<div>最大文字数: ' + Number(report.max_chars || 0) + '</div>' +
+    (terms ? '<div class="terms-preview">' + escapeHtml(terms) + '</div>' : '') +
+    '<div>確認したURL: ' + Number(report.visited || 0) + '</div>' +
+    '<div>見つけた記事リンク: ' + Number(report.links_found || 0) + '</div>' +
+    '<div>取得した文: ' + Number(report.sentences_seen || 0) + '</div>' +
+    '<div>文字数で除外: ' + Number(report.filtered_by_length || 0) + '</div>' +
+    '<div>確認した文候補: ' + Number(report.sentences_checked || 0) + '</div>' +
+    '<div>一致した例文: ' + Number(report.matches || 0) + '</div>' +
+    '<div>中止した取得: ' + Number(report.cancelled || 0) + '</div>' +
+    '<div>索引から検索したソース: ' + Number(report.indexed_sources || 0) + '</div>' +
+    '<div>ページ処理 ' + pageTimings.length + '件 (取得/解析/照合 ms): ' + timingTotals + '</div>' +
+    '<ul>' + perUrl + '</ul>' +
+    '</div>';
+}
+function setScrapeStatus(message) {
+  var box = document.getElementById("scrape-status");
+  if (box) {
+    box.style.display = "block";
+    box.textContent = message;
+  }
+}
+function startScrapeStream(form) {
+  if (!window.fetch || !window.TextDecoder || !window.ReadableStream) {
+    showScrapeStatus();
+    return true;
+  }
+  showScrapeStatus();
+  scrapeController = new AbortController();
+  document.getElementById("stop-scrape-button").style.display = "inline-block";
+  document.getElementById("result-list").innerHTML = '<div class="empty">検索中...</div>';
+  document.getElementById("errors-container").innerHTML = "";
+  document.getElementById("report-container").innerHTML = "";
+  fetch("/admin/sentence-scraper/stream", {
+    method: "POST",
+    body: new URLSearchParams(new FormData(form))
+    , signal: scrapeController.signal
+  }).then(function(response) {
+    if (!response.body) {
+      form.submit();
+      return;
+    }
+    var reader = response.body.getReader();
+    var decoder = new TextDecoder();
+    var buffer = "";
+    function pump() {
+      return reader.read().then(function(chunk) {
+        if (chunk.done) {
+          if (buffer.trim()) {
+            handleScrapeLine(buffer.trim());
+          }
+          return;
+        }
+        buffer += decoder.decode(chunk.value, {stream: true});
+        var lines = buffer.split("\\n");
+        buffer = lines.pop();
+        lines.forEach(handleScrapeLine);
+        return pump();
+      });
+    }
+    return pump();
+  }).catch(function(error) {
+    if (error.name === "AbortError") {
+      setScrapeStatus("Stopped.");
+    } else {
+      appendScrapeError(error.message || String(error));
+    }
+  }).finally(function() {
+    document.getElementById("stop-scrape-button").style.display = "none";
+    scrapeController = null;
+  });
+  return false;
+}
+function stopScrape() {
+  if (scrapeController) {
+    scrapeController.abort();
+  }
+}
+function selectedResultItems() {
+  return Array.from(document.querySelectorAll(".result-item")).filter(function(item) {
+    var checkbox = item.querySelector(".result-check");
+    return checkbox && checkbox.checked;
+  });
+}
+function setResultSelection(mode) {
+  document.querySelectorAll(".result-item").forEach(function(item) {
+    var checkbox = item.querySelector(".result-check");
+    if (!checkbox) {
+      return;
+    }
+    if (mode === "all") {
+      checkbox.checked = true;
+    } else if (mode === "missing") {
+      checkbox.checked = !(item.dataset.translation || "").trim();
+    } else if (mode === "translated") {
+      checkbox.checked = Boolean((item.dataset.translation || "").trim());
+    } else if (mode === "clear") {
+      checkbox.checked = false;
+    }
+  });
+}
+function translateSelectedResults() {
+  var items = selectedResultItems();
+  if (!items.length) {
+    setScrapeStatus("No results selected.");
+    return;
+  }
+  setScrapeStatus("Translating selected results...");
+  var sentences = items.map(function(item) { return item.dataset.sentence || ""; });
+  var apiKeyInput = document.getElementById("openai-api-key");
+  var apiKey = apiKeyInput ? apiKeyInput.value : "";
+  fetch("/admin/sentence-scraper/translate", {
+    method: "POST",
+    body: new URLSearchParams({items: JSON.stringify(sentences), api_key: apiKey, material_language: scraperLanguage()})
+  }).then(function(response) {
+    return response.json();
+  }).then(function(data) {
+    if (data.error) {
+      appendScrapeError(data.error);
+      return;
+    }
+    (data.translations || []).forEach(function(translation, index) {
+      var item = items[index];
+      if (!item) {
+        return;
+      }
+      item.dataset.translation = translation;
+      var translationBox = item.querySelector(".translation");
+      if (translationBox) {
+        translationBox.textContent = translation;
+      }
+      var button = item.querySelector(".create-card-button");
+      if (button) {
+        button.setAttribute("data-translation", translation);
+      }
+    });
+    setScrapeStatus("Translations added.");
+  }).catch(function(error) {
+    appendScrapeError(error.message || String(error));
+  });
+}
+function createSelectedCards() {
+  var items = selectedResultItems();
+  if (!items.length) {
+    setScrapeStatus("No results selected.");
+    return;
+  }
+  var cards = items.map(function(item) {
+    return {
+      phrase: item.dataset.sentence || "",
+      answer: item.dataset.target || "",
+      translation: item.dataset.translation || ""
+    };
+  });
+  setScrapeStatus("Creating selected cards...");
+  fetch("/admin/sentence-scraper/create-cloze-batch", {
+    method: "POST",
+    body: new URLSearchParams({items: JSON.stringify(cards), material_language: scraperLanguage()})
+  }).then(function(response) {
+    return response.json();
+  }).then(function(data) {
+    if (data.error) {
+      appendScrapeError(data.error);
+      return;
+    }
+    (data.results || []).forEach(function(result, index) {
+      var item = items[index];
+      if (!item) {
+        return;
+      }
+      if (result.ok) {
+        item.classList.add("created-card");
+        var checkbox = item.querySelector(".result-check");
+        if (checkbox) {
+          checkbox.checked = false;
+        }
+      } else {
+        appendScrapeError(result.error || "Card could not be created.");
+      }
+    });
+    setScrapeStatus("Created " + Number(data.created || 0) + " cards. Skipped " + Number(data.skipped || 0) + ".");
+  }).catch(function(error) {
+    appendScrapeError(error.message || String(error));
+  });
+}
+function handleScrapeLine(line) {
+  if (!line) {
+    return;
+  }
+  var event = JSON.parse(line);
+  if (event.type === "status") {
+    setScrapeStatus(event.message);
+  } else if (event.type === "result") {
+    appendScrapeResult(event.item);
+  } else if (event.type === "error") {
+    appendScrapeError(event.message);
+  } else if (event.type === "report") {
+    updateScrapeReport(event.report);
+  } else if (event.type === "done") {
+    setScrapeStatus(event.message);
+  }
+}
+function addSource(button) {
+  var textarea = document.querySelector("textarea[name='sources']");
+  var url = button.getAttribute("data-source");
+  if (!textarea || !url) {
+    return;
+  }
+  addSources([url]);
+}
+function addSources(urls) {
+  var textarea = document.querySelector("textarea[name='sources']");
+  if (!textarea) {
+    return;
+  }
+  var lines = textarea.value.split(/\\r?\\n/).map(function(line) { return line.trim(); });
+  urls.forEach(function(url) {
+    if (lines.indexOf(url) === -1) {
+      lines.push(url);
+    }
+  });
+  lines = lines.filter(function(line, index) {
+    return line && lines.indexOf(line) === index;
+  });
+  textarea.value = lines.join("\\n");
+}
+function addAllSources() {
+  var urls = document.getElementById("all-source-urls").value.split(/\\r?\\n/);
+  addSources(urls);
+}
+function renderSourceChoices() {
+  var list = document.querySelector("#source-modal .source-picker-list");
+  if (!list) {
+    return;
+  }
+  var sources = scraperSourceLibrary[scraperLanguage()] || [];
+  list.innerHTML = sources.map(function(source) {
+    return '<label class="source-choice">' +
+      '<input type="checkbox" value="' + escapeHtml(source.url || "") + '" />' +
+      '<span><strong>' + escapeHtml(source.name || "") + '</strong>' +
+      '<em>' + escapeHtml(source.kind || "") + '</em>' +
+      '<code>' + escapeHtml(source.url || "") + '</code></span>' +
+      '</label>';
+  }).join("");
+  var allUrls = document.getElementById("all-source-urls");
+  if (allUrls) {
+    allUrls.value = sources.map(function(source) { return source.url || ""; }).join("\\n");
+  }
+}
+function sourceTextarea() {
+  return document.querySelector("textarea[name='sources']");
+}
+function sourceLines() {
+  var textarea = sourceTextarea();
+  if (!textarea) {
+    return [];
+  }
+  return textarea.value.split(/\\r?\\n/).map(function(line) { return line.trim(); }).filter(Boolean);
+}
+function updateSourceSummary() {
+  var summary = document.getElementById("source-summary");
+  if (summary) {
+    summary.textContent = sourceLines().length + " sources selected";
+  }
+}
+function openSourceModal() {
+  var selected = sourceLines();
+  document.querySelectorAll("#source-modal input[type='checkbox']").forEach(function(input) {
+    input.checked = selected.indexOf(input.value) !== -1;
+  });
+  document.getElementById("source-modal").style.display = "flex";
+}
+function closeSourceModal() {
+  document.getElementById("source-modal").style.display = "none";
+}
+function applySourceSelection() {
+  var urls = [];
+  document.querySelectorAll("#source-modal input[type='checkbox']:checked").forEach(function(input) {
+    urls.push(input.value);
+  });
+  var textarea = sourceTextarea();
+  if (textarea) {
+    textarea.value = urls.join("\\n");
+    localStorage.setItem(sourceStorageKey(), textarea.value);
+  }
+  updateSourceSummary();
+  closeSourceModal();
+}
+function setAllSourceChoices(checked) {
+  document.querySelectorAll("#source-modal input[type='checkbox']").forEach(function(input) {
+    input.checked = checked;
+  });
+}
+function useRecommendedSources() {
+  var textarea = sourceTextarea();
+  var defaults = document.getElementById("default-source-urls");
+  if (textarea && defaults) {
+    textarea.value = defaults.value;
+    localStorage.setItem(sourceStorageKey(), textarea.value);
+  }
+  updateSourceSummary();
+  closeSourceModal();
+}
+function restoreSavedSources() {
+  var saved = localStorage.getItem(sourceStorageKey());
+  var textarea = sourceTextarea();
+  if (saved && textarea) {
+    textarea.value = saved;
+  }
+  updateSourceSummary();
+}
+function changeScraperLanguage() {
+  renderSourceChoices();
+  var textarea = sourceTextarea();
+  if (textarea) {
+    var saved = localStorage.getItem(sourceStorageKey());
+    textarea.value = saved || scraperDefaultSources[scraperLanguage()] || "";
+  }
+  var tense = document.querySelector("select[name='tense']");
+  if (tense) {
+    var italian = scraperLanguage() === "it_ja";
+    tense.disabled = !italian;
+    if (!italian) {
+      tense.value = "";
+    }
+  }
+  var hiddenLanguage = document.querySelector("#cloze-modal input[name='material_language']");
+  if (hiddenLanguage) {
+    hiddenLanguage.value = scraperLanguage();
+  }
+  updateSourceSummary();
+}
+function openClozeModal(button) {
+  var sentence = button.getAttribute("data-sentence") || "";
+  var target = button.getAttribute("data-target") || "";
+  var translation = button.getAttribute("data-translation") || "";
+  var hiddenLanguage = document.querySelector("#cloze-modal input[name='material_language']");
+  if (hiddenLanguage) {
+    hiddenLanguage.value = scraperLanguage();
+  }
+  document.getElementById("cloze-phrase").value = sentence;
+  document.getElementById("cloze-answer").value = target;
+  document.getElementById("cloze-translation").value = translation;
+  document.getElementById("cloze-modal").style.display = "flex";
+  document.getElementById("cloze-answer").focus();
+}
+function closeClozeModal() {
+  document.getElementById("cloze-modal").style.display = "none";
+}
+function useSelectedClozeText() {
+  var phrase = document.getElementById("cloze-phrase");
+  var answer = document.getElementById("cloze-answer");
+  if (!phrase || !answer) {
+    return;
+  }
+  var selected = phrase.value.substring(phrase.selectionStart, phrase.selectionEnd).trim();
+  if (selected) {
+    answer.value = selected;
+  }
+}
+document.addEventListener("DOMContentLoaded", function() {
+  restoreSavedSources();
+  changeScraperLanguage();
+});